@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +44,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the queries of every other middleware are profiled too.
+    'tasks.profiling.SQLProfilingMiddleware',
+    # Before the session and authentication middleware, whose reads it routes too.
+    'tasks.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -48,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tasks.activity.ActivityMiddleware',
 ]
 
 ROOT_URLCONF = 'django_project.urls'
@@ -73,13 +81,147 @@ WSGI_APPLICATION = 'django_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
-DATABASES = {
+# Chosen by environment variables, so every deployment runs this file:
+#   DB_ENGINE        'sqlite' (default) or 'postgresql'
+#   DB_NAME          the SQLite file, or the PostgreSQL database
+#   DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#                    PostgreSQL only
+#   DB_CONN_MAX_AGE  seconds a connection is kept for later requests, checked
+#                    before reuse (default 60; 0 opens one per request)
+#   DB_POOL_SIZE     PostgreSQL only: share a psycopg pool of at most this many
+#                    connections per process instead (needs psycopg[pool]);
+#                    preferable under ASGI, where persistent connections are
+#                    not reused between requests
+# Compare the settings under concurrent writes with the benchmark_writers command.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# writer and, with synchronous=NORMAL, syncs to disk only at checkpoints (a
+# power loss may lose the last commits, never corrupt the file); reads go
+# through up to 256 MB of memory-mapped file; and writers wait up to 5 s for
+# the lock instead of failing with "database is locked".
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'busy_timeout': 5000,
+}
+
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+            },
+        }
+    }
+elif DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'tasks'),
+            'USER': os.environ.get('DB_USER', ''),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', ''),
+            'PORT': os.environ.get('DB_PORT', ''),
+            # A pooled connection goes back to the pool after each request.
+            'CONN_MAX_AGE': 0 if DB_POOL_SIZE else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'pool': {'min_size': 1, 'max_size': DB_POOL_SIZE, 'timeout': 10}} if DB_POOL_SIZE else {},
+        }
+    }
+else:
+    raise ImproperlyConfigured(f"Unsupported DB_ENGINE {DB_ENGINE!r}; use 'sqlite' or 'postgresql'.")
+
+# A read replica, which GET requests read from (see tasks/routers.py):
+#   DB_REPLICA_NAME  the replica's SQLite file or PostgreSQL database
+#   DB_REPLICA_HOST  the replica's PostgreSQL host
+# Locally, two SQLite files can stand in for the primary and the replica;
+# sync_replica copies the first into the second.
+DB_REPLICA_NAME = os.environ.get('DB_REPLICA_NAME')
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+if DB_REPLICA_NAME or DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': DB_REPLICA_NAME or DATABASES['default']['NAME'],
+        'HOST': DB_REPLICA_HOST or DATABASES['default'].get('HOST', ''),
+        # The tests read and write one test database.
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['tasks.routers.PrimaryReplicaRouter']
+# Seconds a user's reads stay on the primary after they write, so they see
+# their own changes while the replica catches up.
+REPLICA_PIN_SECONDS = 10
+
+# Let the async views run their independent queries on separate connections
+# at the same time (see tasks/async_queries.py). SQLite serialises them anyway.
+ASYNC_QUERY_FANOUT = DATABASES['default']['ENGINE'] != 'django.db.backends.sqlite3'
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Any backend works, including the local-memory and file-based ones.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'task-manager',
     }
 }
 
+# Seconds a cached dashboard lives before it is rebuilt, even without changes,
+# so time-dependent figures such as the overdue count stay fresh.
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# Seconds a cached template fragment ({% cachefragment %}) lives. Fragments are
+# keyed on versions that change with their content, so this only bounds how
+# long superseded entries take up space.
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Seconds a user's cached team and project IDs, which every permission check
+# reads (see tasks/permissions.py), live; membership changes invalidate them.
+# 0 loads them once per request instead.
+PERMISSION_CACHE_TIMEOUT = 300
+
+# Pub/sub broker for the live-update event streams (see tasks/live.py). The
+# in-process broker only reaches clients connected to the same server process.
+LIVE_UPDATES_BROKER = 'tasks.live.InProcessBroker'
+
+# Where the archive_task_events command moves old activity-log events, as one
+# gzipped JSON-lines file per month (see tasks/activity.py).
+TASK_EVENT_ARCHIVE_DIR = BASE_DIR / 'archive' / 'task_events'
+
+# Every response reports its SQL time in a Server-Timing header; this share of
+# requests is also profiled by call site and appended to SQL_PROFILE_LOG as
+# JSON lines (see tasks/profiling.py), e.g. 0.01 in production. Add
+# ?sql_profile=1 to a URL, as staff, to see its profile on the page.
+SQL_PROFILE_SAMPLE_RATE = 0.0
+SQL_PROFILE_LOG = BASE_DIR / 'logs' / 'sql_profile.jsonl'
+
+# Background job queues (see tasks/jobs.py) and how many jobs of each one a
+# run_worker process runs at once. Scale further by running more workers.
+JOB_QUEUES = {
+    'default': 2,
+    'notifications': 4,
+    'maintenance': 1,
+}
+# Seconds after which a running job whose worker went away is retried.
+JOB_TIMEOUT = 15 * 60
+
+# Notification emails are printed until a real backend is configured.
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'tasks@localhost'
+# Absolute links in emails.
+SITE_URL = 'http://localhost:8000'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -0,0 +1,278 @@
+"""
+Append-only history of task, assignment and comment changes.
+
+Signal handlers in tasks/signals.py and TaskQuerySet's bulk methods call
+record() for every change. Events are written once the change commits, and
+inside a batch() (every request runs in one, see ActivityMiddleware) they are
+buffered and written with a single INSERT when the batch ends, so a bulk
+action touching hundreds of tasks costs one extra query rather than hundreds.
+
+Old events are moved out of the table by the archive_task_events command into
+gzipped JSON-lines files, one per month, in settings.TASK_EVENT_ARCHIVE_DIR.
+history() reads both the table and the archive.
+"""
+import contextvars
+import gzip
+import json
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import burndown
+from .models import Task, TaskEvent
+
+_batch = contextvars.ContextVar('activity_batch', default=None)
+
+
+class Batch:
+    """Events buffered for one INSERT, attributed to ``actor`` unless they name their own."""
+
+    def __init__(self, actor=None):
+        # A user, or a callable returning one, resolved when the events are written.
+        self.actor = actor
+        self.events = []
+        self.closed = False
+
+    def add(self, event):
+        self.events.append(event)
+        if self.closed:
+            self.flush()
+
+    def close(self):
+        # Events recorded in a transaction that is still open are only added
+        # when it commits, so the batch is written after that.
+        transaction.on_commit(self._close)
+
+    def _close(self):
+        self.closed = True
+        self.flush()
+
+    def flush(self):
+        events, self.events = self.events, []
+        if not events:
+            return
+        actor = self.actor() if callable(self.actor) else self.actor
+        actor_id = actor.pk if actor is not None and actor.is_authenticated else None
+        for event in events:
+            if event.actor_id is None:
+                event.actor_id = actor_id
+        write(events)
+
+
+@contextmanager
+def batch(actor=None):
+    """Buffer the events recorded in the block and write them in one INSERT once it exits and commits."""
+    if _batch.get() is not None:
+        # Already batching; the outermost block writes.
+        yield
+        return
+    current = Batch(actor)
+    token = _batch.set(current)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+        current.close()
+
+
+def write(events):
+    """Resolve missing project ids from the tasks, insert the events and count the completions among them."""
+    missing = {event.task_id for event in events if event.project_id is None and event.task_id is not None}
+    if missing:
+        projects = dict(Task.objects.filter(pk__in=missing).values_list('pk', 'project_id'))
+        for event in events:
+            if event.project_id is None:
+                event.project_id = projects.get(event.task_id)
+    if len(events) == 1:
+        # Unlike bulk_create(), save() needs no transaction of its own.
+        events[0].save()
+    else:
+        TaskEvent.objects.bulk_create(events, batch_size=500)
+    burndown.record_completions(events)
+
+
+def record(kind, task_id, project_id=None, actor=None, **data):
+    """
+    Record an event about task ``task_id`` once the current transaction commits.
+
+    ``project_id`` may be left out when it is not at hand; it is then read
+    from the task when the event is written.
+    """
+    event = TaskEvent(
+        kind=kind, task_id=task_id, project_id=project_id,
+        actor_id=getattr(actor, 'pk', actor), data=data, created_at=timezone.now(),
+    )
+    current = _batch.get()
+    transaction.on_commit(partial(current.add, event) if current is not None else partial(write, [event]))
+
+
+def record_task_updates(before, fields):
+    """
+    Record a TASK_UPDATED event for every task in ``before``, {pk: {field: old value}},
+    whose ``fields`` now differ; for queryset updates, which send no signals.
+    """
+    columns = list(dict.fromkeys(['id', 'project_id', *fields]))
+    for row in Task.objects.filter(pk__in=list(before)).values(*columns):
+        pk, project_id = row['id'], row['project_id']
+        changed = changes(before[pk], {field: row[field] for field in fields})
+        if changed:
+            record(TaskEvent.TASK_UPDATED, pk, project_id, changes=changed)
+
+
+def changes(old, new):
+    """{field: [old, new]} for the keys whose values differ between the two dicts."""
+    return {field: [old.get(field), value] for field, value in new.items() if old.get(field) != value}
+
+
+class ActivityMiddleware:
+    """Batch the events of each request and attribute them to the request's user."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        # The user is resolved at write time, after any login or logout in the view.
+        current = Batch(lambda: getattr(request, 'user', None))
+        token = _batch.set(current)
+        try:
+            return self.get_response(request)
+        finally:
+            _batch.reset(token)
+            current.close()
+
+    async def __acall__(self, request):
+        current = Batch(lambda: getattr(request, 'user', None))
+        token = _batch.set(current)
+        try:
+            return await self.get_response(request)
+        finally:
+            _batch.reset(token)
+            if current.events:
+                await sync_to_async(current.close)()
+            else:
+                current.closed = True
+
+
+# Archive
+
+def archive_path(month, directory=None):
+    """The archive file of ``month``, a (year, month) pair."""
+    return Path(directory or settings.TASK_EVENT_ARCHIVE_DIR) / f'{month[0]:04d}-{month[1]:02d}.jsonl.gz'
+
+
+def to_json(event):
+    return {
+        'id': event.pk,
+        'created_at': event.created_at.isoformat(),
+        'kind': event.kind,
+        'project': event.project_id,
+        'task': event.task_id,
+        'actor': event.actor_id,
+        'data': event.data,
+    }
+
+
+def archive(before, directory=None, batch_size=5000):
+    """
+    Move the events of every calendar month that ends before ``before`` into
+    that month's archive file; returns {(year, month): events moved}.
+
+    Events are moved ``batch_size`` at a time: each batch is appended to its
+    month files, one gzip member per file, and deleted once the files are
+    closed. An interrupted run can at worst archive the events of one batch
+    twice, in the same files; history() skips the duplicates.
+    """
+    cutoff = timezone.localtime(before).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    moved = {}
+    queryset = TaskEvent.objects.filter(created_at__lt=cutoff).order_by('created_at', 'pk')
+    while True:
+        # The previous batches are deleted, so the oldest events left are the next batch.
+        events = list(queryset[:batch_size])
+        if not events:
+            return moved
+        by_month = {}
+        for event in events:
+            created = timezone.localtime(event.created_at)
+            by_month.setdefault((created.year, created.month), []).append(event)
+        for month, month_events in by_month.items():
+            path = archive_path(month, directory)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with gzip.open(path, 'at', encoding='utf-8') as handle:
+                for event in month_events:
+                    handle.write(json.dumps(to_json(event), cls=DjangoJSONEncoder) + '\n')
+            moved[month] = moved.get(month, 0) + len(month_events)
+        TaskEvent.objects.filter(pk__in=[event.pk for event in events]).delete()
+
+
+def _months(since, until):
+    """(year, month) pairs from ``since`` to ``until`` inclusive, in local time."""
+    year, month = since.year, since.month
+    while (year, month) <= (until.year, until.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _archived(task, project, since, until, directory):
+    directory = Path(directory or settings.TASK_EVENT_ARCHIVE_DIR)
+    if since is None:
+        # Only the files present need reading.
+        paths = sorted(directory.glob('*.jsonl.gz'))
+    else:
+        upper = timezone.localtime(until) if until else timezone.localtime()
+        paths = [archive_path(month, directory) for month in _months(timezone.localtime(since), upper)]
+    for path in paths:
+        if not path.exists():
+            continue
+        # An event archived twice is archived twice into the same file.
+        seen = set()
+        with gzip.open(path, 'rt', encoding='utf-8') as lines:
+            for line in lines:
+                row = json.loads(line)
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                if task is not None and row['task'] != task:
+                    continue
+                if project is not None and row['project'] != project:
+                    continue
+                row['created_at'] = parse_datetime(row['created_at'])
+                if (since and row['created_at'] < since) or (until and row['created_at'] >= until):
+                    continue
+                yield row
+
+
+def history(task=None, project=None, since=None, until=None, directory=None):
+    """
+    Events of a task or project (ids), oldest first, as dicts like to_json()
+    returns, read from the archive files and then the table.
+
+    ``since`` and ``until`` bound created_at (inclusive and exclusive); with
+    ``since``, only the archive files of the months in range are opened.
+    """
+    yield from _archived(task, project, since, until, directory)
+    queryset = TaskEvent.objects.all()
+    if task is not None:
+        queryset = queryset.filter(task_id=task)
+    if project is not None:
+        queryset = queryset.filter(project_id=project)
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    for event in queryset.order_by('created_at', 'pk').iterator():
+        row = to_json(event)
+        row['created_at'] = event.created_at
+        yield row
@@ -1,36 +1,143 @@
+from django import forms
 from django.contrib import admin
-from .models import Team, Project, Task, TaskAssignment, Comment
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db.models import Q
+from django.utils import timezone
+
+from . import search
+from .models import Team, Project, Task, TaskAssignment, Comment, TaskEvent, Job
+
+
+class FullTextSearchMixin:
+    """
+    Answer changelist searches on the indexed text fields from the full-text
+    index (tasks/search.py) instead of LIKE scans; the remaining search_fields
+    still use icontains.
+    """
+    search_kind = None
+    full_text_fields = ()
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.enabled():
+            return super().get_search_results(request, queryset, search_term)
+        condition = search.matching(self.search_kind, search_term)
+        for field in self.get_search_fields(request):
+            if field not in self.full_text_fields:
+                condition |= Q(**{f'{field}__icontains': search_term})
+        return queryset.filter(condition), False
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """
+    A foreign-key filter that looks up the related object as you type, through
+    the admin's autocomplete view, instead of listing every row of the related
+    table in the sidebar. The related model's admin needs search_fields.
+    """
+    template = 'admin/tasks/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.model_admin = model_admin
+        self.changelist = None
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+    def field_choices(self, field, request, model_admin):
+        # Only "All" is listed; the widget shows the selected object.
+        return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        self.changelist = changelist
+        yield from super().choices(changelist)
+
+    def widget(self):
+        field = forms.ModelChoiceField(
+            queryset=self.field.remote_field.model._default_manager.all(),
+            required=False,
+            widget=AutocompleteSelect(self.field, self.model_admin.admin_site),
+        )
+        base = self.changelist.get_query_string(remove=[self.lookup_kwarg, self.lookup_kwarg_isnull])
+        field.widget.attrs.update({
+            # select2 fires jQuery change events, which run inline handlers.
+            'onchange': 'window.location.search = this.dataset.base + (this.value ? this.dataset.param + this.value : "");',
+            'data-base': base,
+            'data-param': f"{'&' if base != '?' else ''}{self.lookup_kwarg}=",
+            'style': 'width: 100%;',
+        })
+        return field.widget.render(f'filter-{self.field_path}', self.lookup_val[-1] if self.lookup_val else None)
+
+
+class AutocompleteFilterMixin:
+    """Adds the autocomplete widget's scripts to changelists using AutocompleteFilter."""
+
+    @property
+    def media(self):
+        media = super().media
+        for spec in self.list_filter:
+            if isinstance(spec, tuple) and spec[1] is AutocompleteFilter:
+                field = self.model._meta.get_field(spec[0])
+                return media + AutocompleteSelect(field, self.admin_site).media
+        return media
 
 
 @admin.register(Team)
-class TeamAdmin(admin.ModelAdmin):
-    list_display = ('name', 'owner', 'member_count', 'created_at')
-    list_filter = ('created_at', 'owner')
+class TeamAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ('name', 'owner', 'member_count', 'project_count', 'created_at')
+    list_filter = ('created_at', ('owner', AutocompleteFilter))
+    list_select_related = ('owner',)
     search_fields = ('name', 'description')
-    filter_horizontal = ('members',)
+    autocomplete_fields = ('owner', 'members')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
+    @admin.display(description='Members', ordering='member_count')
     def member_count(self, obj):
-        return obj.members.count()
-    member_count.short_description = 'Members'
+        return obj.member_count
+
+    @admin.display(description='Projects', ordering='project_count')
+    def project_count(self, obj):
+        return obj.project_count
 
 
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
-    list_display = ('name', 'team', 'owner', 'progress', 'created_at')
-    list_filter = ('team', 'owner', 'created_at')
+class ProjectAdmin(AutocompleteFilterMixin, admin.ModelAdmin):
+    list_display = ('name', 'team', 'owner', 'task_count', 'progress', 'created_at')
+    list_filter = (('team', AutocompleteFilter), ('owner', AutocompleteFilter), 'created_at')
+    list_select_related = ('team', 'owner')
     search_fields = ('name', 'description')
-    readonly_fields = ('created_at', 'updated_at')
+    autocomplete_fields = ('team', 'owner')
+    readonly_fields = ('created_at', 'updated_at', 'task_statistics') + Project.TASK_COUNTER_FIELDS
+
+    def get_queryset(self, request):
+        # The changelist skips list_select_related once a select_related() is set, as with_progress() does.
+        return super().get_queryset(request).with_progress().select_related(*self.list_select_related)
 
+    @admin.display(description='Progress', ordering='progress')
     def progress(self, obj):
-        return f"{obj.get_progress()}%"
-    progress.short_description = 'Progress'
+        return f"{obj.progress}%"
+
+    def task_statistics(self, obj):
+        if obj.pk is None:
+            return '-'
+        stats = obj.tasks.stats()
+        return (f"{stats['total']} total, {stats['todo']} to do, {stats['in_progress']} in progress, "
+                f"{stats['completed']} completed, {stats['overdue']} overdue ({stats['progress']}%)")
+    task_statistics.short_description = 'Live task statistics'
 
 
 @admin.register(Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(AutocompleteFilterMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('title', 'project', 'status', 'priority', 'due_date', 'is_overdue_status')
-    list_filter = ('status', 'priority', 'project', 'created_at')
+    list_filter = ('status', 'priority', ('project', AutocompleteFilter), 'created_at')
+    list_select_related = ('project',)
+    # Counting the whole table for "N total" is the slowest query on a large changelist.
+    show_full_result_count = False
+    autocomplete_fields = ('project', 'created_by')
     search_fields = ('title', 'description')
+    search_kind = search.TASK
+    full_text_fields = ('title', 'description')
     readonly_fields = ('created_at', 'updated_at')
     fieldsets = (
         ('Basic Info', {
@@ -44,22 +151,63 @@ class TaskAdmin(admin.ModelAdmin):
         }),
     )
 
+    @admin.display(description='Status', ordering='due_date')
     def is_overdue_status(self, obj):
         return "⚠️ Overdue" if obj.is_overdue() else "On Time"
-    is_overdue_status.short_description = 'Status'
 
 
 @admin.register(TaskAssignment)
 class TaskAssignmentAdmin(admin.ModelAdmin):
     list_display = ('task', 'assigned_to', 'assigned_by', 'is_completed', 'assigned_at')
     list_filter = ('is_completed', 'assigned_at')
+    list_select_related = ('task', 'assigned_to', 'assigned_by')
+    autocomplete_fields = ('task', 'assigned_to', 'assigned_by')
     search_fields = ('task__title', 'assigned_to__username')
     readonly_fields = ('assigned_at', 'completed_at')
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(AutocompleteFilterMixin, FullTextSearchMixin, admin.ModelAdmin):
     list_display = ('task', 'author', 'created_at')
-    list_filter = ('created_at', 'author')
+    list_filter = ('created_at', ('author', AutocompleteFilter))
+    list_select_related = ('task', 'author')
+    autocomplete_fields = ('task', 'author')
     search_fields = ('task__title', 'author__username', 'content')
+    search_kind = search.COMMENT
+    full_text_fields = ('content',)
     readonly_fields = ('created_at', 'updated_at')
+
+
+@admin.register(TaskEvent)
+class TaskEventAdmin(admin.ModelAdmin):
+    """The activity log is append-only: events can be browsed but not edited."""
+    # Ids rather than objects: events outlive the tasks and projects they describe.
+    list_display = ('created_at', 'kind', 'project_id', 'task_id', 'actor_id')
+    list_filter = ('kind',)
+    date_hierarchy = 'created_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('name', 'queue', 'status', 'attempts', 'run_at', 'started_at', 'finished_at', 'locked_by')
+    list_filter = ('status', 'queue')
+    search_fields = ('name',)
+    date_hierarchy = 'created_at'
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'locked_by', 'last_error')
+    actions = ['retry']
+
+    @admin.action(description="Retry the selected jobs now")
+    def retry(self, request, queryset):
+        count = queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None, last_error='',
+        )
+        self.message_user(request, f"Queued {count} job(s) to run again.")
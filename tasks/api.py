@@ -0,0 +1,564 @@
+"""
+JSON API for teams, projects, tasks, assignments and comments.
+
+Every resource is served at ``api/<resource>/`` (list, create) and
+``api/<resource>/<id>/`` (read, update, delete), scoped to the teams of the
+logged-in user. Reads accept:
+
+- ``?fields=id,title`` to select top-level fields, and ``project.name`` style
+  entries to select the fields of an expanded relation;
+- ``?expand=project,comments`` to embed related objects, fetched with one
+  query per relation for the whole page;
+- ``?cursor=`` and ``?limit=`` for keyset pagination, plus per-resource filters.
+
+Responses carry a strong ETag computed from the ``updated_at`` (and other
+version) columns of every row they contain. The ETag is computed first, from
+narrow queries, so a request whose ``If-None-Match`` still matches is answered
+with 304 before any row is fully fetched or serialised. Writes honour
+``If-Match``.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.forms import model_to_dict, modelform_factory
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_http_methods
+
+from . import permissions
+from .models import Comment, Project, Task, TaskAssignment, Team
+from .pagination import InvalidCursor, KeysetPaginator
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class Relation:
+    """
+    An expandable relation of a resource.
+
+    ``kind`` is 'forward' for a foreign key on this model, 'reverse' for a
+    foreign key ``field`` on the related model, or 'm2m' for a many-to-many
+    field on this model.
+    """
+
+    def __init__(self, resource, kind, field):
+        self.resource = resource
+        self.kind = kind
+        self.field = field
+
+
+class Resource:
+    name = None
+    model = None
+    fields = ()
+    default_fields = None
+    writable_fields = ()
+    # Writable fields that only a create sets; updates leave them alone.
+    create_only_fields = ()
+    filters = ()
+    relations = {}
+    # Columns whose values change whenever the serialised row does.
+    version_fields = ('updated_at',)
+    ordering = ('-id',)
+
+    def scope(self, user):
+        """The rows ``user`` may see."""
+        raise NotImplementedError
+
+    def field_querysets(self, user):
+        """Choices for the writable foreign keys, limited to what ``user`` may see."""
+        return {}
+
+    def can_change(self, instance, user):
+        """Whether ``user``, who can see ``instance``, may also update or delete it."""
+        return True
+
+    def before_create(self, instance, user):
+        pass
+
+    def after_create(self, instance, user):
+        pass
+
+    def before_update(self, instance, user):
+        pass
+
+    # Columns
+
+    def column(self, name):
+        return self.model._meta.get_field(name).attname
+
+    def fetch(self, queryset, names):
+        """Rows of ``queryset`` as dicts keyed by field name, in queryset order."""
+        columns = [(name, self.column(name)) for name in names]
+        rows = queryset.values(*(column for _, column in columns))
+        return [{name: row[column] for name, column in columns} for row in rows]
+
+
+class UserResource(Resource):
+    name = 'users'
+    model = User
+    fields = ('id', 'username', 'first_name', 'last_name')
+    # Users are only embedded; they have no version column.
+    version_fields = ()
+
+
+class TeamResource(Resource):
+    name = 'teams'
+    model = Team
+    fields = ('id', 'name', 'description', 'owner', 'created_at', 'updated_at')
+    writable_fields = ('name', 'description')
+    relations = {
+        'owner': Relation('users', 'forward', 'owner'),
+        'members': Relation('users', 'm2m', 'members'),
+        'projects': Relation('projects', 'reverse', 'team'),
+    }
+
+    def scope(self, user):
+        return permissions.for_user(user).teams()
+
+    def can_change(self, instance, user):
+        # Deleting a team deletes its projects and tasks; the HTML app has no team deletion at all.
+        return instance.owner_id == user.pk
+
+    def before_create(self, instance, user):
+        instance.owner = user
+
+    def after_create(self, instance, user):
+        instance.members.add(user)
+
+
+class ProjectResource(Resource):
+    name = 'projects'
+    model = Project
+    fields = ('id', 'name', 'description', 'team', 'owner', 'created_at', 'updated_at') + Project.TASK_COUNTER_FIELDS
+    default_fields = ('id', 'name', 'description', 'team', 'owner', 'task_count', 'completed_count', 'updated_at')
+    writable_fields = ('name', 'description', 'team')
+    filters = ('team',)
+    relations = {
+        'team': Relation('teams', 'forward', 'team'),
+        'owner': Relation('users', 'forward', 'owner'),
+        'tasks': Relation('tasks', 'reverse', 'project'),
+    }
+    # The counters are refreshed without touching updated_at.
+    version_fields = ('updated_at',) + Project.TASK_COUNTER_FIELDS
+
+    def scope(self, user):
+        return permissions.for_user(user).projects()
+
+    def field_querysets(self, user):
+        return {'team': permissions.for_user(user).teams()}
+
+    def can_change(self, instance, user):
+        return instance.owner_id == user.pk
+
+    def before_create(self, instance, user):
+        instance.owner = user
+
+
+class TaskResource(Resource):
+    name = 'tasks'
+    model = Task
+    fields = ('id', 'title', 'description', 'project', 'status', 'priority', 'created_by', 'due_date',
+              'comment_count', 'created_at', 'updated_at')
+    writable_fields = ('title', 'description', 'project', 'status', 'priority', 'due_date')
+    filters = ('project', 'status', 'priority')
+    relations = {
+        'project': Relation('projects', 'forward', 'project'),
+        'created_by': Relation('users', 'forward', 'created_by'),
+        'assignments': Relation('assignments', 'reverse', 'task'),
+        'comments': Relation('comments', 'reverse', 'task'),
+    }
+    # Comments change the count without touching updated_at.
+    version_fields = ('updated_at', 'comment_count')
+
+    def scope(self, user):
+        return permissions.for_user(user).tasks()
+
+    def field_querysets(self, user):
+        return {'project': permissions.for_user(user).projects()}
+
+    def before_create(self, instance, user):
+        instance.created_by = user
+
+
+class AssignmentResource(Resource):
+    name = 'assignments'
+    model = TaskAssignment
+    fields = ('id', 'task', 'assigned_to', 'assigned_by', 'assigned_at', 'is_completed', 'completed_at', 'updated_at')
+    writable_fields = ('task', 'assigned_to', 'is_completed')
+    create_only_fields = ('task', 'assigned_to')
+    filters = ('task', 'assigned_to', 'is_completed')
+    relations = {
+        'task': Relation('tasks', 'forward', 'task'),
+        'assigned_to': Relation('users', 'forward', 'assigned_to'),
+        'assigned_by': Relation('users', 'forward', 'assigned_by'),
+    }
+
+    def scope(self, user):
+        return TaskAssignment.objects.filter(task__project_id__in=permissions.for_user(user).project_ids)
+
+    def field_querysets(self, user):
+        memberships = permissions.for_user(user)
+        return {'task': memberships.tasks(), 'assigned_to': memberships.members()}
+
+    def can_change(self, instance, user):
+        # As complete_assignment(): the assignee or the task's creator.
+        return user.pk in (instance.assigned_to_id, instance.task.created_by_id)
+
+    def before_create(self, instance, user):
+        instance.assigned_by = user
+        self.stamp_completion(instance)
+
+    def before_update(self, instance, user):
+        self.stamp_completion(instance)
+
+    def stamp_completion(self, instance):
+        """Keep completed_at, which the dashboard and burndown read, in step with is_completed."""
+        if not instance.is_completed:
+            instance.completed_at = None
+        elif instance.completed_at is None:
+            instance.completed_at = timezone.now()
+
+
+class CommentResource(Resource):
+    name = 'comments'
+    model = Comment
+    fields = ('id', 'task', 'author', 'content', 'created_at', 'updated_at')
+    writable_fields = ('task', 'content')
+    filters = ('task', 'author')
+    relations = {
+        'task': Relation('tasks', 'forward', 'task'),
+        'author': Relation('users', 'forward', 'author'),
+    }
+
+    def scope(self, user):
+        return Comment.objects.filter(task__project_id__in=permissions.for_user(user).project_ids)
+
+    def field_querysets(self, user):
+        return {'task': permissions.for_user(user).tasks()}
+
+    def can_change(self, instance, user):
+        return instance.author_id == user.pk
+
+    def before_create(self, instance, user):
+        instance.author = user
+
+
+RESOURCES = {
+    resource.name: resource
+    for resource in (UserResource(), TeamResource(), ProjectResource(), TaskResource(),
+                     AssignmentResource(), CommentResource())
+}
+# Resources with endpoints; users are only embedded.
+ENDPOINTS = ('teams', 'projects', 'tasks', 'assignments', 'comments')
+
+
+class Selection:
+    """The fields and expansions requested for a resource, parsed from ?fields= and ?expand=."""
+
+    def __init__(self, resource, fields=None, expand=()):
+        self.resource = resource
+        nested = {}
+        top = []
+        for name in fields or ():
+            head, _, rest = name.partition('.')
+            if rest:
+                nested.setdefault(head, []).append(rest)
+            else:
+                top.append(head)
+        nested_expand = {}
+        for name in expand:
+            head, _, rest = name.partition('.')
+            nested_expand.setdefault(head, [])
+            if rest:
+                nested_expand[head].append(rest)
+        self.expand = {}
+        for head, child_expand in nested_expand.items():
+            relation = resource.relations.get(head)
+            if relation is None:
+                raise ApiError(400, f"Cannot expand {head!r} on {resource.name}.")
+            self.expand[head] = Selection(RESOURCES[relation.resource], nested.get(head), child_expand)
+        for head in nested:
+            if head not in self.expand:
+                raise ApiError(400, f"Select fields of {head!r} only together with ?expand={head}.")
+
+        self.fields = list(top or resource.default_fields or resource.fields)
+        unknown = [name for name in self.fields if name not in resource.fields]
+        if unknown:
+            raise ApiError(400, f"Unknown field(s) for {resource.name}: {', '.join(unknown)}.")
+        if 'id' not in self.fields:
+            self.fields.insert(0, 'id')
+
+    @classmethod
+    def from_request(cls, resource, request):
+        def split(param):
+            return [part for part in request.GET.get(param, '').split(',') if part]
+        return cls(resource, split('fields'), split('expand'))
+
+    def key(self):
+        return (self.resource.name, tuple(self.fields),
+                tuple((name, child.key()) for name, child in sorted(self.expand.items())))
+
+    def plain_fields(self):
+        names = list(self.fields)
+        # Forward expansions replace the foreign key value, so make sure it is fetched.
+        for name in self.expand:
+            if self.resource.relations[name].kind == 'forward' and name not in names:
+                names.append(name)
+        return names
+
+    def _related(self, name, **lookup):
+        return self.expand[name].resource.model._default_manager.filter(**lookup)
+
+    # ETag
+
+    def versions(self, queryset):
+        """
+        The version columns of the rows of ``queryset`` and of everything
+        expanded from them, read with narrow queries.
+        """
+        resource = self.resource
+        forward = [name for name in self.expand if resource.relations[name].kind == 'forward']
+        version_columns = list(resource.version_fields) + [resource.column(name) for name in forward]
+        rows = list(queryset.order_by('pk').values_list('pk', *version_columns))
+        pks = [row[0] for row in rows]
+        result = [rows]
+        for name, child in self.expand.items():
+            relation = resource.relations[name]
+            if relation.kind == 'forward':
+                position = 1 + len(resource.version_fields) + forward.index(name)
+                related_pks = {row[position] for row in rows} - {None}
+                result.append(child.versions(self._related(name, pk__in=related_pks)))
+            elif relation.kind == 'reverse':
+                result.append(child.versions(self._related(name, **{f'{relation.field}__in': pks})))
+            else:
+                pairs = list(_m2m_pairs(resource, relation, pks))
+                related_pks = {pk for _, pk in pairs}
+                result.append((pairs, child.versions(self._related(name, pk__in=related_pks))))
+        return result
+
+    # Serialisation
+
+    def rows(self, queryset, parent=None):
+        """
+        Serialise the rows of ``queryset``, in its order, with their expansions.
+
+        With ``parent``, the name of a foreign key, each row also carries its
+        value as ``_parent``.
+        """
+        resource = self.resource
+        names = self.plain_fields()
+        rows = resource.fetch(queryset, names if parent in names or parent is None else names + [parent])
+        if parent:
+            for row in rows:
+                row['_parent'] = row[parent] if parent in names else row.pop(parent)
+        pks = [row['id'] for row in rows]
+        for name, child in self.expand.items():
+            relation = resource.relations[name]
+            if relation.kind == 'forward':
+                related_pks = {row[name] for row in rows} - {None}
+                related = {row['id']: row for row in child.rows(self._related(name, pk__in=related_pks))}
+                for row in rows:
+                    row[name] = related.get(row[name])
+                continue
+            grouped = {}
+            if relation.kind == 'reverse':
+                children = self._related(name, **{f'{relation.field}__in': pks}).order_by(*child.resource.ordering)
+                for child_row in child.rows(children, parent=relation.field):
+                    grouped.setdefault(child_row.pop('_parent'), []).append(child_row)
+            else:
+                pairs = list(_m2m_pairs(resource, relation, pks))
+                related_pks = {pk for _, pk in pairs}
+                related = {row['id']: row for row in child.rows(self._related(name, pk__in=related_pks))}
+                for parent_pk, pk in pairs:
+                    grouped.setdefault(parent_pk, []).append(related[pk])
+            for row in rows:
+                row[name] = grouped.get(row['id'], [])
+        return rows
+
+    def serialize(self, pks):
+        """Serialise the rows with ``pks``, in that order."""
+        by_pk = {row['id']: row for row in self.rows(self.resource.model._default_manager.filter(pk__in=pks))}
+        return [by_pk[pk] for pk in pks if pk in by_pk]
+
+
+def _m2m_pairs(resource, relation, pks):
+    """(parent pk, related pk) pairs of a many-to-many relation."""
+    field = resource.model._meta.get_field(relation.field)
+    through = field.remote_field.through
+    source = field.m2m_field_name()
+    target = field.m2m_reverse_field_name()
+    return through.objects.filter(**{f'{source}__in': pks}).order_by(source, target).values_list(
+        f'{source}_id', f'{target}_id',
+    )
+
+
+def etag_for(selection, queryset, extra=()):
+    """A strong ETag for ``selection`` over the rows of ``queryset``, and those rows' version columns."""
+    versions = selection.versions(queryset)
+    payload = repr((selection.key(), versions, extra))
+    return '"' + hashlib.sha256(payload.encode()).hexdigest()[:32] + '"', versions
+
+
+def _json(data, status=200, etag=None):
+    response = JsonResponse(data, status=status, encoder=DjangoJSONEncoder, safe=False)
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def _error(status, detail, **extra):
+    return _json({'detail': detail, **extra}, status=status)
+
+
+def _parse_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, "The request body is not valid JSON.")
+    if not isinstance(data, dict):
+        raise ApiError(400, "The request body must be a JSON object.")
+    return data
+
+
+def _form(resource, user, data, instance=None):
+    fields = resource.writable_fields
+    if instance is not None:
+        fields = [name for name in fields if name not in resource.create_only_fields]
+    form_class = modelform_factory(resource.model, fields=fields)
+    if instance is not None:
+        # PATCH semantics: fields missing from the body keep their current values.
+        data = {**model_to_dict(instance, fields=fields), **data}
+    else:
+        # Fields missing from the body take the model defaults.
+        defaults = {name: field.initial() if callable(field.initial) else field.initial
+                    for name, field in form_class.base_fields.items() if field.initial is not None}
+        data = {**defaults, **data}
+    form = form_class(data=data, instance=instance)
+    for name, queryset in resource.field_querysets(user).items():
+        if name in form.fields:
+            form.fields[name].queryset = queryset
+    return form
+
+
+def _saved(resource, pk, status=200):
+    selection = Selection(resource)
+    etag, _ = etag_for(selection, resource.model._default_manager.filter(pk=pk))
+    return _json(selection.serialize([pk])[0], status=status, etag=etag)
+
+
+def api_view(view):
+    """Answer anonymous requests with 401 and turn ApiErrors into JSON error responses."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error(401, "Authentication required.")
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return _error(error.status, error.detail)
+    return wrapper
+
+
+@require_http_methods(['GET', 'HEAD', 'POST'])
+@api_view
+def resource_list(request, resource):
+    """List the rows of a resource (GET) or create one (POST)."""
+    resource = RESOURCES[resource]
+    if request.method == 'POST':
+        return _create(request, resource)
+
+    selection = Selection.from_request(resource, request)
+    queryset = resource.scope(request.user)
+    try:
+        for name in resource.filters:
+            if name in request.GET:
+                queryset = queryset.filter(**{resource.column(name): request.GET[name]})
+    except (ValueError, ValidationError):
+        raise ApiError(400, "Invalid filter value.")
+    try:
+        limit = min(int(request.GET.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        raise ApiError(400, "limit must be an integer.")
+    if limit < 1:
+        raise ApiError(400, "limit must be positive.")
+
+    # Locate the page by primary key alone; rows are only fetched after the ETag check.
+    paginator = KeysetPaginator(queryset.only('pk'), limit, resource.ordering)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise ApiError(400, "Invalid cursor.")
+    pks = [obj.pk for obj in page]
+
+    etag, _ = etag_for(selection, resource.model._default_manager.filter(pk__in=pks),
+                       (pks, page.next_cursor, page.previous_cursor))
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    return _json({
+        'results': selection.serialize(pks),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }, etag=etag)
+
+
+@require_http_methods(['GET', 'HEAD', 'PATCH', 'DELETE'])
+@api_view
+def resource_detail(request, resource, pk):
+    """Read (GET), update (PATCH) or delete (DELETE) one row of a resource."""
+    resource = RESOURCES[resource]
+    writing = request.method not in ('GET', 'HEAD')
+    selection = Selection(resource) if writing else Selection.from_request(resource, request)
+    # The version query doubles as the access check.
+    etag, versions = etag_for(selection, resource.scope(request.user).filter(pk=pk))
+    if not versions[0]:
+        raise ApiError(404, "Not found.")
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    if not writing:
+        return _json(selection.serialize([pk])[0], etag=etag)
+
+    instance = resource.model._default_manager.get(pk=pk)
+    if not resource.can_change(instance, request.user):
+        raise ApiError(403, "You may not change or delete this.")
+    if request.method == 'DELETE':
+        instance.delete()
+        return HttpResponse(status=204)
+    form = _form(resource, request.user, _parse_body(request), instance)
+    if not form.is_valid():
+        return _error(400, "Invalid data.", errors=form.errors.get_json_data())
+    instance = form.save(commit=False)
+    resource.before_update(instance, request.user)
+    instance.save()
+    form.save_m2m()
+    return _saved(resource, pk)
+
+
+def _create(request, resource):
+    form = _form(resource, request.user, _parse_body(request))
+    if not form.is_valid():
+        return _error(400, "Invalid data.", errors=form.errors.get_json_data())
+    instance = form.save(commit=False)
+    resource.before_create(instance, request.user)
+    instance.save()
+    form.save_m2m()
+    resource.after_create(instance, request.user)
+    response = _saved(resource, instance.pk, status=201)
+    response['Location'] = reverse(f'api-{resource.name}-detail', args=[instance.pk])
+    return response
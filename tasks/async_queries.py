@@ -0,0 +1,45 @@
+"""
+Concurrent query fan-out for the async views.
+
+Django's async ORM methods (aget(), acount(), ...) run every query on the one
+thread that owns the request's database connection, so awaiting several of
+them together does not overlap them. gather_queries() instead runs each
+independent query on its own worker thread, with its own connection, when
+settings.ASYNC_QUERY_FANOUT allows it. SQLite serialises access to a database
+file and in-memory test databases are private to their connection, so the
+setting is off there and the queries run one after another.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+
+def fanout_enabled():
+    # Worker threads cannot see the rows of an open transaction on the request's
+    # connection (e.g. ATOMIC_REQUESTS or TestCase), so queries stay on it then.
+    return getattr(settings, 'ASYNC_QUERY_FANOUT', False) and not connection.in_atomic_block
+
+
+def _run_on_worker(query):
+    try:
+        return query()
+    finally:
+        # Worker threads are reused by the executor; release their connections
+        # the same way request_finished does for the request thread.
+        close_old_connections()
+
+
+async def gather_queries(*queries):
+    """
+    Evaluate independent, synchronous ORM callables and return their results in order.
+
+    Every callable must evaluate its queryset fully (e.g. wrap it in list()), so
+    no query is left to run lazily on another thread.
+    """
+    if fanout_enabled():
+        return await asyncio.gather(
+            *(sync_to_async(_run_on_worker, thread_sensitive=False)(query) for query in queries)
+        )
+    return [await sync_to_async(query)() for query in queries]
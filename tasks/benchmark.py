@@ -0,0 +1,485 @@
+"""
+Query-count and latency benchmarks for the routes in tasks/urls.py.
+
+seed_dataset() fills the database with a synthetic workload and measure_routes()
+requests every named route as an authenticated user, recording the query count,
+total SQL time and wall time of each. The check_perf_budgets management command
+compares the results with the budgets checked in at tasks/perf_budgets.json.
+
+seed_assignments() and measure_assigned_to() compare the ways of finding the
+tasks assigned to a user (see the benchmark_assignments management command).
+
+seed_comments() and measure_search() compare full-text index lookups with
+icontains scans (see the benchmark_search management command).
+
+measure_serializers() compares the JSON API's serialisation, with and without
+sparse fieldsets and expansion, against django.core.serializers (see the
+benchmark_api management command).
+
+run_load() drives a running HTTP server with concurrent requests and reports
+latency percentiles and throughput (see the load_test management command).
+
+seed_writers() and run_writers() measure the same for concurrent writers
+posting comments and completing assignments, to compare database settings
+(see the benchmark_writers management command).
+"""
+import http.client
+import itertools
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import api, search, urls
+from .models import Team, Project, Task, TaskAssignment, Comment
+
+BUDGET_FILE = Path(__file__).resolve().parent / 'perf_budgets.json'
+BENCHMARK_USERNAME = 'benchmark'
+BENCHMARK_PASSWORD = 'benchmark-password'
+
+# Routes that log the user out are requested last so the others stay authenticated.
+LAST_ROUTES = ('logout',)
+
+
+def seed_dataset(teams=1000, projects_per_team=3, tasks_per_project=10, members_per_team=5,
+                 comments_per_task=2, member_teams=50, batch_size=1000, seed=0):
+    """
+    Create a synthetic dataset and return the user the routes are requested as.
+
+    The benchmark user belongs to ``member_teams`` of the teams and is assigned
+    to every task in them, so per-user pages see realistic row counts.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    user = User.objects.create_user(username=BENCHMARK_USERNAME, password=BENCHMARK_PASSWORD)
+    others = User.objects.bulk_create(
+        User(username=f'member{i}') for i in range(max(members_per_team * 4, 1))
+    )
+
+    team_objs = Team.objects.bulk_create(
+        (Team(name=f'Team {i}', description=f'Synthetic team {i}', owner=user) for i in range(teams)),
+        batch_size=batch_size,
+    )
+    memberships = []
+    for i, team in enumerate(team_objs):
+        members = rng.sample(others, min(members_per_team, len(others)))
+        if i < member_teams:
+            members.append(user)
+        memberships.extend(Team.members.through(team_id=team.pk, user_id=member.pk) for member in members)
+    Team.members.through.objects.bulk_create(memberships, batch_size=batch_size)
+
+    project_objs = Project.objects.bulk_create(
+        (Project(name=f'Project {team.pk}-{j}', team=team, owner=user)
+         for team in team_objs for j in range(projects_per_team)),
+        batch_size=batch_size,
+    )
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    priorities = [choice for choice, _ in Task.PRIORITY_CHOICES]
+    task_objs = Task.objects.bulk_create(
+        (Task(
+            title=f'Task {project.pk}-{k}',
+            description='Synthetic task used by the route benchmarks.',
+            project=project,
+            status=rng.choice(statuses),
+            priority=rng.choice(priorities),
+            created_by=user,
+            due_date=now + timedelta(days=rng.randint(-30, 30)),
+        ) for project in project_objs for k in range(tasks_per_project)),
+        batch_size=batch_size,
+    )
+
+    member_team_ids = {team.pk for team in team_objs[:member_teams]}
+    member_project_ids = {project.pk for project in project_objs if project.team_id in member_team_ids}
+    assignments = []
+    comments = []
+    for task in task_objs:
+        assignee = user if task.project_id in member_project_ids else rng.choice(others)
+        assignments.append(TaskAssignment(task=task, assigned_to=assignee, assigned_by=user))
+        comments.extend(
+            Comment(task=task, author=rng.choice(others), content=f'Comment {c} on task {task.pk}.')
+            for c in range(comments_per_task)
+        )
+    TaskAssignment.objects.bulk_create(assignments, batch_size=batch_size)
+    Comment.objects.bulk_create(comments, batch_size=batch_size)
+    return user
+
+
+def route_kwargs(user):
+    """Return URL kwargs for every parameterised route, using rows the user can see."""
+    team = user.teams.order_by('pk').first()
+    project = Project.objects.filter(team=team).order_by('pk').first()
+    task = Task.objects.filter(project=project).order_by('pk').first()
+    assignment = TaskAssignment.objects.filter(assigned_to=user).order_by('pk').first()
+    comment = Comment.objects.filter(task=task).order_by('pk').first()
+    return {
+        'team-detail': {'pk': team.pk},
+        'project-detail': {'pk': project.pk},
+        'project-update': {'pk': project.pk},
+        'project-events': {'pk': project.pk},
+        'project-burndown': {'pk': project.pk},
+        'task-detail': {'pk': task.pk},
+        'task-update': {'pk': task.pk},
+        'task-delete': {'pk': task.pk},
+        'task-events': {'pk': task.pk},
+        'assign-task': {'pk': task.pk},
+        'complete-assignment': {'pk': assignment.pk},
+        'add-comment': {'task_pk': task.pk},
+        'task-comments': {'task_pk': task.pk},
+        'api-teams-detail': {'pk': team.pk},
+        'api-projects-detail': {'pk': project.pk},
+        'api-tasks-detail': {'pk': task.pk},
+        'api-assignments-detail': {'pk': assignment.pk},
+        'api-comments-detail': {'pk': comment.pk},
+    }
+
+
+def named_routes():
+    """Return {name: pattern} for every named route in tasks/urls.py, logout-style routes last."""
+    patterns = [p for p in urls.urlpatterns if isinstance(p, URLPattern) and p.name]
+    patterns.sort(key=lambda p: p.name in LAST_ROUTES)
+    return {p.name: p for p in patterns}
+
+
+def measure_routes(user, names=None):
+    """Request each route as ``user`` and return {name: measurement}."""
+    client = Client()
+    client.force_login(user)
+    kwargs_by_route = route_kwargs(user)
+    routes = named_routes()
+    results = {}
+    for name in names or routes:
+        if routes[name].pattern.converters and name not in kwargs_by_route:
+            raise KeyError(f"No benchmark fixture for route {name!r}; add it to route_kwargs().")
+        url = reverse(name, kwargs=kwargs_by_route.get(name))
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            wall = time.perf_counter() - start
+        results[name] = {
+            'url': url,
+            'status': response.status_code,
+            'queries': len(queries),
+            'sql_ms': round(sum(float(q['time']) for q in queries.captured_queries) * 1000, 2),
+            'wall_ms': round(wall * 1000, 2),
+        }
+    return results
+
+
+# Ways of answering "which tasks are assigned to this user?".
+ASSIGNED_TO_STRATEGIES = {
+    'distinct_join': lambda user: Task.objects.filter(assignments__assigned_to=user).distinct(),
+    'exists': lambda user: Task.objects.assigned_to(user),
+    'in_subquery': lambda user: Task.objects.filter(
+        pk__in=TaskAssignment.objects.filter(assigned_to=user).values('task_id')
+    ),
+}
+
+
+def seed_assignments(total, users=200, assignees_per_task=2, projects=50, batch_size=5000, seed=0):
+    """
+    Create ``total`` task assignments spread over ``users`` users.
+
+    Returns the user with the most assignments, the worst case for per-user lookups.
+    """
+    rng = random.Random(seed)
+    owner = User.objects.create_user(username=BENCHMARK_USERNAME)
+    assignees = [owner] + User.objects.bulk_create(User(username=f'assignee{i}') for i in range(users - 1))
+    team = Team.objects.create(name='Assignment benchmark', owner=owner)
+    project_objs = Project.objects.bulk_create(
+        Project(name=f'Project {i}', team=team, owner=owner) for i in range(projects)
+    )
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    now = timezone.now()
+
+    remaining = total
+    while remaining > 0:
+        task_count = min(batch_size, -(-remaining // assignees_per_task))
+        task_objs = Task.objects.bulk_create(
+            Task(
+                title='Benchmark task',
+                project=rng.choice(project_objs),
+                status=rng.choice(statuses),
+                priority=rng.randint(1, 4),
+                due_date=now + timedelta(days=rng.randint(-30, 30)),
+            )
+            for _ in range(task_count)
+        )
+        assignments = []
+        for task in task_objs:
+            # The owner is over-represented so it has a realistic "busy user" share.
+            chosen = {owner} if rng.random() < 0.05 else set()
+            while len(chosen) < assignees_per_task:
+                chosen.add(rng.choice(assignees))
+            assignments.extend(TaskAssignment(task=task, assigned_to=user) for user in chosen)
+        assignments = assignments[:remaining]
+        TaskAssignment.objects.bulk_create(assignments, batch_size=batch_size)
+        remaining -= len(assignments)
+    return owner
+
+
+def measure_assigned_to(user, repeat=5, page_size=20):
+    """Time count() and the first ordered page for every strategy; returns {strategy: timings}."""
+    results = {}
+    for name, strategy in ASSIGNED_TO_STRATEGIES.items():
+        timings = {'count_ms': [], 'first_page_ms': []}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            count = strategy(user).count()
+            timings['count_ms'].append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            list(strategy(user).order_by('-priority', 'due_date', 'id')[:page_size])
+            timings['first_page_ms'].append((time.perf_counter() - start) * 1000)
+        results[name] = {
+            'rows': count,
+            'count_ms': round(sorted(timings['count_ms'])[repeat // 2], 2),
+            'first_page_ms': round(sorted(timings['first_page_ms'])[repeat // 2], 2),
+        }
+    return results
+
+
+# Ways of finding the comments that mention a word.
+SEARCH_STRATEGIES = {
+    'icontains': lambda word: Comment.objects.filter(content__icontains=word),
+    'fts5': lambda word: Comment.objects.filter(search.matching(search.COMMENT, word)),
+}
+
+
+def vocabulary(size=5000):
+    """Distinct pronounceable words; lower indexes are used more often by seed_comments()."""
+    syllables = [c + v for c in 'bcdfghklmnprstvz' for v in 'aeiou']
+    return [
+        syllables[i % 80] + syllables[i // 80 % 80] + syllables[i // 6400 % 80] for i in range(size)
+    ]
+
+
+def seed_comments(total, tasks=1000, words_per_comment=20, batch_size=10_000, seed=0):
+    """
+    Create ``total`` comments of Zipf-distributed vocabulary() words and index them.
+
+    Returns the vocabulary, most frequent word first.
+    """
+    rng = random.Random(seed)
+    words = vocabulary()
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    author = User.objects.create_user(username=BENCHMARK_USERNAME)
+    team = Team.objects.create(name='Search benchmark', owner=author)
+    project = Project.objects.create(name='Search benchmark', team=team, owner=author)
+    task_ids = [task.pk for task in Task.objects.bulk_create(
+        Task(title=f'Task {i}', project=project) for i in range(tasks)
+    )]
+    for start in range(0, total, batch_size):
+        Comment.objects.bulk_create(
+            Comment(task_id=rng.choice(task_ids), author=author,
+                    content=' '.join(rng.choices(words, weights, k=words_per_comment)))
+            for _ in range(min(batch_size, total - start))
+        )
+    return words
+
+
+def measure_search(words, repeat=5, page_size=20):
+    """Time count() and the newest page of matches per strategy; returns {word: {strategy: timings}}."""
+    results = {}
+    for word in words:
+        results[word] = {}
+        for name, strategy in SEARCH_STRATEGIES.items():
+            timings = {'count_ms': [], 'first_page_ms': []}
+            for _ in range(repeat):
+                start = time.perf_counter()
+                count = strategy(word).count()
+                timings['count_ms'].append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                list(strategy(word).order_by('-created_at')[:page_size])
+                timings['first_page_ms'].append((time.perf_counter() - start) * 1000)
+            results[word][name] = {
+                'rows': count,
+                'count_ms': round(sorted(timings['count_ms'])[repeat // 2], 2),
+                'first_page_ms': round(sorted(timings['first_page_ms'])[repeat // 2], 2),
+            }
+    return results
+
+
+# Ways of turning a page of tasks into JSON.
+SERIALIZER_STRATEGIES = {
+    'api_default': lambda pks: api.Selection(api.RESOURCES['tasks']).serialize(pks),
+    'api_sparse': lambda pks: api.Selection(api.RESOURCES['tasks'], ['id', 'title', 'status']).serialize(pks),
+    'api_expand': lambda pks: api.Selection(
+        api.RESOURCES['tasks'], expand=['project', 'created_by', 'comments.author'],
+    ).serialize(pks),
+    'django_serializers': lambda pks: json.loads(serializers.serialize('json', Task.objects.filter(pk__in=pks))),
+}
+
+
+def measure_serializers(page_size=100, repeat=5):
+    """Serialise pages of ``page_size`` tasks per strategy and JSON-encode them; returns {strategy: timings}."""
+    pks = list(Task.objects.order_by('-id').values_list('pk', flat=True)[:page_size])
+    results = {}
+    for name, strategy in SERIALIZER_STRATEGIES.items():
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                body = json.dumps(strategy(pks), cls=DjangoJSONEncoder)
+                timings.append(time.perf_counter() - start)
+        median = sorted(timings)[repeat // 2]
+        results[name] = {
+            'objects': len(pks),
+            'queries': len(queries),
+            'bytes': len(body),
+            'ms': round(median * 1000, 2),
+            'objects_per_s': round(len(pks) / median) if median else None,
+        }
+    return results
+
+
+def run_load(base_url, paths, cookie='', concurrency=20, total=1000, timeout=30):
+    """
+    GET ``paths`` round-robin from ``concurrency`` keep-alive connections, ``total`` requests in all.
+
+    Returns counts of requests and non-200 responses, requests per second and
+    the p50/p99 latencies in milliseconds.
+    """
+    url = urlsplit(base_url)
+    prefix = url.path.rstrip('/')
+    sequence = itertools.count()
+
+    def worker():
+        latencies, errors = [], 0
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=timeout)
+        try:
+            while (i := next(sequence)) < total:
+                start = time.perf_counter()
+                try:
+                    connection.request('GET', prefix + paths[i % len(paths)], headers={'Cookie': cookie})
+                    response = connection.getresponse()
+                    response.read()
+                    ok = response.status == 200
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+        finally:
+            connection.close()
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [future.result() for future in [pool.submit(worker) for _ in range(concurrency)]]
+    return _load_summary(results, time.perf_counter() - start)
+
+
+def _load_summary(results, elapsed):
+    """Requests, errors, requests per second and p50/p99 milliseconds of per-worker (latencies, errors)."""
+    latencies = sorted(latency for worker_latencies, _ in results for latency in worker_latencies)
+
+    def percentile(q):
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 2) if latencies else None
+
+    return {
+        'requests': len(latencies),
+        'errors': sum(errors for _, errors in results),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def seed_writers(writers, tasks_per_writer=50):
+    """Create a team of ``writers`` users, each assigned ``tasks_per_writer`` tasks; return the users."""
+    users = [User.objects.create_user(username=f'writer{i}') for i in range(writers)]
+    team = Team.objects.create(name='Writers', owner=users[0])
+    team.members.add(*users)
+    project = Project.objects.create(name='Writers', team=team, owner=users[0])
+    tasks = Task.objects.bulk_create(
+        Task(title=f'Task {i}', project=project, created_by=users[0]) for i in range(writers * tasks_per_writer)
+    )
+    TaskAssignment.objects.bulk_create(
+        TaskAssignment(task=task, assigned_to=users[i % writers], assigned_by=users[0])
+        for i, task in enumerate(tasks)
+    )
+    return users
+
+
+def run_writers(users, requests_per_writer=100):
+    """
+    POST comments to and complete the assignments of each user's tasks, in
+    turn, from one thread per user, all at once.
+
+    Requests go through the test client, each thread on its own connection,
+    which is closed or kept between requests as settings.DATABASES says, as a
+    server would. Returns run_load()'s figures; errors are requests that failed
+    with a database error, such as "database is locked".
+    """
+    ready = threading.Barrier(len(users) + 1, timeout=60)
+
+    def worker(user):
+        client = Client()
+        client.force_login(user)
+        paths = [
+            path
+            for assignment in TaskAssignment.objects.filter(assigned_to=user).order_by('pk')
+            for path in (reverse('add-comment', args=[assignment.task_id]),
+                         reverse('complete-assignment', args=[assignment.pk]))
+        ]
+        close_old_connections()
+        ready.wait()
+        latencies, errors = [], 0
+        try:
+            for i in range(requests_per_writer):
+                start = time.perf_counter()
+                try:
+                    response = client.post(paths[i % len(paths)], {'content': f'Comment {i} by {user.username}.'})
+                    ok = response.status_code == 302
+                except DatabaseError:
+                    ok = False
+                finally:
+                    # What the request_finished signal does in a server.
+                    close_old_connections()
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+        finally:
+            connection.close()
+        return latencies, errors
+
+    with ThreadPoolExecutor(len(users)) as pool:
+        futures = [pool.submit(worker, user) for user in users]
+        ready.wait()
+        start = time.perf_counter()
+        results = [future.result() for future in futures]
+    return _load_summary(results, time.perf_counter() - start)
+
+
+def load_budgets(path=BUDGET_FILE):
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_budgets(results, budgets, metrics=('queries', 'sql_ms', 'wall_ms')):
+    """Return a list of human-readable budget violations (empty when all pass)."""
+    failures = []
+    for name, result in results.items():
+        budget = budgets.get(name)
+        if budget is None:
+            failures.append(f"{name}: no budget defined")
+            continue
+        # A budget met by an error page or a redirect says nothing about the route.
+        if result['status'] != budget.get('status', 200):
+            failures.append(f"{name}: status {result['status']}, expected {budget.get('status', 200)}")
+            continue
+        for metric in metrics:
+            if metric in budget and result[metric] > budget[metric]:
+                failures.append(f"{name}: {metric} {result[metric]} exceeds budget {budget[metric]}")
+    return failures
@@ -0,0 +1,133 @@
+"""
+Burndown and throughput series per project, read from daily snapshots.
+
+A ProjectSnapshot row holds a project's task counters at the end of a day and
+the number of tasks completed that day, so a year-long series reads at most
+365 rows. ProjectQuerySet.refresh_task_counters(), which every task write goes
+through, upserts today's counters; completions are counted from the activity
+log as its events are written (record_completions()). The snapshot_projects
+command snapshots the projects nobody touched today, whose overdue counts may
+still have changed, and can recount completions from the log.
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Project, ProjectSnapshot, TaskEvent
+
+# The longest series served, in days.
+MAX_DAYS = 365
+
+SERIES_FIELDS = Project.TASK_COUNTER_FIELDS
+
+# Activity-log events that complete a task.
+COMPLETION_EVENTS = (
+    Q(kind=TaskEvent.TASK_UPDATED, data__changes__status__1='completed')
+    | Q(kind=TaskEvent.TASK_CREATED, data__status='completed')
+)
+
+
+def is_completion(event):
+    if event.kind == TaskEvent.TASK_UPDATED:
+        status = event.data.get('changes', {}).get('status')
+        return bool(status) and status[1] == 'completed'
+    return event.kind == TaskEvent.TASK_CREATED and event.data.get('status') == 'completed'
+
+
+def _add_completions(project_id, date, count):
+    updated = ProjectSnapshot.objects.filter(project_id=project_id, date=date).update(
+        completions=F('completions') + count,
+    )
+    if not updated:
+        # No counter refresh has snapshotted the project that day yet.
+        _create_snapshot(project_id, date, completions=count)
+
+
+def _create_snapshot(project_id, date, completions):
+    """A snapshot for ``date`` carrying the counters of the latest earlier one (today: the project's)."""
+    if date == timezone.localdate():
+        source = Project.objects.filter(pk=project_id).values(*SERIES_FIELDS).first()
+    else:
+        source = (ProjectSnapshot.objects.filter(project_id=project_id, date__lt=date)
+                  .order_by('-date').values(*SERIES_FIELDS).first())
+    if source is None and not Project.objects.filter(pk=project_id).exists():
+        return
+    ProjectSnapshot.objects.create(project_id=project_id, date=date, completions=completions, **(source or {}))
+
+
+def record_completions(events):
+    """Add the task completions among newly written activity-log ``events`` to their days' snapshots."""
+    counts = Counter(
+        (event.project_id, timezone.localdate(event.created_at))
+        for event in events if event.project_id is not None and is_completion(event)
+    )
+    for (project_id, date), count in counts.items():
+        _add_completions(project_id, date, count)
+
+
+def recount_completions(since, project_ids=None):
+    """Recount the completions of every day from ``since`` (a date) from the activity log."""
+    snapshots = ProjectSnapshot.objects.filter(date__gte=since)
+    events = TaskEvent.objects.filter(
+        COMPLETION_EVENTS, created_at__gte=timezone.make_aware(datetime.combine(since, time.min)),
+    )
+    if project_ids is not None:
+        snapshots = snapshots.filter(project_id__in=project_ids)
+        events = events.filter(project_id__in=project_ids)
+    snapshots.update(completions=0)
+    counts = (events.exclude(project_id=None).annotate(date=TruncDate('created_at'))
+              .order_by().values('project_id', 'date').annotate(count=Count('id')))
+    for row in counts:
+        _add_completions(row['project_id'], row['date'], row['count'])
+
+
+def snapshot_projects(project_ids, batch_size=500):
+    """Refresh the counters, and so today's snapshots, of ``project_ids``."""
+    project_ids = list(project_ids)
+    for start in range(0, len(project_ids), batch_size):
+        Project.objects.filter(pk__in=project_ids[start:start + batch_size]).refresh_task_counters()
+
+
+def unsnapshotted_projects(date=None):
+    """Ids of the projects without a snapshot for ``date`` (default today)."""
+    snapshotted = ProjectSnapshot.objects.filter(date=date or timezone.localdate()).values('project_id')
+    return Project.objects.exclude(pk__in=snapshotted).order_by('pk').values_list('pk', flat=True)
+
+
+def series(project_id, days=30, today=None):
+    """
+    The daily burndown and throughput of a project over the last ``days`` days
+    (at most MAX_DAYS), as parallel lists keyed by counter, plus ``dates``,
+    ``open`` (to do and in progress) and ``completions``.
+
+    Days without a snapshot carry the previous day's counters and no completions.
+    At most ``days`` rows are read.
+    """
+    days = max(1, min(days, MAX_DAYS))
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = {
+        row['date']: row for row in ProjectSnapshot.objects.filter(project_id=project_id, date__range=(start, today))
+        .order_by('date').values('date', 'completions', *SERIES_FIELDS)
+    }
+    current = {field: 0 for field in SERIES_FIELDS}
+    if start not in rows:
+        earlier = (ProjectSnapshot.objects.filter(project_id=project_id, date__lt=start)
+                   .order_by('-date').values(*SERIES_FIELDS).first())
+        current.update(earlier or {})
+
+    result = {'dates': [], 'open': [], 'completions': [], **{field: [] for field in SERIES_FIELDS}}
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        row = rows.get(date)
+        if row is not None:
+            current = row
+        result['dates'].append(date.isoformat())
+        for field in SERIES_FIELDS:
+            result[field].append(current[field])
+        result['open'].append(current['todo_count'] + current['in_progress_count'])
+        result['completions'].append(row['completions'] if row else 0)
+    return result
@@ -0,0 +1,88 @@
+"""
+Per-user dashboard cache.
+
+The dashboard payload is computed once and stored under a per-user key in the
+default cache. The signal handlers in tasks/signals.py delete the keys of the
+users a change can affect, so the payload is only recomputed when needed.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from . import permissions, routers
+from .async_queries import gather_queries
+from .models import Task, TaskAssignment, Team
+
+DASHBOARD_KEY = 'tasks:dashboard:{user_id}'
+
+
+def dashboard_key(user_id):
+    return DASHBOARD_KEY.format(user_id=user_id)
+
+
+def dashboard_queries(user):
+    """Return {name: callable} for the dashboard values; the queries are independent of each other."""
+    # Called from the event loop by abuild_dashboard(), so the memberships are only loaded by the queries.
+    return {
+        'my_tasks': lambda: list(Task.objects.assigned_to(user)[:5]),
+        'task_stats': lambda: Task.objects.assigned_to(user, aggregate=True).stats(),
+        'my_projects': lambda: list(permissions.for_user(user).projects().with_progress()[:3]),
+        'my_projects_count': lambda: len(permissions.for_user(user).project_ids),
+        'my_teams': lambda: list(permissions.for_user(user).teams().with_counts()),
+    }
+
+
+def build_dashboard(user):
+    """Compute the dashboard payload for ``user``; every value is a plain, picklable object."""
+    return {name: query() for name, query in dashboard_queries(user).items()}
+
+
+async def abuild_dashboard(user):
+    """Async build_dashboard(), running the queries concurrently where the backend allows."""
+    queries = dashboard_queries(user)
+    return dict(zip(queries, await gather_queries(*queries.values())))
+
+
+def get_dashboard(user):
+    """Return the cached dashboard payload for ``user``, building it on a miss."""
+    key = dashboard_key(user.pk)
+    payload = cache.get(key)
+    if payload is None:
+        # Read from the primary, so a lagging replica's rows are not cached.
+        with routers.read_from_primary():
+            payload = build_dashboard(user)
+        # The overdue count changes as time passes, so entries also expire.
+        cache.set(key, payload, settings.DASHBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_dashboard(user):
+    """Async get_dashboard()."""
+    key = dashboard_key(user.pk)
+    payload = await cache.aget(key)
+    if payload is None:
+        with routers.read_from_primary():
+            payload = await abuild_dashboard(user)
+        await cache.aset(key, payload, settings.DASHBOARD_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_dashboards(user_ids):
+    """Drop the cached dashboards of the given users."""
+    keys = [dashboard_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
+
+
+def users_affected_by_projects(project_ids):
+    """IDs of users whose dashboard shows any of the given projects or their tasks."""
+    members = Team.members.through.objects.filter(team__projects__in=project_ids).values_list('user_id', flat=True)
+    assignees = (
+        TaskAssignment.objects.filter(task__project__in=project_ids)
+        .order_by().values_list('assigned_to_id', flat=True)
+    )
+    return set(members.order_by().union(assignees))
+
+
+def users_affected_by_teams(team_ids):
+    """IDs of the members of the given teams."""
+    return set(Team.members.through.objects.filter(team_id__in=team_ids).values_list('user_id', flat=True))
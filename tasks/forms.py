@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.models import User
 
+from .models import Task
+
 
 class UserProfileForm(forms.ModelForm):
     """Form for editing user profile information."""
@@ -32,3 +34,34 @@ class UserProfileForm(forms.ModelForm):
             if existing.exists():
                 raise forms.ValidationError("This email address is already in use.")
         return email
+
+
+class BulkTaskActionForm(forms.Form):
+    """Validate a bulk action applied to the tasks selected on a list page."""
+    ACTION_CHOICES = [
+        ('status', 'Set status'),
+        ('priority', 'Set priority'),
+        ('shift_due', 'Shift due date'),
+        ('assign', 'Assign to'),
+        ('delete', 'Delete'),
+    ]
+    # The extra field each action needs.
+    ACTION_FIELDS = {
+        'status': 'status',
+        'priority': 'priority',
+        'shift_due': 'days',
+        'assign': 'assigned_to',
+    }
+
+    action = forms.ChoiceField(choices=ACTION_CHOICES)
+    status = forms.ChoiceField(choices=Task.STATUS_CHOICES, required=False)
+    priority = forms.TypedChoiceField(choices=Task.PRIORITY_CHOICES, coerce=int, required=False)
+    days = forms.IntegerField(required=False, min_value=-3650, max_value=3650)
+    assigned_to = forms.IntegerField(required=False)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        field = self.ACTION_FIELDS.get(cleaned_data.get('action'))
+        if field and cleaned_data.get(field) in (None, ''):
+            self.add_error(field, "This field is required for the selected action.")
+        return cleaned_data
@@ -0,0 +1,252 @@
+"""
+A small database-backed job queue.
+
+Functions decorated with @background can be enqueued; each call stores a Job
+row in the same database and transaction as the change that asked for it, so
+a job only becomes visible once that change commits and is never lost with no
+broker to fail. ``manage.py run_worker`` claims and runs the jobs with a pool
+of threads per queue, retrying failures with exponential backoff.
+
+Claiming uses SELECT ... FOR UPDATE SKIP LOCKED where the database has it and
+a conditional UPDATE elsewhere (SQLite), so any number of worker processes
+can share the queues.
+"""
+import logging
+import os
+import random
+import socket
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Job, Project, Task
+
+logger = logging.getLogger(__name__)
+
+# Retry delays: BACKOFF_BASE * 2 ** (attempt - 1) seconds, at most BACKOFF_MAX, with jitter.
+BACKOFF_BASE = 10
+BACKOFF_MAX = 60 * 60
+
+_registry = {}
+
+
+class BackgroundFunction:
+    """A function that can run in the background; call it to run it inline."""
+
+    def __init__(self, func, queue, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+        self.__name__ = func.__name__
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def job(self, delay=0, queue=None, **kwargs):
+        """An unsaved Job for a run, for queueing many at once with Job.objects.bulk_create()."""
+        return Job(
+            name=self.name,
+            queue=queue or self.queue,
+            kwargs=kwargs,
+            max_attempts=self.max_attempts,
+            run_at=timezone.now() + timedelta(seconds=delay),
+        )
+
+    def enqueue(self, delay=0, queue=None, **kwargs):
+        """Queue a run with JSON-serialisable keyword arguments, ``delay`` seconds from now."""
+        job = self.job(delay, queue, **kwargs)
+        job.save()
+        return job
+
+
+def background(queue='default', max_attempts=5):
+    """Register a function as a background job; enqueue it with ``func.enqueue(**kwargs)``."""
+    def decorator(func):
+        function = BackgroundFunction(func, queue, max_attempts)
+        _registry[function.name] = function
+        return function
+    return decorator
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def backoff(attempt):
+    """Seconds to wait before retrying after the ``attempt``-th failure."""
+    delay = min(BACKOFF_BASE * 2 ** (attempt - 1), BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claim(queue, limit, worker=None):
+    """Mark up to ``limit`` due jobs of ``queue`` as running and return them, oldest first."""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    due = Job.objects.filter(queue=queue, status=Job.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    running = {'status': Job.RUNNING, 'started_at': now, 'locked_by': worker or worker_id()}
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**running)
+    else:
+        # Whoever flips a row from queued to running owns it.
+        ids = [
+            pk for pk in due.values_list('id', flat=True)[:limit]
+            if Job.objects.filter(id=pk, status=Job.QUEUED).update(**running)
+        ]
+    return list(Job.objects.filter(id__in=ids).order_by('run_at', 'id'))
+
+
+def execute(job):
+    """Run a claimed job and record its outcome; failures are retried with backoff until max_attempts."""
+    function = _registry.get(job.name)
+    try:
+        if function is None:
+            raise LookupError(f"No background function named {job.name!r}.")
+        function(**job.kwargs)
+    except Exception:
+        _failed(job, traceback.format_exc())
+    else:
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE, finished_at=timezone.now(),
+                                             attempts=job.attempts + 1, last_error='')
+
+
+def _failed(job, error):
+    attempts = job.attempts + 1
+    if attempts < job.max_attempts:
+        logger.warning("Job %s (%s) failed, attempt %d of %d.", job.pk, job.name, attempts, job.max_attempts)
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.QUEUED, attempts=attempts, last_error=error, locked_by='',
+            run_at=timezone.now() + timedelta(seconds=backoff(attempts)),
+        )
+    else:
+        logger.error("Job %s (%s) failed for good after %d attempts.", job.pk, job.name, attempts)
+        Job.objects.filter(pk=job.pk).update(status=Job.FAILED, attempts=attempts, last_error=error,
+                                             finished_at=timezone.now())
+
+
+def requeue_stale(timeout=None):
+    """Treat jobs running for longer than ``timeout`` seconds (their worker died) as failed attempts."""
+    timeout = timeout if timeout is not None else settings.JOB_TIMEOUT
+    stale = Job.objects.filter(status=Job.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=timeout))
+    for job in stale:
+        if Job.objects.filter(pk=job.pk, status=Job.RUNNING, started_at=job.started_at).exists():
+            _failed(job, f"Timed out after {timeout} seconds on {job.locked_by}.")
+
+
+def prune(older_than_days=7):
+    """Delete finished jobs older than ``older_than_days``; failed jobs are kept for inspection."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()[0]
+
+
+def run_pending(queues=None, limit=100):
+    """Claim and run the due jobs of ``queues`` (default: all) in this thread; returns the number run."""
+    queues = queues or Job.objects.filter(status=Job.QUEUED).values_list('queue', flat=True).distinct()
+    count = 0
+    for queue in list(queues):
+        for job in claim(queue, limit):
+            execute(job)
+            count += 1
+    return count
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))], 3)
+
+
+def metrics(window=timedelta(hours=1)):
+    """
+    Per-queue depth and latency: {queue: {...}}.
+
+    ``queued`` counts jobs waiting (``ready`` of them due now), ``running``
+    and ``failed`` the jobs in those states. Over the jobs finished in the
+    last ``window``, ``wait`` is the time from due to started and ``run`` the
+    time from started to finished, in seconds (p50 and p95).
+    """
+    now = timezone.now()
+    results = {}
+    counts = Job.objects.order_by().values('queue').annotate(
+        queued=Count('id', filter=Q(status=Job.QUEUED)),
+        ready=Count('id', filter=Q(status=Job.QUEUED, run_at__lte=now)),
+        running=Count('id', filter=Q(status=Job.RUNNING)),
+        failed=Count('id', filter=Q(status=Job.FAILED)),
+    )
+    for row in counts:
+        queue = row.pop('queue')
+        results[queue] = {**row, 'done': 0}
+    finished = Job.objects.filter(status=Job.DONE, finished_at__gte=now - window).values_list(
+        'queue', 'run_at', 'started_at', 'finished_at',
+    )
+    timings = {}
+    for queue, run_at, started_at, finished_at in finished:
+        waits, runs = timings.setdefault(queue, ([], []))
+        waits.append(max(0.0, (started_at - run_at).total_seconds()))
+        runs.append((finished_at - started_at).total_seconds())
+    for queue, (waits, runs) in timings.items():
+        stats = results.setdefault(queue, {'queued': 0, 'ready': 0, 'running': 0, 'failed': 0})
+        stats.update({
+            'done': len(runs),
+            'wait_p50': _percentile(waits, 0.50), 'wait_p95': _percentile(waits, 0.95),
+            'run_p50': _percentile(runs, 0.50), 'run_p95': _percentile(runs, 0.95),
+        })
+    return results
+
+
+# Jobs
+
+@background(queue='notifications')
+def notify_assignment(task_ids, assigned_to, assigned_by=None):
+    """Email a user about the tasks just assigned to them."""
+    user = User.objects.filter(pk=assigned_to).first()
+    if user is None or not user.email:
+        return
+    tasks = list(Task.objects.filter(pk__in=task_ids).select_related('project').order_by('pk'))
+    if not tasks:
+        return
+    by = User.objects.filter(pk=assigned_by).first() if assigned_by else None
+    lines = [f"- {task.title} ({task.project.name}): {settings.SITE_URL}{reverse('task-detail', args=[task.pk])}"
+             for task in tasks]
+    subject = (f"You were assigned {tasks[0].title}" if len(tasks) == 1
+               else f"You were assigned {len(tasks)} tasks")
+    intro = f"{by.get_full_name() or by.username} assigned you:" if by else "You were assigned:"
+    send_mail(subject, '\n'.join([intro, *lines]), None, [user.email])
+
+
+@background(queue='notifications')
+def notify_overdue(assigned_to, task_ids, total):
+    """Email a user a digest of their tasks that just became overdue: ``task_ids`` listed, ``total`` in all."""
+    user = User.objects.filter(pk=assigned_to).first()
+    if user is None or not user.email:
+        return
+    tasks = list(Task.objects.filter(pk__in=task_ids, overdue_since__isnull=False)
+                 .select_related('project').order_by('due_date', 'pk'))
+    if not tasks:
+        # All done or rescheduled since the sweep.
+        return
+    lines = [f"- {task.title} ({task.project.name}), due {timezone.localtime(task.due_date):%b %d, %Y %H:%M}: "
+             f"{settings.SITE_URL}{reverse('task-detail', args=[task.pk])}" for task in tasks]
+    if total > len(task_ids):
+        lines.append(f"...and {total - len(task_ids)} more: {settings.SITE_URL}{reverse('task-list')}?overdue=1")
+    subject = f"{tasks[0].title} is overdue" if total == 1 else f"{total} of your tasks are overdue"
+    send_mail(subject, '\n'.join(["These tasks assigned to you are now overdue:", *lines]), None, [user.email])
+
+
+@background(queue='maintenance', max_attempts=3)
+def rebuild_task_counters(project_ids):
+    """Recompute the task counters (and today's snapshots) of these projects, and their tasks' comment counts."""
+    Project.objects.filter(pk__in=project_ids).refresh_task_counters()
+    Task.objects.filter(project_id__in=project_ids).refresh_comment_counts()
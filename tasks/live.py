@@ -0,0 +1,235 @@
+"""
+Live updates for the task detail and project pages, streamed as server-sent events.
+
+Signal handlers in tasks/signals.py publish change events to channels named
+``task:<id>`` and ``project:<id>`` once the writing transaction commits. The
+SSE views subscribe to a channel and forward its events to the browser, where
+static/tasks/live.js patches the page.
+
+The broker is set by settings.LIVE_UPDATES_BROKER. The default,
+InProcessBroker, only reaches clients connected to the same process; a
+deployment with several server processes needs a broker with the same three
+methods backed by a shared pub/sub service such as Redis.
+"""
+import asyncio
+import itertools
+import json
+import threading
+from collections import defaultdict
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils.formats import date_format
+from django.utils.module_loading import import_string
+from django.utils.timezone import localtime
+
+# Seconds between keep-alive comments on an idle stream, so proxies keep it open.
+HEARTBEAT_SECONDS = 15
+# Milliseconds EventSource waits before reconnecting.
+RETRY_MS = 5000
+# Events a subscriber may fall behind by before it is told to reload instead.
+MAX_PENDING_EVENTS = 100
+
+
+def task_channel(task_id):
+    return f'task:{task_id}'
+
+
+def project_channel(project_id):
+    return f'project:{project_id}'
+
+
+class Subscription:
+    """A subscriber's queue of (id, name, data) events, filled from any thread."""
+
+    def __init__(self, maxsize):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop.
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind to catch up event by event: drop the backlog and ask for a reload.
+            self.lagged = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait((event[0], 'resync', {}))
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InProcessBroker:
+    """Publish events to the subscribers in this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def has_subscribers(self, channel):
+        return bool(self._subscriptions.get(channel))
+
+    def publish(self, channel, name, data):
+        """Send event ``name`` with JSON-serialisable ``data``; safe to call from any thread."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(channel, ()))
+        event = (next(self._ids), name, data)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # The subscriber's event loop has closed.
+                self._discard(channel, subscription)
+
+    def subscribe(self, channels, maxsize=MAX_PENDING_EVENTS):
+        """``async with broker.subscribe(channels) as subscription``: receive their events in the block."""
+        return _Subscribing(self, channels, maxsize)
+
+    def _add(self, channels, subscription):
+        with self._lock:
+            for channel in channels:
+                self._subscriptions[channel].add(subscription)
+
+    def _discard(self, channel, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(channel)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[channel]
+
+
+class _Subscribing:
+    """
+    InProcessBroker.subscribe()'s context manager. A class rather than an
+    async generator: when the event loop finalizes an abandoned stream, it may
+    close the generators involved in any order, and an already closed
+    @asynccontextmanager generator fails the stream's exit.
+    """
+
+    def __init__(self, broker, channels, maxsize):
+        self.broker = broker
+        self.channels = channels
+        self.maxsize = maxsize
+
+    async def __aenter__(self):
+        self.subscription = Subscription(self.maxsize)
+        self.broker._add(self.channels, self.subscription)
+        return self.subscription
+
+    async def __aexit__(self, *exc_info):
+        for channel in self.channels:
+            self.broker._discard(channel, self.subscription)
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.LIVE_UPDATES_BROKER)()
+    return _broker
+
+
+def publish(channels, name, data):
+    """Publish an event to ``channels`` once the current transaction, if any, commits."""
+    broker = get_broker()
+    for channel in channels:
+        transaction.on_commit(partial(broker.publish, channel, name, data))
+
+
+def has_subscribers(channel):
+    return get_broker().has_subscribers(channel)
+
+
+def resync_projects(project_ids):
+    """Ask the open boards of these projects to reload, after writes that send no per-task signals."""
+    channels = [project_channel(pk) for pk in project_ids if has_subscribers(project_channel(pk))]
+    publish(channels, 'resync', {})
+
+
+def format_event(event_id, name, data):
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+async def event_stream(channels, heartbeat=HEARTBEAT_SECONDS):
+    """Yield the SSE byte stream for ``channels`` until the client disconnects or must resync."""
+    async with get_broker().subscribe(channels) as subscription:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        while True:
+            try:
+                event_id, name, data = await asyncio.wait_for(subscription.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            yield format_event(event_id, name, data)
+            if name == 'resync':
+                return
+
+
+# Event payloads. Display values are included so the client needs no lookup tables.
+
+def _display_name(user):
+    return (user.get_full_name() or user.username) if user else ''
+
+
+def _display_datetime(value, format):
+    # Formatted as the templates do, in the current time zone.
+    return date_format(localtime(value), format)
+
+
+def task_data(task):
+    return {
+        'id': task.pk,
+        'project': task.project_id,
+        'title': task.title,
+        'status': task.status,
+        'status_display': task.get_status_display(),
+        'priority': task.priority,
+        'priority_display': task.get_priority_display(),
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'due_date_display': _display_datetime(task.due_date, 'M d, Y') if task.due_date else 'No date',
+        'is_overdue': task.is_overdue(),
+        'url': reverse('task-detail', args=[task.pk]),
+    }
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'task': comment.task_id,
+        'author': _display_name(comment.author),
+        'content': comment.content,
+        'created_at': comment.created_at.isoformat(),
+        'created_at_display': _display_datetime(comment.created_at, 'M d, Y H:i'),
+    }
+
+
+def assignment_data(assignment):
+    return {
+        'id': assignment.pk,
+        'task': assignment.task_id,
+        'assigned_to': _display_name(assignment.assigned_to),
+        'is_completed': assignment.is_completed,
+    }
+
+
+def project_stats_data(project):
+    return {
+        'id': project.pk,
+        'total': project.task_count,
+        'todo': project.todo_count,
+        'in_progress': project.in_progress_count,
+        'completed': project.completed_count,
+        'overdue': project.overdue_count,
+        'progress': project.get_progress(),
+    }
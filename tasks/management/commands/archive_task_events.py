@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tasks import activity
+
+
+class Command(BaseCommand):
+    help = (
+        "Move activity-log events older than the given age, whole months at a time, out of "
+        "the database into gzipped monthly JSON-lines files. activity.history() still reads them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=180,
+                            help="Archive the months that ended at least this many days ago.")
+        parser.add_argument('--dir', help="Archive directory (default: settings.TASK_EVENT_ARCHIVE_DIR).")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError("--days must not be negative.")
+        moved = activity.archive(timezone.now() - timedelta(days=options['days']), options['dir'])
+        for (year, month), count in sorted(moved.items()):
+            self.stdout.write(f"{year:04d}-{month:02d}: {count} events -> "
+                              f"{activity.archive_path((year, month), options['dir'])}")
+        self.stdout.write(self.style.SUCCESS(f"Archived {sum(moved.values())} events."))
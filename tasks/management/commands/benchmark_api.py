@@ -0,0 +1,40 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the JSON API's serialisation of task pages, with default fields, sparse "
+        "fieldsets and expanded relations, against django.core.serializers, using a "
+        "throwaway SQLite test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+', default=[20, 100],
+                            help="Numbers of tasks serialised per page.")
+        parser.add_argument('--teams', type=int, default=100, help="Teams in the synthetic dataset.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the median is reported.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            call_command('flush', interactive=False, verbosity=0)
+            benchmark.seed_dataset(teams=options['teams'], member_teams=min(50, options['teams']))
+            for page_size in options['page_sizes']:
+                results = benchmark.measure_serializers(page_size, repeat=options['repeat'])
+                self.stdout.write(f"\n{page_size} tasks per page")
+                self.stdout.write(
+                    f"  {'strategy':<20} {'queries':>8} {'bytes':>9} {'ms':>8} {'objects/s':>10}"
+                )
+                for name, r in results.items():
+                    self.stdout.write(
+                        f"  {name:<20} {r['queries']:>8} {r['bytes']:>9} {r['ms']:>8} {r['objects_per_s']:>10}"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,37 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DISTINCT-join, EXISTS and IN-subquery lookups of a user's tasks at "
+        "several assignment-table sizes, using a throwaway SQLite test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                            help="Numbers of task assignments to benchmark.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the median is reported.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for size in options['sizes']:
+                # Start every size from empty tables so the data distribution is comparable.
+                call_command('flush', interactive=False, verbosity=0)
+                user = benchmark.seed_assignments(size)
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+                results = benchmark.measure_assigned_to(user, repeat=options['repeat'])
+                self.stdout.write(f"\n{size:,} assignments")
+                self.stdout.write(f"  {'strategy':<15} {'rows':>8} {'count ms':>10} {'page ms':>10}")
+                for name, r in results.items():
+                    self.stdout.write(f"  {name:<15} {r['rows']:>8} {r['count_ms']:>10} {r['first_page_ms']:>10}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
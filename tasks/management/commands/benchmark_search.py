@@ -0,0 +1,39 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare full-text index lookups with icontains scans of comment content at "
+        "several table sizes, using a throwaway SQLite test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                            help="Numbers of comments to benchmark.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement; the median is reported.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for size in options['sizes']:
+                call_command('flush', interactive=False, verbosity=0)
+                words = benchmark.seed_comments(size)
+                # A very common, a mid-frequency and a rare word.
+                sample = [words[0], words[100], words[-1]]
+                results = benchmark.measure_search(sample, repeat=options['repeat'])
+                self.stdout.write(f"\n{size:,} comments")
+                self.stdout.write(f"  {'word':<8} {'strategy':<10} {'rows':>8} {'count ms':>10} {'page ms':>10}")
+                for word, strategies in results.items():
+                    for name, r in strategies.items():
+                        self.stdout.write(
+                            f"  {word:<8} {name:<10} {r['rows']:>8} {r['count_ms']:>10} {r['first_page_ms']:>10}"
+                        )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,63 @@
+import copy
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks import benchmark
+
+# Django's defaults: a new connection per request and, on SQLite, a rollback
+# journal synced to disk on every commit.
+BASELINE = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the throughput of concurrent writers posting comments and completing assignments "
+        "with Django's default database settings and the configured ones (settings.DATABASES), "
+        "using a throwaway test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 16],
+                            help="Numbers of concurrent writers to measure.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per writer.")
+        parser.add_argument('--profiles', nargs='+', choices=['baseline', 'configured'],
+                            default=['baseline', 'configured'])
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        configured = {key: copy.deepcopy(settings_dict[key]) for key in BASELINE}
+        profiles = {'baseline': BASELINE, 'configured': configured}
+        old_test_name = settings_dict['TEST'].get('NAME')
+        directory = None
+        if connection.vendor == 'sqlite':
+            # The default in-memory test database has no file locking to measure.
+            directory = tempfile.mkdtemp(prefix='benchmark_writers')
+            settings_dict['TEST']['NAME'] = str(Path(directory) / 'db.sqlite3')
+
+        setup_test_environment()
+        try:
+            self.stdout.write(f"{'profile':<12} {'writers':>8} {'requests':>9} {'errors':>7} "
+                              f"{'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+            for name in options['profiles']:
+                settings_dict.update(copy.deepcopy(profiles[name]))
+                connection.close()
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+                try:
+                    users = benchmark.seed_writers(max(options['writers']))
+                    for writers in sorted(options['writers']):
+                        r = benchmark.run_writers(users[:writers], options['requests'])
+                        self.stdout.write(f"{name:<12} {writers:>8} {r['requests']:>9} {r['errors']:>7} "
+                                          f"{r['rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+        finally:
+            settings_dict.update(configured)
+            settings_dict['TEST']['NAME'] = old_test_name
+            teardown_test_environment()
+            if directory:
+                shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,71 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from tasks import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway SQLite test database with a synthetic dataset, request every "
+        "named route in tasks/urls.py and compare query counts and timings with "
+        "tasks/perf_budgets.json."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--teams', type=int, default=1000)
+        parser.add_argument('--projects-per-team', type=int, default=3)
+        parser.add_argument('--tasks-per-project', type=int, default=10)
+        parser.add_argument('--comments-per-task', type=int, default=2)
+        parser.add_argument('--budgets', default=str(benchmark.BUDGET_FILE), help="Budget file to compare against.")
+        parser.add_argument('--queries-only', action='store_true',
+                            help="Only enforce query-count budgets (timings are still reported).")
+        parser.add_argument('--write-budgets', action='store_true',
+                            help="Write the measured values, with headroom, to the budget file instead of checking.")
+        parser.add_argument('--json', action='store_true', help="Print the raw measurements as JSON.")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = benchmark.seed_dataset(
+                teams=options['teams'],
+                projects_per_team=options['projects_per_team'],
+                tasks_per_project=options['tasks_per_project'],
+                comments_per_task=options['comments_per_task'],
+            )
+            results = benchmark.measure_routes(user)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(f"{'route':<22} {'status':>6} {'queries':>8} {'sql ms':>9} {'wall ms':>9}")
+            for name, r in results.items():
+                self.stdout.write(f"{name:<22} {r['status']:>6} {r['queries']:>8} {r['sql_ms']:>9} {r['wall_ms']:>9}")
+
+        if options['write_budgets']:
+            budgets = {
+                name: {
+                    'status': r['status'],
+                    'queries': r['queries'],
+                    'sql_ms': max(round(r['sql_ms'] * 3, 1), 50.0),
+                    'wall_ms': max(round(r['wall_ms'] * 3, 1), 200.0),
+                }
+                for name, r in results.items()
+            }
+            with open(options['budgets'], 'w') as f:
+                json.dump(budgets, f, indent=2)
+                f.write('\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote budgets for {len(budgets)} routes to {options['budgets']}."))
+            return
+
+        metrics = ('queries',) if options['queries_only'] else ('queries', 'sql_ms', 'wall_ms')
+        failures = benchmark.check_budgets(results, benchmark.load_budgets(options['budgets']), metrics)
+        if failures:
+            raise CommandError("Performance budgets exceeded:\n  " + "\n  ".join(failures))
+        self.stdout.write(self.style.SUCCESS(f"All {len(results)} routes are within budget."))
@@ -0,0 +1,34 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from tasks.models import Task
+from tasks.task_io import detect_format, export_rows, write_rows
+
+
+class Command(BaseCommand):
+    help = "Stream tasks to a CSV or JSON Lines file (or '-' for stdout) in the import_tasks format."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file, or '-' to write to stdout.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--project', type=int, action='append', help="Only export these project IDs.")
+        parser.add_argument('--chunk-size', type=int, default=2000, help="Rows fetched per database round trip.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = detect_format(path, options['format'])
+        queryset = Task.objects.all()
+        if options['project']:
+            queryset = queryset.filter(project_id__in=options['project'])
+
+        started = time.perf_counter()
+        stream = sys.stdout if path == '-' else open(path, 'w', newline='', encoding='utf-8')
+        try:
+            count = write_rows(stream, fmt, export_rows(queryset, options['chunk_size']))
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f"Exported {count} rows in {elapsed:.1f}s ({count / elapsed if elapsed else 0:,.0f} rows/s)")
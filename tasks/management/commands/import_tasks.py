@@ -0,0 +1,50 @@
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.task_io import RowError, TaskImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import tasks from a CSV or JSON Lines file (or '-' for stdin). Rows with the id "
+        "of an existing task update it; other rows create tasks. Each batch is committed "
+        "in its own transaction and recorded in a checkpoint file, so a failed import can "
+        "be fixed and continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or '-' to read from stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--resume', action='store_true', help="Skip the rows committed by a previous run.")
+        parser.add_argument('--checkpoint', help="Checkpoint file (default: <path>.checkpoint).")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = detect_format(path, options['format'])
+        checkpoint = Path(options['checkpoint'] or f'{path}.checkpoint') if path != '-' else None
+        if options['resume'] and checkpoint is None and not options['checkpoint']:
+            raise CommandError("--resume needs a file path or --checkpoint.")
+
+        def progress(committed, rate):
+            self.stderr.write(f"{committed} rows committed ({rate:,.0f} rows/s)")
+
+        importer = TaskImporter(batch_size=options['batch_size'], checkpoint=checkpoint, progress=progress)
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        try:
+            committed = importer.run(read_rows(stream, fmt), resume=options['resume'])
+        except RowError as exc:
+            raise CommandError(
+                f"Import stopped at {exc}. Rows before this batch were committed; "
+                f"fix the file and rerun with --resume."
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {committed} rows: {importer.created} created, {importer.updated} updated, "
+            f"{importer.skipped} skipped as already committed."
+        ))
@@ -0,0 +1,104 @@
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from tasks import benchmark
+
+# Command lines of the servers that can be compared. They run against the
+# configured database, so seed it first (see --seed).
+SERVERS = {
+    'gunicorn': ('WSGI', ['gunicorn', '--bind', '{host}:{port}', '--workers', '{workers}',
+                          '--threads', '{threads}', 'django_project.wsgi:application']),
+    'uvicorn': ('ASGI', ['uvicorn', '--host', '{host}', '--port', '{port}', '--workers', '{workers}',
+                         '--no-access-log', '--lifespan', 'off', 'django_project.asgi:application']),
+    'daphne': ('ASGI', ['daphne', '--bind', '{host}', '--port', '{port}', 'django_project.asgi:application']),
+}
+DEFAULT_ROUTES = ('dashboard', 'task-detail', 'project-detail')
+
+
+class Command(BaseCommand):
+    help = (
+        "Start each server in turn on a local port, drive it with concurrent authenticated "
+        "requests and compare p50/p99 latency and requests/sec between WSGI and ASGI."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--servers', nargs='+', choices=SERVERS, default=['gunicorn', 'uvicorn'])
+        parser.add_argument('--url', help="Load-test an already running server instead of starting --servers.")
+        parser.add_argument('--routes', nargs='+', default=list(DEFAULT_ROUTES), help="Named routes to request.")
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=100, help="Unmeasured requests sent first.")
+        parser.add_argument('--workers', type=int, default=1, help="Server worker processes.")
+        parser.add_argument('--threads', type=int, default=8, help="Threads per gunicorn worker.")
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--seed', action='store_true',
+                            help="Create the synthetic benchmark dataset in the configured database if missing.")
+        parser.add_argument('--teams', type=int, default=100, help="Teams to seed with --seed.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=benchmark.BENCHMARK_USERNAME).first()
+        if user is None:
+            if not options['seed']:
+                raise CommandError(
+                    f"No {benchmark.BENCHMARK_USERNAME!r} user in the configured database; "
+                    "run with --seed to create the benchmark dataset."
+                )
+            self.stdout.write(f"Seeding {options['teams']} teams into the configured database...")
+            user = benchmark.seed_dataset(teams=options['teams'])
+
+        kwargs_by_route = benchmark.route_kwargs(user)
+        paths = [reverse(name, kwargs=kwargs_by_route.get(name)) for name in options['routes']]
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        if options['url']:
+            targets = [(options['url'], options['url'], None)]
+        else:
+            targets = [(f"{name} ({SERVERS[name][0]})", f"http://{options['host']}:{options['port']}", name)
+                       for name in options['servers']]
+
+        results = {}
+        for label, url, server in targets:
+            process = self.start_server(server, options) if server else None
+            try:
+                self.stdout.write(f"Load-testing {label}...")
+                benchmark.run_load(url, paths, cookie, options['concurrency'], options['warmup'])
+                results[label] = benchmark.run_load(url, paths, cookie, options['concurrency'], options['requests'])
+            finally:
+                if process:
+                    process.terminate()
+                    process.wait()
+
+        self.stdout.write(f"\n{'server':<20} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for label, r in results.items():
+            self.stdout.write(
+                f"{label:<20} {r['requests']:>9} {r['errors']:>7} {r['rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}"
+            )
+
+    def start_server(self, name, options):
+        argv = [arg.format(**options) for arg in SERVERS[name][1]]
+        if not shutil.which(argv[0]):
+            raise CommandError(f"{argv[0]} is not installed (pip install {argv[0]}).")
+        process = subprocess.Popen(argv, stdout=subprocess.DEVNULL, stderr=sys.stderr)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise CommandError(f"{name} exited with status {process.returncode}.")
+            try:
+                socket.create_connection((options['host'], options['port']), timeout=1).close()
+                return process
+            except OSError:
+                time.sleep(0.2)
+        process.terminate()
+        raise CommandError(f"{name} did not start listening on {options['host']}:{options['port']}.")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tasks import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of task titles, descriptions and comments."
+
+    def handle(self, *args, **options):
+        if not search.enabled():
+            raise CommandError("The full-text index is only available on SQLite; other databases search with icontains.")
+        with transaction.atomic():
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS("Rebuilt the search index."))
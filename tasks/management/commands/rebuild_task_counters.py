@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from tasks import jobs
+from tasks.models import Project, Task
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalized task counters stored on each project and the comment counts of its tasks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help="Only rebuild these projects.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Projects to rebuild per query.")
+        parser.add_argument('--background', action='store_true',
+                            help="Queue a job per batch for run_worker instead of rebuilding now.")
+
+    def handle(self, *args, **options):
+        queryset = Project.objects.order_by('pk')
+        if options['project_ids']:
+            queryset = queryset.filter(pk__in=options['project_ids'])
+
+        batch_size = options['batch_size']
+        project_ids = list(queryset.values_list('pk', flat=True))
+        if options['background']:
+            for start in range(0, len(project_ids), batch_size):
+                jobs.rebuild_task_counters.enqueue(project_ids=project_ids[start:start + batch_size])
+            self.stdout.write(self.style.SUCCESS(
+                f"Queued task counter rebuilds for {len(project_ids)} project(s)."))
+            return
+        for start in range(0, len(project_ids), batch_size):
+            batch = project_ids[start:start + batch_size]
+            Project.objects.filter(pk__in=batch).refresh_task_counters()
+            Task.objects.filter(project_id__in=batch).refresh_comment_counts()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt task counters for {len(project_ids)} project(s)."))
@@ -0,0 +1,97 @@
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from tasks import jobs
+
+# Seconds between sweeps for jobs abandoned by dead workers and old finished jobs.
+MAINTENANCE_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background jobs from the database queues, with a pool of threads per queue. "
+        "Start more processes, on one machine or several, to run more jobs at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', action='append', metavar='NAME=THREADS',
+                            help="A queue to work and how many of its jobs to run at once; repeatable "
+                                 "(default: settings.JOB_QUEUES).")
+        parser.add_argument('--poll', type=float, default=1.0,
+                            help="Seconds to wait before checking an empty queue again.")
+        parser.add_argument('--burst', action='store_true',
+                            help="Exit once no queue has a due job left instead of waiting for more.")
+
+    def handle(self, *args, **options):
+        queues = self.parse_queues(options['queue']) if options['queue'] else dict(settings.JOB_QUEUES)
+        self.stopping = threading.Event()
+        handlers = {signum: signal.signal(signum, self.stop) for signum in (signal.SIGINT, signal.SIGTERM)}
+
+        worker = jobs.worker_id()
+        pools = {queue: ThreadPoolExecutor(threads, thread_name_prefix=f'job-{queue}')
+                 for queue, threads in queues.items()}
+        running = {queue: set() for queue in queues}
+        self.stdout.write(f"Worker {worker} running queues: "
+                          + ', '.join(f'{queue} ({threads})' for queue, threads in queues.items()))
+        last_maintenance = 0
+        done = 0
+        try:
+            while not self.stopping.is_set():
+                if time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    jobs.requeue_stale()
+                    jobs.prune()
+                    last_maintenance = time.monotonic()
+                claimed = 0
+                for queue, pool in pools.items():
+                    done += sum(future.done() for future in running[queue])
+                    running[queue] = {future for future in running[queue] if not future.done()}
+                    # Only claim what the queue's threads can start now, so jobs
+                    # are left to other workers rather than waiting here.
+                    for job in jobs.claim(queue, queues[queue] - len(running[queue]), worker):
+                        running[queue].add(pool.submit(self.run_job, job))
+                        claimed += 1
+                if claimed:
+                    continue
+                if options['burst'] and not any(running.values()):
+                    break
+                self.stopping.wait(options['poll'])
+        finally:
+            # Let the running jobs finish; an interrupted job would only be retried after JOB_TIMEOUT.
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+            done += sum(len(futures) for futures in running.values())
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+            close_old_connections()
+        self.stdout.write(self.style.SUCCESS(f"Worker {worker} stopped after {done} job(s)."))
+
+    def parse_queues(self, values):
+        queues = {}
+        for value in values:
+            name, _, threads = value.partition('=')
+            try:
+                queues[name] = int(threads or 1)
+            except ValueError:
+                raise CommandError(f"Invalid --queue {value!r}; expected NAME=THREADS.")
+            if not name or queues[name] < 1:
+                raise CommandError(f"Invalid --queue {value!r}; expected NAME=THREADS.")
+        return queues
+
+    def stop(self, signum, frame):
+        self.stdout.write("Stopping once the running jobs finish...")
+        self.stopping.set()
+
+    @staticmethod
+    def run_job(job):
+        # Each pool thread keeps its own connection; drop it if it broke or expired.
+        close_old_connections()
+        try:
+            jobs.execute(job)
+        finally:
+            close_old_connections()
@@ -0,0 +1,35 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks import burndown
+from tasks.models import Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Snapshot today's task counters of the projects that have no snapshot yet today "
+        "(run daily), and optionally recount recent daily completions from the activity log."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help="Snapshot every project, refreshing today's overdue counts too.")
+        parser.add_argument('--recount-days', type=int, default=0,
+                            help="Recount the completions of this many past days, today included.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Projects to snapshot per query.")
+
+    def handle(self, *args, **options):
+        if options['all']:
+            project_ids = list(Project.objects.order_by('pk').values_list('pk', flat=True))
+        else:
+            project_ids = list(burndown.unsnapshotted_projects())
+        burndown.snapshot_projects(project_ids, batch_size=options['batch_size'])
+        self.stdout.write(f"Snapshotted {len(project_ids)} project(s).")
+
+        if options['recount_days'] > 0:
+            since = timezone.localdate() - timedelta(days=options['recount_days'] - 1)
+            burndown.recount_completions(since)
+            self.stdout.write(f"Recounted completions since {since}.")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks import overdue
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark the open tasks whose due date has passed as overdue and queue a reminder digest "
+        "for each of their assignees. Run every few minutes, e.g. from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Tasks to mark per query.")
+        parser.add_argument('--no-reminders', action='store_true', help="Only mark the tasks.")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        marked = overdue.sweep(now, batch_size=options['batch_size'])
+        self.stdout.write(f"Marked {marked} task(s) overdue.")
+        if marked and not options['no_reminders']:
+            queued = overdue.queue_reminders(now)
+            self.stdout.write(f"Queued {queued} reminder digest(s).")
+        self.stdout.write(self.style.SUCCESS("Done."))
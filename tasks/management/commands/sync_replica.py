@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import routers
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into the replica one, for local setups where two "
+        "SQLite files (DB_NAME and DB_REPLICA_NAME) stand in for a primary and its replica."
+    )
+
+    def handle(self, *args, **options):
+        if not routers.replica_configured():
+            raise CommandError("No replica database is configured; set DB_REPLICA_NAME.")
+        try:
+            routers.copy_to_replica()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS("Copied the primary database into the replica."))
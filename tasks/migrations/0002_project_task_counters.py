@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:30
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.utils import timezone
+
+
+def populate_task_counters(apps, schema_editor):
+    Project = apps.get_model('tasks', 'Project')
+    Task = apps.get_model('tasks', 'Task')
+    now = timezone.now()
+    rows = (
+        Task.objects.order_by()
+        .values('project_id')
+        .annotate(
+            task_count=Count('id'),
+            todo_count=Count('id', filter=Q(status='todo')),
+            in_progress_count=Count('id', filter=Q(status='in_progress')),
+            completed_count=Count('id', filter=Q(status='completed')),
+            overdue_count=Count('id', filter=Q(due_date__lt=now) & ~Q(status='completed')),
+        )
+    )
+    for row in rows:
+        Project.objects.filter(pk=row.pop('project_id')).update(**row)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='completed_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='in_progress_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='overdue_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='todo_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_task_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:05
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases search with icontains (see tasks/search.py).
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE tasks_search USING fts5("
+        "title, body, task_id UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+    # Rank by BM25 with titles weighted ten times the other text.
+    schema_editor.execute("INSERT INTO tasks_search (tasks_search, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+    schema_editor.execute(
+        "INSERT INTO tasks_search (rowid, task_id, title, body) "
+        "SELECT id * 2, id, title, COALESCE(description, '') FROM tasks_task"
+    )
+    schema_editor.execute(
+        "INSERT INTO tasks_search (rowid, task_id, title, body) "
+        "SELECT id * 2 + 1, task_id, '', content FROM tasks_comment"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE tasks_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0003_task_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
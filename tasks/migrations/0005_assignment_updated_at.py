@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='taskassignment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
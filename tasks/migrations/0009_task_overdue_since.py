@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='overdue_since',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('overdue_since__isnull', True), models.Q(('status', 'completed'), _negated=True)), fields=['due_date'], name='task_overdue_sweep_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(condition=models.Q(('overdue_since__isnull', False)), fields=['overdue_since'], name='task_overdue_since_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_comment_counts(apps, schema_editor):
+    Task = apps.get_model('tasks', 'Task')
+    Comment = apps.get_model('tasks', 'Comment')
+    rows = Comment.objects.order_by().values('task_id').annotate(count=Count('id'))
+    for row in rows:
+        Task.objects.filter(pk=row['task_id']).update(comment_count=row['count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_fragment_versions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_comment_counts, migrations.RunPython.noop),
+    ]
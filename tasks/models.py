@@ -1,9 +1,30 @@
 from django.db import models
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.lookups import Exact, LessThan
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
 
+def _count_subquery(queryset, group_by):
+    """Correlated COUNT(*) over ``queryset`` grouped on ``group_by``, defaulting to 0."""
+    counts = queryset.order_by().values(group_by).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+class TeamQuerySet(models.QuerySet):
+    """Custom queryset for teams."""
+
+    def with_counts(self):
+        """Annotate member_count and project_count without multiplying rows through joins."""
+        return self.annotate(
+            member_count=_count_subquery(Team.members.through.objects.filter(team_id=OuterRef('pk')), 'team_id'),
+            project_count=_count_subquery(Project.objects.filter(team_id=OuterRef('pk')), 'team_id'),
+        )
+
+
 class Team(models.Model):
     """Represents a team of users who collaborate on projects."""
     name = models.CharField(max_length=200)
@@ -12,6 +33,11 @@ class Team(models.Model):
     members = models.ManyToManyField(User, related_name='teams')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped when the members or projects change, which updated_at does not
+    # track; cached fragments showing those counts are keyed on it.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = TeamQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
@@ -20,8 +46,50 @@ class Team(models.Model):
         return self.name
 
 
+class ProjectQuerySet(models.QuerySet):
+    """Custom queryset for projects."""
+
+    def with_progress(self):
+        """Join the team and annotate progress (a percentage) computed from the task counters."""
+        return self.select_related('team').annotate(
+            progress=Case(
+                When(task_count=0, then=Value(0)),
+                default=F('completed_count') * 100 / F('task_count'),
+                output_field=IntegerField(),
+            )
+        )
+
+    def refresh_task_counters(self):
+        """Recompute the denormalized task counters for every project in the queryset."""
+        project_ids = list(self.values_list('id', flat=True))
+        if not project_ids:
+            return 0
+        stats = Task.objects.filter(project_id__in=project_ids).stats_by_project()
+        projects = []
+        for project_id in project_ids:
+            project = Project(pk=project_id, version=F('version') + 1)
+            project_stats = stats.get(project_id, {})
+            for key, field in Project.TASK_COUNTER_FIELDS_BY_STAT.items():
+                setattr(project, field, project_stats.get(key, 0))
+            projects.append(project)
+        # bulk_update() leaves updated_at alone, so counter refreshes do not look like
+        # edits; the version bump still expires the fragments showing the counters.
+        rows = Project.objects.bulk_update(projects, [*Project.TASK_COUNTER_FIELDS, 'version'], batch_size=500)
+        ProjectSnapshot.objects.record(projects)
+        return rows
+
+
 class Project(models.Model):
     """Represents a project within a team."""
+    TASK_COUNTER_FIELDS_BY_STAT = {
+        'total': 'task_count',
+        'todo': 'todo_count',
+        'in_progress': 'in_progress_count',
+        'completed': 'completed_count',
+        'overdue': 'overdue_count',
+    }
+    TASK_COUNTER_FIELDS = tuple(TASK_COUNTER_FIELDS_BY_STAT.values())
+
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='projects')
@@ -29,19 +97,190 @@ class Project(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Denormalized task counters, kept current by the signals in tasks/signals.py.
+    # overdue_count only changes when time passes, so it is refreshed on writes and
+    # by the rebuild_task_counters management command.
+    task_count = models.PositiveIntegerField(default=0, editable=False)
+    todo_count = models.PositiveIntegerField(default=0, editable=False)
+    in_progress_count = models.PositiveIntegerField(default=0, editable=False)
+    completed_count = models.PositiveIntegerField(default=0, editable=False)
+    overdue_count = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped with every counter refresh, i.e. by every write to the project's
+    # tasks; cached fragments showing the project are keyed on it.
+    version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = ProjectQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded team so moving a project bumps both teams' versions.
+        instance._loaded_team_id = instance.__dict__.get('team_id')
+        return instance
+
     def get_progress(self):
-        """Calculate progress percentage of the project."""
-        tasks = self.tasks.all()
-        if not tasks.exists():
+        """Calculate progress percentage of the project from the task counters."""
+        if not self.task_count:
             return 0
-        completed_tasks = tasks.filter(status='completed').count()
-        return int((completed_tasks / tasks.count()) * 100)
+        return int((self.completed_count / self.task_count) * 100)
+
+    def refresh_task_counters(self):
+        """Recompute this project's task counters and reload them onto the instance."""
+        Project.objects.filter(pk=self.pk).refresh_task_counters()
+        self.refresh_from_db(fields=[*self.TASK_COUNTER_FIELDS, 'version'])
+
+
+def _task_stats_aggregates():
+    """Conditional aggregates for every per-status count plus the overdue count."""
+    return {
+        'total': Count('id'),
+        'todo': Count('id', filter=Q(status='todo')),
+        'in_progress': Count('id', filter=Q(status='in_progress')),
+        'completed': Count('id', filter=Q(status='completed')),
+        'overdue': Count('id', filter=Q(due_date__lt=timezone.now()) & ~Q(status='completed')),
+    }
+
+
+def _overdue_since_after_update(kwargs):
+    """
+    The overdue_since an update() writing ``kwargs`` leaves: kept on the tasks
+    still overdue afterwards and cleared on the others. The new status and due
+    date may be expressions (bulk_update() passes CASEs), so SQL decides.
+    """
+    status = kwargs.get('status', F('status'))
+    due_date = kwargs.get('due_date', F('due_date'))
+    if status == 'completed' or due_date is None:
+        return None
+    if not hasattr(status, 'resolve_expression'):
+        status = Value(status)
+    if not hasattr(due_date, 'resolve_expression'):
+        due_date = Value(due_date, output_field=models.DateTimeField())
+    return Case(
+        When(Exact(status, 'completed'), then=Value(None)),
+        When(LessThan(due_date, timezone.now()), then=F('overdue_since')),
+        default=Value(None),
+        output_field=models.DateTimeField(),
+    )
+
+
+class TaskQuerySet(models.QuerySet):
+    """Custom queryset for tasks that keeps project counters in sync on bulk writes."""
+
+    def assigned_to(self, user, aggregate=False):
+        """
+        Tasks assigned to ``user``, without a DISTINCT join.
+
+        By default this is a correlated EXISTS on the (task, assigned_to) unique
+        index, which lets ordered, LIMITed listings walk task_priority_due_idx and
+        stop after one page. Pass ``aggregate=True`` for counts and stats over the
+        whole set; that form filters on ``id IN (<user's task ids>)``, which reads
+        only the user's assignments (see the benchmark_assignments command).
+        """
+        assignments = TaskAssignment.objects.filter(assigned_to=user)
+        if aggregate:
+            return self.filter(pk__in=assignments.values('task_id'))
+        return self.filter(Exists(assignments.filter(task_id=OuterRef('pk'))))
+
+    def overdue(self, now=None):
+        """Open tasks whose due date has passed; served by the task_open_due_idx partial index."""
+        return self.filter(due_date__lt=now or timezone.now()).exclude(status='completed')
+
+    def stats(self):
+        """Return per-status, overdue and progress figures for the queryset in one query."""
+        stats = self.order_by().aggregate(**_task_stats_aggregates())
+        stats['progress'] = int((stats['completed'] / stats['total']) * 100) if stats['total'] else 0
+        return stats
+
+    def stats_by_project(self):
+        """Return {project_id: stats} for the queryset, grouped in one query."""
+        rows = self.order_by().values('project_id').annotate(**_task_stats_aggregates())
+        return {row.pop('project_id'): row for row in rows}
+
+    def _affected_project_ids(self):
+        return set(self.order_by().values_list('project_id', flat=True).distinct())
+
+    # The comment counts are no task edits: these write them with QuerySet.update()
+    # itself, skipping the counter, history and live bookkeeping of update() below.
+
+    def add_comment_count(self, delta):
+        """Add ``delta`` to the comment counts of the queryset's tasks."""
+        return super().update(comment_count=F('comment_count') + delta)
+
+    def refresh_comment_counts(self):
+        """Recount the comments of every task in the queryset."""
+        return super().update(
+            comment_count=_count_subquery(Comment.objects.filter(task_id=OuterRef('pk')), 'task_id')
+        )
+
+    def update(self, **kwargs):
+        from . import activity, live, search
+        from .signals import refresh_project_counters
+        project_ids = self._affected_project_ids()
+        # update() sends no signals, so the activity log diffs the rows itself.
+        history_fields = [
+            field for field in Task.HISTORY_FIELDS if field in kwargs or field.removesuffix('_id') in kwargs
+        ]
+        before = {row.pop('id'): row for row in self.values('id', *history_fields)} if history_fields else {}
+        # Read before the update, which may change the rows the filters match.
+        reindex_pks = (
+            list(self.values_list('pk', flat=True))
+            if search.enabled() and {'title', 'description'} & kwargs.keys() else None
+        )
+        new_project = kwargs.get('project', kwargs.get('project_id'))
+        moved_pks = None
+        if hasattr(new_project, 'resolve_expression'):
+            # An expression (such as the CASE bulk_update() builds) is only
+            # resolved by the database, so read the new projects back afterwards.
+            moved_pks = list(self.values_list('pk', flat=True))
+        elif new_project is not None:
+            project_ids.add(getattr(new_project, 'pk', new_project))
+        if ('status' in kwargs or 'due_date' in kwargs) and 'overdue_since' not in kwargs:
+            kwargs['overdue_since'] = _overdue_since_after_update(kwargs)
+        rows = super().update(**kwargs)
+        if moved_pks:
+            project_ids |= set(
+                Task.objects.filter(pk__in=moved_pks).order_by().values_list('project_id', flat=True).distinct()
+            )
+        refresh_project_counters(project_ids)
+        if reindex_pks:
+            search.index(search.TASK, reindex_pks)
+        if before:
+            activity.record_task_updates(before, history_fields)
+        live.resync_projects(project_ids)
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        from .signals import deferred_counter_refresh
+        with deferred_counter_refresh():
+            return super().delete()
+    delete.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import activity, live, search
+        from .signals import refresh_project_counters
+        objs = super().bulk_create(objs, *args, **kwargs)
+        refresh_project_counters({obj.project_id for obj in objs})
+        search.index(search.TASK, {obj.pk for obj in objs})
+        with activity.batch():
+            for obj in objs:
+                if obj.pk is not None:
+                    activity.record(TaskEvent.TASK_CREATED, obj.pk, obj.project_id, obj.created_by_id,
+                                    title=obj.title, status=obj.status)
+        live.resync_projects({obj.project_id for obj in objs})
+        return objs
+
+    def bulk_update(self, objs, *args, **kwargs):
+        # bulk_update() runs one update() per batch; refresh the counters once at the end.
+        from .signals import deferred_counter_refresh
+        with deferred_counter_refresh():
+            return super().bulk_update(objs, *args, **kwargs)
 
 
 class Task(models.Model):
@@ -61,20 +300,78 @@ class Task(models.Model):
 
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True, null=True)
-    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tasks')
+    # Indexed through task_project_status_idx, which has project as its leading column.
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='tasks', db_index=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='todo')
     priority = models.IntegerField(choices=PRIORITY_CHOICES, default=2)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_tasks')
     due_date = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # When the sweep_overdue command found the task overdue (see tasks/overdue.py);
+    # cleared by any write that completes the task or moves its due date ahead.
+    overdue_since = models.DateTimeField(null=True, blank=True, editable=False)
+    # Denormalized, so listings can show it without a query; kept current by the
+    # signals in tasks/signals.py and Comment.objects.bulk_create().
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Columns whose changes are recorded in the activity log, by attname.
+    HISTORY_FIELDS = ('title', 'description', 'project_id', 'status', 'priority', 'due_date')
+
+    objects = TaskQuerySet.as_manager()
 
     class Meta:
         ordering = ['-priority', 'due_date']
+        indexes = [
+            # Default ordering, so unfiltered listings can walk the index instead of sorting.
+            models.Index(fields=['-priority', 'due_date'], name='task_priority_due_idx'),
+            # Per-project status breakdowns (stats(), counter refreshes, project boards).
+            models.Index(fields=['project', 'status'], name='task_project_status_idx'),
+            # Overdue lookups only ever look at open tasks; the condition must match
+            # TaskQuerySet.overdue() exactly for SQLite to pick this partial index.
+            models.Index(
+                fields=['due_date', 'status'],
+                name='task_open_due_idx',
+                condition=~Q(status='completed'),
+            ),
+            # The sweeper's range scan: open tasks not yet marked overdue, by due date.
+            # As above, the condition must match overdue.sweepable() exactly.
+            models.Index(
+                fields=['due_date'],
+                name='task_overdue_sweep_idx',
+                condition=Q(overdue_since__isnull=True) & ~Q(status='completed'),
+            ),
+            # Tasks marked overdue, for the reminders of a sweep and overdue listings.
+            models.Index(
+                fields=['overdue_since'],
+                name='task_overdue_since_idx',
+                condition=Q(overdue_since__isnull=False),
+            ),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self.overdue_since is not None and not self.is_overdue():
+            self.overdue_since = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'overdue_since'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded project so moving a task refreshes both projects' counters.
+        instance._loaded_project_id = instance.__dict__.get('project_id')
+        # And the loaded values the activity log diffs against (see tasks/activity.py).
+        instance._loaded_history = instance.history_values()
+        return instance
+
+    def history_values(self):
+        """The loaded values of the HISTORY_FIELDS, for the activity log."""
+        return {field: self.__dict__[field] for field in self.HISTORY_FIELDS if field in self.__dict__}
+
     def is_overdue(self):
         """Check if task is overdue."""
         if self.due_date and self.status != 'completed':
@@ -89,19 +386,45 @@ class Task(models.Model):
 class TaskAssignment(models.Model):
     """Represents the assignment of a task to a team member."""
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='assignments')
-    assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assigned_tasks')
+    # Indexed through assignment_user_done_idx, which has assigned_to as its leading column.
+    assigned_to = models.ForeignKey(User, on_delete=models.CASCADE, related_name='assigned_tasks', db_index=False)
     assigned_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='assignments_given')
     assigned_at = models.DateTimeField(auto_now_add=True)
     is_completed = models.BooleanField(default=False)
     completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         unique_together = ('task', 'assigned_to')
         ordering = ['-assigned_at']
+        indexes = [
+            # "My tasks" lookups filter by assignee first, optionally on completion.
+            models.Index(fields=['assigned_to', 'is_completed'], name='assignment_user_done_idx'),
+        ]
 
     def __str__(self):
         return f"{self.task.title} assigned to {self.assigned_to.username}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded state so completing an assignment can be told apart from other saves.
+        instance._loaded_is_completed = instance.__dict__.get('is_completed')
+        return instance
+
+
+class CommentQuerySet(models.QuerySet):
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import search
+        objs = super().bulk_create(objs, *args, **kwargs)
+        task_ids = sorted({obj.task_id for obj in objs})
+        # In batches, to stay under the databases' limits on query parameters.
+        for start in range(0, len(task_ids), 500):
+            Task.objects.filter(pk__in=task_ids[start:start + 500]).refresh_comment_counts()
+        search.index(search.COMMENT, {obj.pk for obj in objs if obj.pk is not None})
+        return objs
+
 
 class Comment(models.Model):
     """Represents a comment on a task for team communication."""
@@ -111,8 +434,158 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommentQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['task', '-created_at'], name='comment_task_created_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.task.title}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded task so moving a comment recounts both tasks' comments.
+        instance._loaded_task_id = instance.__dict__.get('task_id')
+        return instance
+
+
+class ProjectSnapshotQuerySet(models.QuerySet):
+
+    def record(self, projects, date=None):
+        """Upsert the day's snapshot of each project's task counters, leaving its completions alone."""
+        date = date or timezone.localdate()
+        return self.bulk_create(
+            [ProjectSnapshot(project_id=project.pk, date=date,
+                             **{field: getattr(project, field) for field in Project.TASK_COUNTER_FIELDS})
+             for project in projects],
+            update_conflicts=True,
+            unique_fields=['project', 'date'],
+            update_fields=Project.TASK_COUNTER_FIELDS,
+            batch_size=500,
+        )
+
+
+class ProjectSnapshot(models.Model):
+    """
+    A project's task counters at the end of a day (or now, for today), and the
+    number of tasks completed that day; the burndown and throughput series.
+
+    Rows are upserted whenever the counters are refreshed and by the
+    snapshot_projects command; days without a row had no changes. See tasks/burndown.py.
+    """
+    # Indexed through snapshot_project_date_uniq, which has project as its leading column.
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='snapshots', db_index=False)
+    date = models.DateField()
+    task_count = models.PositiveIntegerField(default=0)
+    todo_count = models.PositiveIntegerField(default=0)
+    in_progress_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    completions = models.PositiveIntegerField(default=0)
+
+    objects = ProjectSnapshotQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['project', 'date']
+        constraints = [
+            # Also the index series reads walk: one project, a range of days.
+            models.UniqueConstraint(fields=['project', 'date'], name='snapshot_project_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} on {self.date}"
+
+
+class TaskEvent(models.Model):
+    """
+    An append-only record of a change to a task, its assignments or its comments.
+
+    Events outlive the rows they describe, so their foreign keys have no
+    database constraints and are not cascaded. See tasks/activity.py.
+    """
+    TASK_CREATED = 'task_created'
+    TASK_UPDATED = 'task_updated'
+    TASK_DELETED = 'task_deleted'
+    ASSIGNED = 'assigned'
+    ASSIGNMENT_COMPLETED = 'assignment_completed'
+    UNASSIGNED = 'unassigned'
+    COMMENT_ADDED = 'comment_added'
+    COMMENT_EDITED = 'comment_edited'
+    COMMENT_DELETED = 'comment_deleted'
+    KIND_CHOICES = [
+        (TASK_CREATED, 'Task created'),
+        (TASK_UPDATED, 'Task updated'),
+        (TASK_DELETED, 'Task deleted'),
+        (ASSIGNED, 'Assigned'),
+        (ASSIGNMENT_COMPLETED, 'Assignment completed'),
+        (UNASSIGNED, 'Unassigned'),
+        (COMMENT_ADDED, 'Comment added'),
+        (COMMENT_EDITED, 'Comment edited'),
+        (COMMENT_DELETED, 'Comment deleted'),
+    ]
+
+    # Indexed for archival range scans.
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    project = models.ForeignKey(Project, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                related_name='events')
+    task = models.ForeignKey(Task, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                             related_name='events', db_index=False)
+    actor = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                              related_name='+', db_index=False)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Project and task timelines, newest first, read a range of one of these.
+            models.Index(fields=['project', '-created_at'], name='event_project_created_idx'),
+            models.Index(fields=['task', '-created_at'], name='event_task_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on task {self.task_id}"
+
+
+class Job(models.Model):
+    """A queued call of a background function, run by the run_worker command. See tasks/jobs.py."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=200)
+    queue = models.CharField(max_length=50, default='default')
+    kwargs = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # When the job is next due; pushed back by the retry backoff.
+    run_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Workers claim the due jobs of one queue, oldest first.
+            models.Index(fields=['queue', 'run_at'], name='job_queued_due_idx', condition=Q(status='queued')),
+            # Latency metrics and pruning read recently finished jobs.
+            models.Index(fields=['status', 'finished_at'], name='job_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.get_status_display()})"
@@ -0,0 +1,76 @@
+"""
+Marking tasks overdue as their due dates pass, and reminding their assignees.
+
+Whether a task is overdue depends on the clock, so no write notices when it
+becomes so. The sweep_overdue command, run every few minutes, sets
+Task.overdue_since on the open tasks whose due date has passed, which lets
+listings filter overdue tasks in SQL and refreshes the projects' overdue
+counters, and then queues one digest email per assignee of the newly overdue
+tasks. Writes that complete a task or move its due date ahead clear the marker
+(Task.save() and TaskQuerySet.update()).
+
+Both passes stream through partial indexes in fixed-size batches, so memory
+stays bounded however many tasks are open.
+"""
+from itertools import groupby
+from operator import itemgetter
+
+from django.utils import timezone
+
+from . import jobs
+from .models import Job, Task, TaskAssignment
+
+# Tasks listed in a digest email; the rest are only counted.
+DIGEST_TASKS = 20
+
+
+def sweepable(now):
+    """Open tasks past due and not yet marked; served by task_overdue_sweep_idx."""
+    return Task.objects.filter(overdue_since__isnull=True, due_date__lt=now).exclude(status='completed')
+
+
+def sweep(now=None, batch_size=1000):
+    """Mark the tasks that became overdue by ``now`` with overdue_since = ``now``; returns how many."""
+    now = now or timezone.now()
+    marked = 0
+    while True:
+        # Marked tasks leave the index, so every batch starts from its beginning.
+        pks = list(sweepable(now).order_by('due_date').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return marked
+        # Filtered again in case a task was completed in the meantime.
+        marked += sweepable(now).filter(pk__in=pks).update(overdue_since=now)
+
+
+def digests(swept_at, chunk_size=2000):
+    """
+    (assignee id, task ids, total) for every user with open assignments on the
+    tasks a sweep marked at ``swept_at``; at most DIGEST_TASKS ids per user.
+    """
+    rows = (
+        TaskAssignment.objects.filter(is_completed=False, task__overdue_since=swept_at)
+        .order_by('assigned_to_id', 'task_id').values_list('assigned_to_id', 'task_id')
+        .iterator(chunk_size=chunk_size)
+    )
+    for user_id, group in groupby(rows, key=itemgetter(0)):
+        task_ids = []
+        total = 0
+        for _, task_id in group:
+            total += 1
+            if len(task_ids) < DIGEST_TASKS:
+                task_ids.append(task_id)
+        yield user_id, task_ids, total
+
+
+def queue_reminders(swept_at, batch_size=500):
+    """Queue a notify_overdue job per assignee of the tasks swept at ``swept_at``; returns how many."""
+    pending = []
+    queued = 0
+    for user_id, task_ids, total in digests(swept_at):
+        pending.append(jobs.notify_overdue.job(assigned_to=user_id, task_ids=task_ids, total=total))
+        if len(pending) >= batch_size:
+            queued += len(Job.objects.bulk_create(pending))
+            pending = []
+    if pending:
+        queued += len(Job.objects.bulk_create(pending))
+    return queued
@@ -0,0 +1,172 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Pages are located with a WHERE clause on the ordering columns of the last row
+seen, so deep pages cost the same as the first one and no COUNT query is run.
+Cursors are opaque, URL-safe tokens encoding those column values.
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.http import Http404
+
+# A filter that matches nothing, used when no row can follow the cursor on a column.
+NOTHING = Q(pk__in=[])
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPage:
+    """One page of results plus the cursors for its neighbours."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by keyset over ``ordering``.
+
+    ``ordering`` uses the usual ``'-field'`` notation and must end in a unique
+    column (normally ``'id'``) so every row has a distinct position. Nullable
+    columns sort their NULLs last, in both directions, on every backend.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.columns = []
+        for name in ordering:
+            descending = name.startswith('-')
+            field_name = name.lstrip('-')
+            field = queryset.model._meta.get_field(field_name)
+            attname = 'pk' if field.primary_key else field.attname
+            self.columns.append((attname, field, descending, field.null))
+
+    # Cursor encoding
+
+    def encode_cursor(self, obj, direction):
+        values = [self._to_json(getattr(obj, attname)) for attname, *_ in self.columns]
+        payload = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, values = json.loads(payload)
+            if direction not in ('next', 'prev') or len(values) != len(self.columns):
+                raise ValueError(token)
+            values = [
+                None if value is None else field.to_python(value)
+                for value, (_, field, _, _) in zip(values, self.columns)
+            ]
+        except (ValueError, TypeError, ValidationError) as exc:
+            raise InvalidCursor(token) from exc
+        return direction, values
+
+    @staticmethod
+    def _to_json(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    # Query building
+
+    def _order_by(self, reverse):
+        order = []
+        for attname, _, descending, nullable in self.columns:
+            expression = F(attname)
+            descending = descending != reverse
+            nulls = {} if not nullable else ({'nulls_first': True} if reverse else {'nulls_last': True})
+            order.append(expression.desc(**nulls) if descending else expression.asc(**nulls))
+        return order
+
+    def _after(self, values, reverse):
+        """Q matching every row strictly after ``values`` in the (possibly reversed) ordering."""
+        condition = NOTHING
+        # Build from the last (unique) column outwards:
+        # after(c1..cn) = c1 > v1 OR (c1 = v1 AND after(c2..cn))
+        for (attname, _, descending, nullable), value in reversed(list(zip(self.columns, values))):
+            descending = descending != reverse
+            nulls_last = nullable and not reverse
+            if value is None:
+                beyond = NOTHING if nulls_last else Q(**{f'{attname}__isnull': False})
+                equal = Q(**{f'{attname}__isnull': True})
+            else:
+                beyond = Q(**{f'{attname}__lt' if descending else f'{attname}__gt': value})
+                if nulls_last:
+                    beyond |= Q(**{f'{attname}__isnull': True})
+                equal = Q(**{attname: value})
+            condition = beyond | (equal & condition)
+        return condition
+
+    def page(self, cursor=None):
+        """Return the page after (or before) ``cursor``, or the first page when it is empty."""
+        direction, values = self.decode_cursor(cursor) if cursor else ('next', None)
+        reverse = direction == 'prev'
+        queryset = self.queryset.order_by(*self._order_by(reverse))
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+
+        if not rows:
+            return KeysetPage(rows, None, None)
+        # Coming from a cursor implies there is at least one row on the side we came from.
+        has_next = has_more if not reverse else True
+        has_previous = has_more if reverse else values is not None
+        return KeysetPage(
+            rows,
+            self.encode_cursor(rows[-1], 'next') if has_next else None,
+            self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
+
+
+class KeysetPaginationMixin:
+    """
+    Cursor pagination for ListViews, replacing Django's OFFSET/COUNT paginator.
+
+    Set ``cursor_ordering`` to the view's ordering ending in a unique column and
+    ``paginate_by`` to the page size. The page is read from ``?cursor=``.
+    """
+    cursor_ordering = ('-id',)
+    cursor_kwarg = 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid page cursor.")
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Query string without the cursor, so page links keep the active filters.
+        params = self.request.GET.copy()
+        params.pop(self.cursor_kwarg, None)
+        context['cursor_query'] = params.urlencode()
+        return context
@@ -0,0 +1,123 @@
+"""
+Team-membership permissions.
+
+Every access rule in the app comes down to whether the user is a member of the
+team a team, project or task belongs to (task creators may also edit their
+tasks). Memberships loads the IDs of a user's teams and of those teams'
+projects with one query, then answers those checks with set lookups and
+filters querysets by the IDs instead of joining the membership table.
+
+for_user() memoises the Memberships on the user object, which lives as long as
+the request, and keeps it in the default cache for
+settings.PERMISSION_CACHE_TIMEOUT seconds (0 loads it once per request
+instead). The signal handlers in tasks/signals.py invalidate the entries of the
+users a membership, project or team change affects.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from . import routers
+from .models import Project, Task, Team
+
+MEMBERSHIPS_KEY = 'tasks:memberships:{user_id}'
+
+
+def memberships_key(user_id):
+    return MEMBERSHIPS_KEY.format(user_id=user_id)
+
+
+class Memberships:
+    """The teams a user belongs to and the projects of those teams, as ID sets."""
+
+    def __init__(self, user_id, team_ids=(), project_ids=()):
+        self.user_id = user_id
+        self.team_ids = frozenset(team_ids)
+        self.project_ids = frozenset(project_ids)
+
+    def __repr__(self):
+        return f'<Memberships user={self.user_id} teams={len(self.team_ids)} projects={len(self.project_ids)}>'
+
+    def is_member(self, team_id):
+        return team_id in self.team_ids
+
+    def can_access_project(self, project_id):
+        return project_id in self.project_ids
+
+    def can_access_task(self, task):
+        return task.project_id in self.project_ids
+
+    def can_edit_task(self, task):
+        """Team members can edit a task, and so can its creator after leaving the team."""
+        return task.project_id in self.project_ids or task.created_by_id == self.user_id
+
+    def teams(self):
+        return Team.objects.filter(pk__in=self.team_ids)
+
+    def projects(self):
+        return Project.objects.filter(pk__in=self.project_ids)
+
+    def tasks(self):
+        return Task.objects.filter(project_id__in=self.project_ids)
+
+    def editable_tasks(self):
+        return Task.objects.filter(Q(project_id__in=self.project_ids) | Q(created_by_id=self.user_id))
+
+    def members(self):
+        """Users sharing a team with the user, the user included."""
+        return User.objects.filter(teams__in=self.team_ids).distinct()
+
+
+def load(user_id):
+    """Read a user's Memberships from the database, in one query."""
+    rows = Team.members.through.objects.filter(user_id=user_id).values_list('team_id', 'team__projects__id')
+    team_ids = set()
+    project_ids = set()
+    for team_id, project_id in rows:
+        team_ids.add(team_id)
+        if project_id is not None:
+            project_ids.add(project_id)
+    return Memberships(user_id, team_ids, project_ids)
+
+
+def get(user_id):
+    """A user's Memberships from the cache, loaded and cached on a miss."""
+    timeout = getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 0)
+    if not timeout:
+        return load(user_id)
+    key = memberships_key(user_id)
+    memberships = cache.get(key)
+    if memberships is None:
+        # Cached entries outlive the replica's lag, so they are read from the primary.
+        with routers.read_from_primary():
+            memberships = load(user_id)
+        cache.set(key, memberships, timeout)
+    return memberships
+
+
+def for_user(user):
+    """``user``'s Memberships, loaded at most once per user object, i.e. per request."""
+    if not user.is_authenticated:
+        return Memberships(None)
+    memberships = getattr(user, '_memberships', None)
+    if memberships is None:
+        memberships = user._memberships = get(user.pk)
+    return memberships
+
+
+async def afor_user(user):
+    """Async for_user()."""
+    return await sync_to_async(for_user)(user)
+
+
+def invalidate(user_ids):
+    """Drop the cached Memberships of the given users."""
+    keys = [memberships_key(user_id) for user_id in set(user_ids) if user_id is not None]
+    if keys:
+        cache.delete_many(keys)
+        # Again once the change is committed, in case a concurrent request
+        # cached the old memberships in between.
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,288 @@
+"""
+Per-request SQL profiling.
+
+SQLProfilingMiddleware times every request and its queries and reports both,
+with the hit rate of the cached template fragments, in a Server-Timing header,
+which costs a clock read per query. A sampled share of requests
+(settings.SQL_PROFILE_SAMPLE_RATE) is profiled in detail: each query is
+attributed to its call site, the template line rendering it or else the
+innermost line of project code, and normalised so that queries repeated with
+different parameters, the signature of an N+1, are flagged. Those profiles are
+appended to settings.SQL_PROFILE_LOG as JSON lines.
+
+Staff (or anyone, with DEBUG on) can profile a single page by adding
+?sql_profile=1 to its URL; the profile is then shown in a panel at the bottom
+of the page as well. The parameter is ignored for everyone else. Without
+DEBUG, staff are only recognised once the user is loaded, so the queries
+before the view (the session's and the user's) are timed but not attributed.
+
+Queries are seen through a database execute wrapper installed on every
+connection, including those of the worker threads gather_queries() uses; the
+profile of the request running is found through a context variable, which
+sync_to_async() carries over to those threads.
+"""
+import contextvars
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+# The same normalised statement this many times in one request is flagged as an N+1.
+REPEAT_THRESHOLD = 5
+# Query parameter that profiles one request and shows the panel.
+PANEL_PARAMETER = 'sql_profile'
+
+_profile = contextvars.ContextVar('sql_profile', default=None)
+_log_lock = threading.Lock()
+
+_PROJECT_DIR = str(settings.BASE_DIR) + '/'
+_SKIP_PREFIXES = (__file__.removesuffix('c'), str(Path(sys.prefix)), sys.base_prefix)
+# Middleware calls only pass the request on; queries below them belong to whatever runs next.
+_PASS_THROUGH = ('__call__', '__acall__')
+_TEMPLATE_BASE = None
+
+
+class Profile:
+    """The queries of one request: timings always, call sites and SQL only when ``detailed``."""
+
+    def __init__(self, detailed):
+        self.detailed = detailed
+        self.count = 0
+        self.duration = 0.0
+        self.queries = []
+        # Cached template fragments (tasks/templatetags/fragments.py) served and rendered.
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    def add(self, sql, duration, site):
+        self.count += 1
+        self.duration += duration
+        if self.detailed:
+            self.queries.append((normalize(sql), duration, site))
+
+    def summary(self):
+        """Queries grouped by call site, and the repeated statements, slowest first."""
+        sites = defaultdict(lambda: {'count': 0, 'ms': 0.0})
+        statements = defaultdict(lambda: {'count': 0, 'ms': 0.0, 'sites': set()})
+        for sql, duration, site in self.queries:
+            sites[site]['count'] += 1
+            sites[site]['ms'] += duration * 1000
+            statement = statements[sql]
+            statement['count'] += 1
+            statement['ms'] += duration * 1000
+            statement['sites'].add(site)
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.duration * 1000, 3),
+            'fragments': {'hits': self.fragment_hits, 'misses': self.fragment_misses},
+            'sites': sorted(
+                ({'site': site, 'count': row['count'], 'ms': round(row['ms'], 3)} for site, row in sites.items()),
+                key=lambda row: -row['ms'],
+            ),
+            'repeated': sorted(
+                ({'sql': sql, 'count': row['count'], 'ms': round(row['ms'], 3), 'sites': sorted(row['sites'])}
+                 for sql, row in statements.items() if row['count'] >= REPEAT_THRESHOLD),
+                key=lambda row: -row['count'],
+            ),
+        }
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\((?:\s*(?:\?|%s)\s*,)+\s*(?:\?|%s)\s*\)')
+
+
+def normalize(sql):
+    """``sql`` with its literals and parameter lists replaced, so repeats with other values match."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    return _LIST.sub('(...)', sql)
+
+
+def call_site():
+    """
+    Where the running query comes from: 'template.html:LINE' if a template is
+    rendering it, else 'path/to/module.py:LINE' of the innermost project code.
+    """
+    global _TEMPLATE_BASE
+    if _TEMPLATE_BASE is None:
+        from django.template import base
+        _TEMPLATE_BASE = base.Node.render_annotated.__code__
+    frame = sys._getframe(2)
+    code_site = None
+    while frame is not None:
+        code = frame.f_code
+        if code is _TEMPLATE_BASE:
+            node = frame.f_locals.get('self')
+            token = getattr(node, 'token', None)
+            if token is not None and getattr(node, 'origin', None) is not None:
+                return f'{node.origin.template_name}:{token.lineno}'
+        elif code_site is None and code.co_name not in _PASS_THROUGH:
+            filename = code.co_filename
+            if filename.startswith(_PROJECT_DIR) and not filename.startswith(_SKIP_PREFIXES):
+                code_site = f'{filename.removeprefix(_PROJECT_DIR)}:{frame.f_lineno}'
+        frame = frame.f_back
+    return code_site or '(django)'
+
+
+def _wrapper(execute, sql, params, many, context):
+    profile = _profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    site = call_site() if profile.detailed else None
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add(sql, time.perf_counter() - start, site)
+
+
+def count_fragment(hit):
+    """Count a cached-fragment lookup in the running request's profile."""
+    profile = _profile.get()
+    if profile is not None:
+        if hit:
+            profile.fragment_hits += 1
+        else:
+            profile.fragment_misses += 1
+
+
+def install(connection):
+    # First in the list, so execute_wrapper() blocks popping theirs leave it alone.
+    if _wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _wrapper)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+@contextmanager
+def profiled(detailed=True):
+    """Profile the queries run in the block, including on threads it hands work to with sync_to_async()."""
+    for connection in connections.all(initialized_only=True):
+        install(connection)
+    profile = Profile(detailed)
+    token = _profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _profile.reset(token)
+
+
+def write_log(entry, path=None):
+    path = Path(path or settings.SQL_PROFILE_LOG)
+    line = json.dumps(entry) + '\n'
+    with _log_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('a', encoding='utf-8') as log:
+            log.write(line)
+
+
+class SQLProfilingMiddleware:
+    """Report each request's SQL in Server-Timing and profile a sample of requests in detail."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'SQL_PROFILE_SAMPLE_RATE', 0.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        profile, token, start = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        return self.finish(request, response, profile, start)
+
+    async def __acall__(self, request):
+        profile, token, start = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _profile.reset(token)
+        if profile.detailed:
+            # Writing the log and rendering the panel are synchronous.
+            return await sync_to_async(self.finish)(request, response, profile, start)
+        return self.finish(request, response, profile, start)
+
+    def start(self, request):
+        request.sql_profile_panel = PANEL_PARAMETER in request.GET
+        request.sql_profile_sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        # Only for requests whose panel will be shown; for staff, see process_view().
+        profile = Profile(request.sql_profile_sampled or (request.sql_profile_panel and settings.DEBUG))
+        return profile, _profile.set(profile), time.perf_counter()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # The authentication middleware has run by now, so staff can be told apart.
+        profile = _profile.get()
+        if request.sql_profile_panel and profile is not None and not profile.detailed:
+            profile.detailed = self.panel_allowed(request)
+
+    def finish(self, request, response, profile, start):
+        total = time.perf_counter() - start
+        timings = [f'db;dur={profile.duration * 1000:.1f};desc="{profile.count} queries"']
+        lookups = profile.fragment_hits + profile.fragment_misses
+        if lookups:
+            timings.append(f'fragments;desc="{profile.fragment_hits}/{lookups} cached"')
+        timings.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        if not profile.detailed:
+            return response
+        match = getattr(request, 'resolver_match', None)
+        entry = {
+            'time': timezone.now().isoformat(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 3),
+            **profile.summary(),
+        }
+        if request.sql_profile_panel and self.show_panel(request, response):
+            self.add_panel(response, entry)
+        if request.sql_profile_sampled and getattr(settings, 'SQL_PROFILE_LOG', None):
+            write_log(entry)
+        return response
+
+    def panel_allowed(self, request):
+        user = getattr(request, 'user', None)
+        return settings.DEBUG or (user is not None and user.is_staff)
+
+    def show_panel(self, request, response):
+        return (
+            self.panel_allowed(request)
+            and not response.streaming
+            and response.get('Content-Type', '').startswith('text/html')
+        )
+
+    def add_panel(self, response, entry):
+        panel = render_to_string('tasks/sql_profile_panel.html', {
+            'profile': entry, 'repeat_threshold': REPEAT_THRESHOLD,
+        }).encode(response.charset)
+        content = response.content
+        position = content.rfind(b'</body>')
+        response.content = content[:position] + panel + content[position:] if position != -1 else content + panel
+        if response.has_header('Content-Length'):
+            response['Content-Length'] = len(response.content)
@@ -0,0 +1,144 @@
+"""
+Primary/replica database routing.
+
+With a ``replica`` database configured (see DATABASES in settings), the reads
+of safe requests (GET, HEAD, OPTIONS), i.e. the list, detail and report pages
+and the API's reads, go to the replica, and everything else to ``default``,
+the primary. Outside requests, in management commands and the job worker,
+every query goes to the primary.
+
+A replica lags behind its primary, so users must not read from it right after
+writing. Within a request, the first write sends the rest of its reads to the
+primary. ReplicaRoutingMiddleware also marks the response with a cookie that
+keeps the user's reads on the primary for settings.REPLICA_PIN_SECONDS.
+Values cached beyond the request are read inside read_from_primary(), so a
+stale replica read is not served from the cache after the replica caught up.
+
+Locally, two SQLite files can stand in for the primary and the replica:
+copy_to_replica() (the sync_replica command) copies one into the other.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+# Set on the responses of requests that wrote; its presence pins reads to the primary.
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class Routing:
+    """Where the running request reads from."""
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+_routing = contextvars.ContextVar('db_routing', default=None)
+
+
+def replica_configured():
+    """Whether a replica other than the primary's own database is configured.
+
+    Under test the replica mirrors the primary: the same database, on a
+    connection that cannot see the running test's transaction.
+    """
+    if REPLICA not in connections.settings:
+        return False
+    primary, replica = connections[DEFAULT_DB_ALIAS].settings_dict, connections[REPLICA].settings_dict
+    return any(primary.get(key) != replica.get(key) for key in ('NAME', 'HOST', 'PORT'))
+
+
+@contextmanager
+def read_from_primary():
+    """Send the reads of the block to the primary."""
+    token = _routing.set(None)
+    try:
+        yield
+    finally:
+        _routing.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Route the reads of safe requests to the replica, and all other queries to the primary."""
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if routing is None or not routing.replica or routing.wrote:
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db == DEFAULT_DB_ALIAS:
+            # The relations of a row read from the primary, which the replica may not have yet.
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the primary's rows.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica follows the primary's schema.
+        return db != REPLICA
+
+
+class ReplicaRoutingMiddleware:
+    """Let safe requests read from the replica unless the user wrote moments ago."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = self.routing(request)
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, routing)
+
+    async def __acall__(self, request):
+        # sync_to_async() carries the context variable, so the view's threads share the Routing.
+        routing = self.routing(request)
+        token = _routing.set(routing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _routing.reset(token)
+        return self.finish(response, routing)
+
+    def routing(self, request):
+        return Routing(
+            replica_configured() and request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        )
+
+    def finish(self, response, routing):
+        if routing.wrote and replica_configured():
+            response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                                samesite='Lax')
+        return response
+
+
+def copy_to_replica():
+    """Copy the primary into the replica with SQLite's online backup; for local two-file setups."""
+    primary, replica = connections[DEFAULT_DB_ALIAS], connections[REPLICA]
+    if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+        raise ValueError("Only SQLite databases can be copied; real replicas follow their primary by themselves.")
+    primary.ensure_connection()
+    replica.ensure_connection()
+    primary.connection.backup(replica.connection)
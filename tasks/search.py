@@ -0,0 +1,179 @@
+"""
+Full-text search over task titles, descriptions and comments.
+
+On SQLite the text is kept in an FTS5 table, ``tasks_search`` (created by
+migration 0004_search_index), with one row per task and one per comment.
+A row's rowid is derived from its source row (tasks even, comments odd), so it
+can be replaced or removed by key. The signal handlers in tasks/signals.py,
+TaskQuerySet's bulk methods and Comment.objects.bulk_create() keep the index
+current. Only writes that skip them, raw SQL and comment edits through
+QuerySet.update(), need the rebuild_search_index command afterwards.
+
+Other databases have no index and fall back to icontains matching.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Project, Task, Team
+
+SEARCH_TABLE = 'tasks_search'
+# Placeholders snippet() wraps matches in; the text is escaped before they become <mark> tags.
+MATCH_START, MATCH_END = '\x02', '\x03'
+# Stay below SQLite's limit on query parameters.
+CHUNK_SIZE = 500
+
+TASK, COMMENT = 'task', 'comment'
+
+
+def enabled():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(text):
+    """Turn free text into an FTS5 query: every word must appear, as a word or word prefix."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+
+
+def _rowid(kind, pk):
+    return pk * 2 if kind == TASK else pk * 2 + 1
+
+
+def _chunks(pks):
+    pks = sorted({pk for pk in pks if pk is not None})
+    for start in range(0, len(pks), CHUNK_SIZE):
+        yield pks[start:start + CHUNK_SIZE]
+
+
+def _source_sql(kind):
+    """SELECT producing index rows (rowid, task_id, title, body) for ``kind``."""
+    if kind == TASK:
+        return (f"SELECT id * 2, id, title, COALESCE(description, '') "
+                f"FROM {Task._meta.db_table}")
+    return f"SELECT id * 2 + 1, task_id, '', content FROM {Comment._meta.db_table}"
+
+
+def remove(kind, pks):
+    """Drop the index rows of the given tasks or comments."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        for chunk in _chunks(pks):
+            cursor.execute(
+                f"DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})",
+                [_rowid(kind, pk) for pk in chunk],
+            )
+
+
+def index(kind, pks):
+    """(Re)index the given tasks or comments from their current rows; missing rows are dropped."""
+    if not enabled():
+        return
+    remove(kind, pks)
+    with connection.cursor() as cursor:
+        for chunk in _chunks(pks):
+            cursor.execute(
+                f"INSERT INTO {SEARCH_TABLE} (rowid, task_id, title, body) "
+                f"{_source_sql(kind)} WHERE id IN ({', '.join(['%s'] * len(chunk))})",
+                chunk,
+            )
+
+
+def rebuild():
+    """Rebuild the whole index from the task and comment tables."""
+    if not enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        for kind in (TASK, COMMENT):
+            cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, task_id, title, body) {_source_sql(kind)}")
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+def matching(kind, text):
+    """
+    A filter matching the tasks or comments whose own text matches ``text``.
+
+    Use it on a Task or Comment queryset, e.g. ``Comment.objects.filter(search.matching('comment', text))``.
+    """
+    query = fts_query(text)
+    if not query:
+        return Q(pk__in=[])
+    if not enabled():
+        fields = ('title', 'description') if kind == TASK else ('content',)
+        condition = Q()
+        for word in re.findall(r'\w+', text):
+            condition &= Q(*(Q(**{f'{field}__icontains': word}) for field in fields), _connector=Q.OR)
+        return condition
+    return Q(pk__in=RawSQL(
+        f"SELECT rowid / 2 FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s AND rowid %% 2 = %s",
+        [query, 0 if kind == TASK else 1],
+    ))
+
+
+def search_tasks(text, user, limit=50):
+    """
+    Tasks in ``user``'s teams matching ``text`` in their title, description or
+    comments, best match first.
+
+    Each task gets a ``snippet`` of its best-matching text, with matches in
+    <mark> tags (None without the index). Titles weigh ten times as much as
+    descriptions and comments.
+    """
+    query = fts_query(text)
+    if not query:
+        return []
+    if not enabled():
+        return _search_tasks_fallback(text, user, limit)
+
+    table = SEARCH_TABLE
+    sql = (
+        f"SELECT {table}.task_id, {table}.rowid, MIN({table}.rank) AS score "
+        f"FROM {table} "
+        f"JOIN {Task._meta.db_table} t ON t.id = {table}.task_id "
+        f"JOIN {Project._meta.db_table} p ON p.id = t.project_id "
+        f"JOIN {Team.members.through._meta.db_table} m ON m.team_id = p.team_id "
+        f"WHERE {table} MATCH %s AND m.user_id = %s "
+        f"GROUP BY {table}.task_id ORDER BY score LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        # MIN() makes SQLite take the other bare columns, here the rowid, from the best row.
+        cursor.execute(sql, [query, user.pk, limit])
+        best_rows = {task_id: rowid for task_id, rowid, _ in cursor.fetchall()}
+        if not best_rows:
+            return []
+        cursor.execute(
+            f"SELECT rowid, snippet({SEARCH_TABLE}, -1, %s, %s, '…', 16) FROM {SEARCH_TABLE} "
+            f"WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({', '.join(['%s'] * len(best_rows))})",
+            [MATCH_START, MATCH_END, query, *best_rows.values()],
+        )
+        snippets = dict(cursor.fetchall())
+
+    tasks = Task.objects.select_related('project').in_bulk(best_rows)
+    results = []
+    for task_id, rowid in best_rows.items():
+        task = tasks.get(task_id)
+        if task is not None:
+            task.snippet = _highlight(snippets.get(rowid, ''))
+            results.append(task)
+    return results
+
+
+def _highlight(snippet):
+    return mark_safe(escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>'))
+
+
+def _search_tasks_fallback(text, user, limit):
+    comments = Comment.objects.filter(matching(COMMENT, text), task_id=OuterRef('pk'))
+    tasks = list(
+        Task.objects.filter(project__team__members=user)
+        .filter(matching(TASK, text) | Q(Exists(comments)))
+        .select_related('project')[:limit]
+    )
+    for task in tasks:
+        task.snippet = None
+    return tasks
@@ -0,0 +1,375 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import activity, cache, jobs, live, permissions, search
+from .models import Comment, Project, Task, TaskAssignment, TaskEvent, Team
+
+_state = threading.local()
+
+
+@contextmanager
+def deferred_counter_refresh():
+    """Collect project counter refreshes and run them once when the block exits."""
+    _deletion()
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        # Already deferring; the outermost block flushes.
+        yield
+        return
+    _state.pending = set()
+    try:
+        yield
+    finally:
+        project_ids = _state.pending
+        _state.pending = None
+        refresh_project_counters(project_ids)
+
+
+class _Deletion:
+    """A deletion of projects, teams or users in progress, and the projects it deletes."""
+
+    def __init__(self, atomic):
+        self.atomic = atomic
+        self.open = 0
+        self.project_ids = set()
+        # Search index rows of the tasks and comments it deletes, dropped at the end.
+        self.unindexed = {search.TASK: set(), search.COMMENT: set()}
+        # Whether the deletion defers the counter refreshes of its cascade, or an enclosing block does.
+        self.deferring = False
+
+
+def _deletion(using=None):
+    """The deletion in progress, if any; one that failed and rolled back is dropped."""
+    deletion = getattr(_state, 'deletion', None)
+    if deletion is not None and deletion.atomic not in transaction.get_connection(using).atomic_blocks:
+        _state.deletion = None
+        if deletion.deferring:
+            _state.pending = None
+        deletion = None
+    return deletion
+
+
+@receiver(pre_delete, sender=Project)
+@receiver(pre_delete, sender=Team)
+@receiver(pre_delete, sender=User)
+def deletion_started(sender, instance, using=None, **kwargs):
+    """
+    Defer the counter refreshes and index removals of the tasks a deletion
+    cascades to, which would otherwise run once per task, and note the
+    projects it removes: refreshing the counters of (and snapshotting) a
+    project about to go would leave a snapshot pointing at it.
+    """
+    deletion = _deletion(using)
+    if deletion is None:
+        # The collector deletes in an atomic block; the deletion lasts as long as it does.
+        deletion = _state.deletion = _Deletion(transaction.get_connection(using).atomic_blocks[-1])
+        if getattr(_state, 'pending', None) is None:
+            _state.pending = set()
+            deletion.deferring = True
+    deletion.open += 1
+    if sender is Project:
+        deletion.project_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Team)
+@receiver(post_delete, sender=User)
+def deletion_finished(sender, instance, using=None, **kwargs):
+    """Refresh the counters and the index once the last of the deletion's projects, teams and users is gone."""
+    deletion = _deletion(using)
+    if deletion is None:
+        return
+    deletion.open -= 1
+    if deletion.open:
+        return
+    _state.deletion = None
+    for kind, pks in deletion.unindexed.items():
+        search.remove(kind, pks)
+    if deletion.deferring:
+        project_ids = _state.pending - deletion.project_ids
+        _state.pending = None
+        refresh_project_counters(project_ids)
+
+
+def refresh_project_counters(project_ids):
+    """Refresh the task counters of the given projects, or queue them when deferred."""
+    project_ids = {pk for pk in project_ids if pk is not None}
+    deletion = _deletion()
+    if deletion is not None:
+        project_ids -= deletion.project_ids
+    if not project_ids:
+        return
+    pending = getattr(_state, 'pending', None)
+    if pending is not None:
+        pending.update(project_ids)
+        return
+    Project.objects.filter(pk__in=project_ids).refresh_task_counters()
+    live_ids = [pk for pk in project_ids if live.has_subscribers(live.project_channel(pk))]
+    if live_ids:
+        for project in Project.objects.filter(pk__in=live_ids):
+            live.publish([live.project_channel(project.pk)], 'stats', live.project_stats_data(project))
+    # Every task write lands here, including bulk operations, so the dashboards
+    # showing these projects' tasks and progress are invalidated here too.
+    cache.invalidate_dashboards(cache.users_affected_by_projects(project_ids))
+
+
+# Registered before task_saved, which resets the _loaded_project_id this reads.
+@receiver(post_save, sender=Task)
+def publish_task(sender, instance, raw=False, **kwargs):
+    """Push the task's new state to its page and its project's board."""
+    if raw:
+        return
+    channels = [live.task_channel(instance.pk), live.project_channel(instance.project_id)]
+    previous_project_id = getattr(instance, '_loaded_project_id', None)
+    if previous_project_id not in (None, instance.project_id):
+        live.publish([live.project_channel(previous_project_id)], 'task_deleted',
+                     {'id': instance.pk, 'project': previous_project_id})
+    live.publish(channels, 'task', live.task_data(instance))
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, raw=False, **kwargs):
+    """Keep project counters in sync when a task is created or edited."""
+    if raw:
+        return
+    refresh_project_counters({instance.project_id, getattr(instance, '_loaded_project_id', None)})
+    instance._loaded_project_id = instance.project_id
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    """Keep project counters in sync when a task is deleted."""
+    refresh_project_counters({instance.project_id})
+
+
+@receiver(post_save, sender=Task)
+def index_task(sender, instance, update_fields=None, **kwargs):
+    """Reindex a task's title and description; raw (fixture) saves included."""
+    if update_fields is None or {'title', 'description'} & set(update_fields):
+        search.index(search.TASK, {instance.pk})
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'content' in update_fields:
+        search.index(search.COMMENT, {instance.pk})
+
+
+def _unindex(kind, pk):
+    deletion = _deletion()
+    if deletion is not None:
+        deletion.unindexed[kind].add(pk)
+    else:
+        search.remove(kind, {pk})
+
+
+@receiver(post_delete, sender=Task)
+def unindex_task(sender, instance, **kwargs):
+    _unindex(search.TASK, instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    _unindex(search.COMMENT, instance.pk)
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    live.publish([live.task_channel(instance.pk), live.project_channel(instance.project_id)], 'task_deleted',
+                 {'id': instance.pk, 'project': instance.project_id})
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        live.publish([live.task_channel(instance.task_id)], 'comment', live.comment_data(instance))
+
+
+@receiver(post_save, sender=TaskAssignment)
+def publish_assignment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        live.publish([live.task_channel(instance.task_id)], 'assignment', live.assignment_data(instance))
+
+
+@receiver(post_save, sender=TaskAssignment)
+@receiver(post_delete, sender=TaskAssignment)
+def assignment_changed(sender, instance, raw=False, **kwargs):
+    """An assignment changes the assignee's task list and counts."""
+    if not raw:
+        cache.invalidate_dashboards({instance.assigned_to_id})
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, raw=False, **kwargs):
+    """Comments are shown to the task's assignees."""
+    if not raw:
+        cache.invalidate_dashboards(
+            TaskAssignment.objects.filter(task_id=instance.task_id).values_list('assigned_to_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_saved(sender, instance, created=False, raw=False, **kwargs):
+    """Keep the task's comment count in sync when a comment is added or moved to another task."""
+    if raw:
+        return
+    previous_task_id = getattr(instance, '_loaded_task_id', None)
+    if created:
+        Task.objects.filter(pk=instance.task_id).add_comment_count(1)
+    elif previous_task_id not in (None, instance.task_id):
+        Task.objects.filter(pk__in={previous_task_id, instance.task_id}).refresh_comment_counts()
+    instance._loaded_task_id = instance.task_id
+
+
+@receiver(post_delete, sender=Comment)
+def count_comment_deleted(sender, instance, **kwargs):
+    # The guard keeps a count that was off (e.g. after raw fixture loads) from going negative.
+    Task.objects.filter(pk=instance.task_id, comment_count__gt=0).add_comment_count(-1)
+
+
+@receiver(post_save, sender=Task)
+def record_task_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    values = instance.history_values()
+    if update_fields is not None:
+        saved = {instance._meta.get_field(name).attname for name in update_fields}
+        values = {field: value for field, value in values.items() if field in saved}
+    if created:
+        activity.record(TaskEvent.TASK_CREATED, instance.pk, instance.project_id, instance.created_by_id,
+                        title=instance.title, status=instance.status)
+    else:
+        loaded = getattr(instance, '_loaded_history', None)
+        changed = activity.changes(loaded, values) if loaded is not None else None
+        # Instances not loaded from the database cannot say what changed.
+        if changed or loaded is None:
+            activity.record(TaskEvent.TASK_UPDATED, instance.pk, instance.project_id, changes=changed or {})
+    instance._loaded_history = {**getattr(instance, '_loaded_history', {}), **values}
+
+
+@receiver(post_delete, sender=Task)
+def record_task_deleted(sender, instance, **kwargs):
+    activity.record(TaskEvent.TASK_DELETED, instance.pk, instance.project_id, title=instance.title)
+
+
+def _project_id(instance):
+    """The project of an assignment's or comment's task if the task is loaded; otherwise it is looked up later."""
+    if instance._meta.get_field('task').is_cached(instance):
+        return instance.task.project_id
+    return None
+
+
+@receiver(post_save, sender=TaskAssignment)
+def record_assignment_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        activity.record(TaskEvent.ASSIGNED, instance.task_id, _project_id(instance), instance.assigned_by_id,
+                        assigned_to=instance.assigned_to_id)
+    elif instance.is_completed and not getattr(instance, '_loaded_is_completed', False):
+        activity.record(TaskEvent.ASSIGNMENT_COMPLETED, instance.task_id, _project_id(instance),
+                        assigned_to=instance.assigned_to_id)
+    instance._loaded_is_completed = instance.is_completed
+
+
+@receiver(post_delete, sender=TaskAssignment)
+def record_assignment_deleted(sender, instance, **kwargs):
+    activity.record(TaskEvent.UNASSIGNED, instance.task_id, _project_id(instance), assigned_to=instance.assigned_to_id)
+
+
+@receiver(post_save, sender=Comment)
+def record_comment_saved(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        activity.record(TaskEvent.COMMENT_ADDED, instance.task_id, _project_id(instance), instance.author_id,
+                        comment=instance.pk)
+    else:
+        activity.record(TaskEvent.COMMENT_EDITED, instance.task_id, _project_id(instance), comment=instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def record_comment_deleted(sender, instance, **kwargs):
+    activity.record(TaskEvent.COMMENT_DELETED, instance.task_id, _project_id(instance), comment=instance.pk)
+
+
+def bump_team_versions(team_ids):
+    """Expire the cached fragments of teams whose members or projects changed."""
+    team_ids = {pk for pk in team_ids if pk is not None}
+    if team_ids:
+        Team.objects.filter(pk__in=team_ids).update(version=F('version') + 1)
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Renames, moves and new projects change the team members' project lists."""
+    if raw or (update_fields and set(update_fields) <= set(Project.TASK_COUNTER_FIELDS)):
+        return
+    previous_team_id = getattr(instance, '_loaded_team_id', None)
+    moved = created or previous_team_id != instance.team_id
+    team_ids = {instance.team_id, previous_team_id} - {None} if moved else {instance.team_id}
+    members = cache.users_affected_by_teams(team_ids)
+    cache.invalidate_dashboards(members)
+    if moved:
+        # The teams' project counts changed, and so did their members' project IDs.
+        bump_team_versions(team_ids)
+        permissions.invalidate(members)
+    instance._loaded_team_id = instance.team_id
+
+
+@receiver(pre_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    # pre_delete: the team membership is still there to be read.
+    cache.invalidate_dashboards(cache.users_affected_by_projects({instance.pk}))
+    bump_team_versions({instance.team_id})
+    permissions.invalidate(cache.users_affected_by_teams({instance.team_id}))
+
+
+@receiver(post_save, sender=Team)
+def team_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        cache.invalidate_dashboards(cache.users_affected_by_teams({instance.pk}))
+
+
+@receiver(pre_delete, sender=Team)
+def team_deleted(sender, instance, **kwargs):
+    members = cache.users_affected_by_teams({instance.pk})
+    cache.invalidate_dashboards(members)
+    permissions.invalidate(members)
+
+
+@receiver(m2m_changed, sender=Team.members.through)
+def team_members_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Membership changes alter the member counts every member sees, and the
+    added or removed users' team and project lists and permissions.
+    """
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        # user.teams.add(...): instance is the user, pk_set holds team IDs.
+        team_ids = pk_set if pk_set is not None else set(instance.teams.values_list('pk', flat=True))
+        user_ids = {instance.pk}
+    else:
+        team_ids = {instance.pk}
+        user_ids = set(pk_set or ())
+    members = cache.users_affected_by_teams(team_ids)
+    cache.invalidate_dashboards(user_ids | members)
+    bump_team_versions(team_ids)
+    # clear() on a team (pk_set is None) removes every member.
+    permissions.invalidate(user_ids if pk_set is not None else user_ids | members)
+
+
+@receiver(post_save, sender=TaskAssignment)
+def notify_assignee(sender, instance, created=False, raw=False, **kwargs):
+    """Email the assignee from a worker; the job commits or rolls back with the assignment."""
+    if created and not raw and instance.assigned_to_id != instance.assigned_by_id:
+        jobs.notify_assignment.enqueue(task_ids=[instance.task_id], assigned_to=instance.assigned_to_id,
+                                       assigned_by=instance.assigned_by_id)
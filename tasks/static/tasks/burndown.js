@@ -0,0 +1,48 @@
+// Burndown chart on the project page.
+//
+// Fetches the daily series from the element's data-burndown-url and draws the
+// open and completed task counts as lines, and daily completions as bars,
+// into its <svg>.
+(function () {
+    const root = document.querySelector('[data-burndown-url]');
+    if (!root || !window.fetch) {
+        return;
+    }
+    const svg = root.querySelector('svg');
+    const NS = 'http://www.w3.org/2000/svg';
+    const WIDTH = 600;
+    const HEIGHT = 160;
+
+    function add(name, attributes) {
+        const element = document.createElementNS(NS, name);
+        Object.keys(attributes).forEach(function (key) {
+            element.setAttribute(key, attributes[key]);
+        });
+        svg.appendChild(element);
+        return element;
+    }
+
+    function draw(series) {
+        const days = series.dates.length;
+        const top = Math.max(1, Math.max.apply(null, series.open.concat(series.completed_count, series.completions)));
+        const step = days > 1 ? WIDTH / (days - 1) : WIDTH;
+        const y = function (value) { return HEIGHT - (value / top) * (HEIGHT - 10); };
+
+        series.completions.forEach(function (count, i) {
+            if (count) {
+                add('rect', {x: i * step - step / 4, y: y(count), width: step / 2, height: HEIGHT - y(count),
+                             fill: '#3498db', opacity: 0.5}).appendChild(document.createElementNS(NS, 'title'))
+                    .textContent = series.dates[i] + ': ' + count + ' completed';
+            }
+        });
+        [['open', '#e67e22'], ['completed_count', '#27ae60']].forEach(function (line) {
+            const points = series[line[0]].map(function (value, i) { return (i * step) + ',' + y(value); });
+            add('polyline', {points: points.join(' '), fill: 'none', stroke: line[1], 'stroke-width': 2,
+                             'vector-effect': 'non-scaling-stroke'});
+        });
+    }
+
+    fetch(root.dataset.burndownUrl, {credentials: 'same-origin'})
+        .then(function (response) { return response.ok ? response.json() : null; })
+        .then(function (series) { if (series) { draw(series); } });
+})();
@@ -0,0 +1,33 @@
+// "Load older comments" on the task detail page.
+//
+// Replaces the link with the page of comments it points to, which ends with
+// the link to the page after it, if any.
+(function () {
+    document.addEventListener('click', function (event) {
+        const link = event.target.closest('[data-comments-more]');
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        if (link.dataset.loading) {
+            return;
+        }
+        link.dataset.loading = 'true';
+        link.textContent = 'Loading…';
+        fetch(link.href, {credentials: 'same-origin'})
+            .then(function (response) {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.text();
+            })
+            .then(function (html) {
+                link.insertAdjacentHTML('afterend', html);
+                link.remove();
+            })
+            .catch(function () {
+                delete link.dataset.loading;
+                link.textContent = 'Load older comments (retry)';
+            });
+    });
+})();
@@ -0,0 +1,145 @@
+// Live updates for the task detail and project pages.
+//
+// Subscribes to the server-sent event stream named by the page's data-live-url
+// and patches the elements marked with data-field, data-stat and data-live,
+// so the page stays current without being reloaded.
+(function () {
+    const root = document.querySelector('[data-live-url]');
+    if (!root || !window.EventSource) {
+        return;
+    }
+
+    function field(container, name) {
+        return container.querySelector('[data-field="' + name + '"]');
+    }
+
+    function setText(element, text) {
+        if (element) {
+            element.textContent = text;
+        }
+    }
+
+    function fromTemplate(name) {
+        const template = document.querySelector('template[data-live="' + name + '"]');
+        return template ? template.content.firstElementChild.cloneNode(true) : null;
+    }
+
+    function patchTask(container, task) {
+        setText(field(container, 'title'), task.title);
+        const status = field(container, 'status');
+        if (status) {
+            status.className = 'status-badge status-' + task.status;
+            status.textContent = task.status_display;
+        }
+        const priority = field(container, 'priority');
+        if (priority) {
+            priority.className = 'priority-badge priority-' + task.priority;
+            priority.textContent = task.priority_display;
+        }
+        const overdue = field(container, 'overdue');
+        if (overdue) {
+            overdue.hidden = !task.is_overdue;
+        }
+        const due = field(container, 'due');
+        if (due) {
+            due.textContent = task.due_date_display;
+            due.style.cssText = task.is_overdue ? 'color: #e74c3c; font-weight: bold;' : (task.due_date ? '' : 'color: #999;');
+        }
+    }
+
+    const handlers = {
+        task: function (task) {
+            let container = document.querySelector('[data-task-id="' + task.id + '"]');
+            if (!container && root.dataset.projectId) {
+                // A task new to this board: add a row for it.
+                const tbody = document.querySelector('tbody');
+                container = fromTemplate('task-row');
+                if (!tbody || !container) {
+                    window.location.reload();
+                    return;
+                }
+                container.dataset.taskId = task.id;
+                container.querySelector('input[name="task_ids"]').value = task.id;
+                field(container, 'title').href = task.url;
+                field(container, 'link').href = task.url;
+                tbody.appendChild(container);
+            }
+            if (container) {
+                patchTask(container, task);
+            }
+        },
+
+        task_deleted: function (task) {
+            const container = document.querySelector('[data-task-id="' + task.id + '"]');
+            if (container === root) {
+                root.insertAdjacentHTML('afterbegin', '<div class="alert alert-danger">This task has been deleted or moved.</div>');
+            } else if (container) {
+                container.remove();
+            }
+        },
+
+        comment: function (comment) {
+            const list = document.querySelector('[data-live="comments"]');
+            if (!list || list.querySelector('[data-comment-id="' + comment.id + '"]')) {
+                return;
+            }
+            const element = fromTemplate('comment-template');
+            element.dataset.commentId = comment.id;
+            setText(field(element, 'author'), comment.author);
+            setText(field(element, 'created_at'), comment.created_at_display);
+            setText(field(element, 'content'), comment.content);
+            // Newest first, as rendered by the server.
+            list.prepend(element);
+            const empty = document.querySelector('[data-live="no-comments"]');
+            if (empty) {
+                empty.remove();
+            }
+            // Only a page of the comments is shown, so count on from the total.
+            const count = document.querySelector('[data-live="comment-count"]');
+            setText(count, (parseInt(count ? count.textContent : '', 10) || 0) + 1);
+        },
+
+        assignment: function (assignment) {
+            const list = document.querySelector('[data-live="assignments"]');
+            if (!list) {
+                return;
+            }
+            let element = list.querySelector('[data-assignment-id="' + assignment.id + '"]');
+            if (!element) {
+                element = fromTemplate('assignment-template');
+                element.dataset.assignmentId = assignment.id;
+                list.appendChild(element);
+                const empty = document.querySelector('[data-live="no-assignments"]');
+                if (empty) {
+                    empty.remove();
+                }
+            }
+            setText(field(element, 'initial'), assignment.assigned_to.charAt(0));
+            setText(field(element, 'name'), assignment.assigned_to);
+            field(element, 'completed').hidden = !assignment.is_completed;
+        },
+
+        stats: function (stats) {
+            ['total', 'completed', 'in_progress', 'todo', 'overdue', 'progress'].forEach(function (name) {
+                document.querySelectorAll('[data-stat="' + name + '"]').forEach(function (element) {
+                    element.textContent = stats[name];
+                });
+            });
+            const bar = document.querySelector('[data-stat="progress-bar"]');
+            if (bar) {
+                bar.style.width = stats.progress + '%';
+            }
+        },
+
+        resync: function () {
+            window.location.reload();
+        }
+    };
+
+    const source = new EventSource(root.dataset.liveUrl);
+    Object.keys(handlers).forEach(function (name) {
+        source.addEventListener(name, function (event) {
+            handlers[name](JSON.parse(event.data));
+        });
+    });
+})();
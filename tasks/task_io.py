@@ -0,0 +1,246 @@
+"""
+Streaming task import and export, used by the import_tasks and export_tasks commands.
+
+Rows are read and written one at a time, so files of any size are processed
+in constant memory. Imports are applied in batches: each batch is one
+transaction, resolves its project and user references with at most one query
+per model, and creates or updates its tasks with bulk_create()/bulk_update().
+"""
+import csv
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import activity
+from .models import Project, Task
+from .signals import deferred_counter_refresh
+
+FIELDS = ('id', 'title', 'description', 'project', 'status', 'priority', 'created_by', 'due_date')
+# bulk_update() skips auto_now, so updated_at is set explicitly.
+UPDATE_FIELDS = ['title', 'description', 'project', 'status', 'priority', 'created_by', 'due_date', 'updated_at']
+STATUSES = {choice for choice, _ in Task.STATUS_CHOICES}
+PRIORITIES = {choice for choice, _ in Task.PRIORITY_CHOICES}
+
+
+class RowError(ValueError):
+    """A row that cannot be imported; ``line`` is its 1-based row number."""
+
+    def __init__(self, line, message):
+        super().__init__(f"row {line}: {message}")
+        self.line = line
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """
+    Yield one row per input row: a dict for CSV, the unparsed line for JSON
+    lines. TaskImporter.clean() parses the lines, so that a malformed one is
+    reported as a RowError with its row number.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line
+
+
+def _text(row, name):
+    """The string value of ``name`` in ``row``, '' when missing or empty."""
+    value = row.get(name)
+    if value is None or value == '':
+        return ''
+    if not isinstance(value, str):
+        raise ValueError(f"{name} must be a string, not {value!r}")
+    return value
+
+
+def write_rows(stream, fmt, rows):
+    """Write dict rows to ``stream``; returns the number written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=FIELDS)
+        writer.writeheader()
+        for count, row in enumerate(rows, 1):
+            writer.writerow(row)
+    else:
+        for count, row in enumerate(rows, 1):
+            stream.write(json.dumps(row, default=str) + '\n')
+    return count
+
+
+def export_rows(queryset, chunk_size=2000):
+    """Yield an export row per task, streaming from the database."""
+    values = queryset.order_by('pk').values_list(
+        'pk', 'title', 'description', 'project_id', 'status', 'priority', 'created_by__username', 'due_date',
+    )
+    for pk, title, description, project_id, status, priority, created_by, due_date in values.iterator(chunk_size):
+        yield {
+            'id': pk,
+            'title': title,
+            'description': description or '',
+            'project': project_id,
+            'status': status,
+            'priority': priority,
+            'created_by': created_by or '',
+            'due_date': due_date.isoformat() if due_date else '',
+        }
+
+
+class LookupCache:
+    """
+    In-memory map of import references to primary keys.
+
+    Projects are referenced by ID and users by username. Unknown keys are
+    resolved for a whole batch with one query and remembered for later batches.
+    """
+
+    def __init__(self):
+        self.projects = {}
+        self.users = {}
+
+    def prime(self, rows):
+        project_ids = {row['project'] for row in rows} - self.projects.keys()
+        if project_ids:
+            found = set(Project.objects.filter(pk__in=project_ids).values_list('pk', flat=True))
+            self.projects.update({pk: pk in found for pk in project_ids})
+        usernames = {row['created_by'] for row in rows if row['created_by']} - self.users.keys()
+        if usernames:
+            found = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+            self.users.update({name: found.get(name) for name in usernames})
+
+
+class TaskImporter:
+    """Apply import rows in transactional batches, optionally resuming from a checkpoint."""
+
+    def __init__(self, batch_size=1000, checkpoint=None, progress=None):
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.lookups = LookupCache()
+        self.created = self.updated = self.skipped = 0
+
+    def load_checkpoint(self):
+        if not self.checkpoint or not self.checkpoint.exists():
+            return 0
+        return json.loads(self.checkpoint.read_text())['rows_committed']
+
+    def save_checkpoint(self, rows_committed):
+        if self.checkpoint:
+            self.checkpoint.write_text(json.dumps({'rows_committed': rows_committed}))
+
+    def run(self, rows, resume=False):
+        """Import ``rows``; returns the number of rows committed, including resumed ones."""
+        start_at = self.load_checkpoint() if resume else 0
+        committed = start_at
+        started = time.perf_counter()
+        batch = []
+        for line, row in enumerate(rows, 1):
+            if line <= start_at:
+                self.skipped += 1
+                continue
+            batch.append(self.clean(line, row))
+            if len(batch) >= self.batch_size:
+                committed = self.apply(batch, committed, started)
+                batch = []
+        if batch:
+            committed = self.apply(batch, committed, started)
+        if self.checkpoint and self.checkpoint.exists():
+            self.checkpoint.unlink()
+        return committed
+
+    def clean(self, line, row):
+        try:
+            if isinstance(row, str):
+                row = json.loads(row)
+                if not isinstance(row, dict):
+                    raise ValueError("a row must be a JSON object")
+            title = _text(row, 'title').strip()
+            if not title:
+                raise ValueError("title is required")
+            status = _text(row, 'status') or 'todo'
+            if status not in STATUSES:
+                raise ValueError(f"unknown status {status!r}")
+            priority = int(row.get('priority') or 2)
+            if priority not in PRIORITIES:
+                raise ValueError(f"unknown priority {priority!r}")
+            due_date = _text(row, 'due_date') or None
+            if due_date:
+                due_date = parse_datetime(due_date)
+                if due_date is None:
+                    raise ValueError(f"invalid due_date {row['due_date']!r}")
+                if timezone.is_naive(due_date):
+                    due_date = timezone.make_aware(due_date)
+            return {
+                'line': line,
+                'id': int(row['id']) if row.get('id') else None,
+                'title': title,
+                'description': _text(row, 'description'),
+                'project': int(row['project']),
+                'status': status,
+                'priority': priority,
+                'created_by': _text(row, 'created_by') or None,
+                'due_date': due_date,
+            }
+        except (KeyError, TypeError, ValueError) as exc:
+            raise RowError(line, exc) from exc
+
+    def apply(self, batch, committed, started):
+        self.lookups.prime(batch)
+        tasks = []
+        for row in batch:
+            if not self.lookups.projects[row['project']]:
+                raise RowError(row['line'], f"project {row['project']} does not exist")
+            created_by_id = None
+            if row['created_by']:
+                created_by_id = self.lookups.users[row['created_by']]
+                if created_by_id is None:
+                    raise RowError(row['line'], f"user {row['created_by']!r} does not exist")
+            tasks.append(Task(
+                pk=row['id'],
+                title=row['title'],
+                description=row['description'],
+                project_id=row['project'],
+                status=row['status'],
+                priority=row['priority'],
+                created_by_id=created_by_id,
+                due_date=row['due_date'],
+            ))
+
+        # Rows whose id matches an existing task update it; all others create new
+        # tasks, so files exported from another installation import cleanly.
+        ids = [task.pk for task in tasks if task.pk is not None]
+        existing = set(Task.objects.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+        now = timezone.now()
+        to_update, to_create = [], []
+        for task in tasks:
+            if task.pk in existing:
+                task.updated_at = now
+                to_update.append(task)
+            else:
+                task.pk = None
+                to_create.append(task)
+        # The batch is outermost so its events are written in one INSERT after the commit.
+        with activity.batch(), transaction.atomic(), deferred_counter_refresh():
+            if to_create:
+                Task.objects.bulk_create(to_create, batch_size=self.batch_size)
+            if to_update:
+                Task.objects.bulk_update(to_update, UPDATE_FIELDS, batch_size=self.batch_size)
+        self.created += len(to_create)
+        self.updated += len(to_update)
+
+        committed += len(batch)
+        self.save_checkpoint(committed)
+        if self.progress:
+            elapsed = time.perf_counter() - started
+            self.progress(committed, (self.created + self.updated) / elapsed if elapsed else 0)
+        return committed
@@ -0,0 +1,53 @@
+"""
+{% cachefragment %}: cache a rendered template fragment, shared across users.
+
+    {% load fragments %}
+    {% cachefragment 'project-card' project.pk project.updated_at project.version %}
+        ...
+    {% endcachefragment %}
+
+Like Django's {% cache %}, the key is the fragment name plus the values after
+it, but no timeout is given: the values are expected to change whenever the
+fragment would (an updated_at, a version bumped by related changes; see
+Project.version and Team.version), so entries are never invalidated, only
+superseded, and settings.FRAGMENT_CACHE_TIMEOUT just bounds how long
+superseded ones linger. Hits and misses are counted in the request's SQL
+profile (see tasks/profiling.py).
+"""
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+
+from .. import profiling
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        key = make_template_fragment_key(name, [var.resolve(context) for var in self.vary_on])
+        value = cache.get(key)
+        profiling.count_fragment(value is not None)
+        if value is None:
+            value = self.nodelist.render(context)
+            cache.set(key, value, settings.FRAGMENT_CACHE_TIMEOUT)
+        return value
+
+
+@register.tag
+def cachefragment(parser, token):
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least a fragment name.")
+    nodelist = parser.parse(('endcachefragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]),
+                              [parser.compile_filter(bit) for bit in bits[2:]])
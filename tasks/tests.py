@@ -1,3 +1,1563 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import activity, benchmark, burndown, jobs, live, overdue, permissions, profiling, routers, search, task_io
+from .admin import TeamAdmin
+from .async_queries import gather_queries
+from .models import Team, Project, ProjectSnapshot, Task, TaskAssignment, TaskEvent, Comment, Job
+from .pagination import KeysetPaginator
+from .views import COMMENTS_PER_PAGE, TaskListView
+
+
+class ListViewQueryCountTests(TestCase):
+    """The list views and dashboard render in a fixed number of queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', password='password')
+        cls.other = User.objects.create_user(username='bob', password='password')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_rows(self, count):
+        for i in range(count):
+            team = Team.objects.create(name=f'Team {i}', owner=self.user)
+            team.members.add(self.user, self.other)
+            project = Project.objects.create(name=f'Project {i}', team=team, owner=self.user)
+            for status in ('todo', 'in_progress', 'completed'):
+                task = Task.objects.create(title=f'{status} {i}', project=project, status=status, created_by=self.user)
+                TaskAssignment.objects.create(task=task, assigned_to=self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url_name, *args):
+        url = reverse(url_name, args=args)
+        self.add_rows(2)
+        few = self.count_queries(url)
+        self.add_rows(8)
+        many = self.count_queries(url)
+        self.assertEqual(few, many, f"{url_name} issues more queries as rows grow")
+
+    def test_dashboard(self):
+        self.assertConstantQueries('dashboard')
+
+    def test_team_list(self):
+        self.assertConstantQueries('team-list')
+
+    def test_project_list(self):
+        self.assertConstantQueries('project-list')
+
+    def test_task_list(self):
+        self.assertConstantQueries('task-list')
+
+    def test_team_detail(self):
+        team = Team.objects.create(name='Detail', owner=self.user)
+        team.members.add(self.user)
+        url = reverse('team-detail', args=[team.pk])
+        Project.objects.create(name='First', team=team, owner=self.user)
+        few = self.count_queries(url)
+        for i in range(5):
+            team.members.add(User.objects.create_user(username=f'member{i}'))
+            Project.objects.create(name=f'Project {i}', team=team, owner=self.user)
+        self.assertEqual(few, self.count_queries(url))
+
+    def test_team_counts_are_annotated(self):
+        self.add_rows(1)
+        team = Team.objects.with_counts().get()
+        self.assertEqual((team.member_count, team.project_count), (2, 1))
+
+    def test_project_progress_is_annotated(self):
+        self.add_rows(1)
+        project = Project.objects.with_progress().get()
+        self.assertEqual(project.progress, 33)
+        self.assertEqual(project.progress, project.get_progress())
+
+
+class RouteBudgetTests(TestCase):
+    """Every route stays within the query budgets in tasks/perf_budgets.json."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_routes_within_query_budgets(self):
+        user = benchmark.seed_dataset(teams=20, member_teams=5)
+        results = benchmark.measure_routes(user)
+        self.assertEqual(set(results), set(benchmark.named_routes()))
+        failures = benchmark.check_budgets(results, benchmark.load_budgets(), metrics=('queries',))
+        self.assertEqual(failures, [])
+
+    def test_unexpected_status_fails(self):
+        result = {'status': 403, 'queries': 1, 'sql_ms': 1.0, 'wall_ms': 1.0}
+        self.assertEqual(benchmark.check_budgets({'dashboard': result}, {'dashboard': {'queries': 5}}),
+                         ['dashboard: status 403, expected 200'])
+        self.assertEqual(benchmark.check_budgets({'job-metrics': result}, {'job-metrics': {'status': 403}}), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', "EXPLAIN output is checked against SQLite's planner")
+class IndexUsageTests(TestCase):
+    """The hot filters and orderings are served by the indexes from 0003_task_indexes."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotRegex(plan, r'SCAN tasks_\w+\s*$')
+
+    def test_project_status_filter(self):
+        self.assertUsesIndex(Task.objects.filter(project_id=1, status='todo').order_by(), 'task_project_status_idx')
+
+    def test_project_stats(self):
+        self.assertUsesIndex(Task.objects.filter(project_id=1).order_by().values('status'), 'task_project_status_idx')
+
+    def test_overdue_filter(self):
+        self.assertUsesIndex(Task.objects.overdue().order_by(), 'task_open_due_idx')
+
+    def test_overdue_sweep(self):
+        self.assertUsesIndex(overdue.sweepable(timezone.now()).order_by('due_date'), 'task_overdue_sweep_idx')
+
+    def test_default_ordering(self):
+        self.assertUsesIndex(Task.objects.all()[:20], 'task_priority_due_idx')
+
+    def test_open_assignments_for_user(self):
+        queryset = TaskAssignment.objects.filter(assigned_to_id=1, is_completed=False).order_by()
+        self.assertUsesIndex(queryset, 'assignment_user_done_idx')
+
+    def test_comment_thread(self):
+        self.assertUsesIndex(Comment.objects.filter(task_id=1)[:20], 'comment_task_created_idx')
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pagination visits every row exactly once, in order, without COUNT queries."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', password='password')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        team.members.add(cls.user)
+        project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        now = timezone.now()
+        for i in range(47):
+            # Repeated priorities and due dates, including NULLs, exercise every tie-break.
+            due_date = None if i % 5 == 0 else now + timedelta(days=i % 4)
+            task = Task.objects.create(title=f'Task {i}', project=project, priority=i % 4 + 1, due_date=due_date)
+            TaskAssignment.objects.create(task=task, assigned_to=cls.user)
+        TaskAssignment.objects.create(task=task, assigned_to=User.objects.create_user(username='bob'))
+
+    def test_walk_forward_and_back(self):
+        paginator = KeysetPaginator(Task.objects.all(), 10, TaskListView.cursor_ordering)
+        forward, page = [], paginator.page()
+        pages = [page]
+        while True:
+            forward.extend(page.object_list)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+
+        expected = sorted(
+            Task.objects.all(),
+            key=lambda t: (-t.priority, t.due_date is None, t.due_date or timezone.now(), t.id),
+        )
+        self.assertEqual(forward, expected)
+        self.assertFalse(pages[0].has_previous())
+
+        backward = []
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward = page.object_list + backward
+        self.assertEqual(backward, forward[:len(backward)])
+        self.assertEqual(len(backward), 40)
+
+    def test_task_list_view_pages_without_count(self):
+        self.client.force_login(self.user)
+        seen = []
+        url = reverse('task-list') + '?status=todo'
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            # Django's paginator would COUNT(*) over the DISTINCT assignment join.
+            self.assertFalse(any('COUNT(' in q['sql'] and 'DISTINCT' in q['sql'] for q in queries.captured_queries))
+            seen.extend(response.context['object_list'])
+            page = response.context['page_obj']
+            url = reverse('task-list') + f'?status=todo&cursor={page.next_cursor}' if page.has_next() else None
+        self.assertEqual(len(seen), 47)
+        self.assertEqual(len(set(seen)), 47)
+
+    def test_invalid_cursor_is_404(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('task-list') + '?cursor=garbage').status_code, 404)
+
+
+class DashboardCacheTests(TestCase):
+    """The dashboard is served from cache until a relevant change invalidates it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice')
+        cls.bob = User.objects.create_user(username='bob')
+        cls.team = Team.objects.create(name='Team', owner=cls.alice)
+        cls.team.members.add(cls.alice, cls.bob)
+        cls.project = Project.objects.create(name='Project', team=cls.team, owner=cls.alice)
+        cls.task = Task.objects.create(title='Task', project=cls.project)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.alice)
+
+    def get_dashboard(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        return response, len(queries)
+
+    def assertRebuilt(self, change):
+        self.get_dashboard()
+        change()
+        response, rebuilt = self.get_dashboard()
+        _, cached = self.get_dashboard()
+        self.assertGreater(rebuilt, cached)
+        return response
+
+    def test_second_load_is_cached(self):
+        _, first = self.get_dashboard()
+        _, second = self.get_dashboard()
+        self.assertLess(second, first)
+
+    def test_assignment_invalidates_assignee(self):
+        response = self.assertRebuilt(lambda: TaskAssignment.objects.create(task=self.task, assigned_to=self.alice))
+        self.assertEqual(response.context['task_stats']['total'], 1)
+
+    def test_task_bulk_update_invalidates_team_members(self):
+        TaskAssignment.objects.create(task=self.task, assigned_to=self.alice)
+        response = self.assertRebuilt(lambda: Task.objects.filter(pk=self.task.pk).update(status='in_progress'))
+        self.assertEqual(response.context['task_stats']['in_progress'], 1)
+
+    def test_membership_change_invalidates_other_members(self):
+        carol = User.objects.create_user(username='carol')
+        response = self.assertRebuilt(lambda: self.team.members.add(carol))
+        self.assertEqual(response.context['my_teams'][0].member_count, 3)
+
+    def test_project_rename_invalidates_members(self):
+        def rename():
+            self.project.name = 'Renamed'
+            self.project.save()
+        response = self.assertRebuilt(rename)
+        self.assertEqual(response.context['my_projects'][0].name, 'Renamed')
+
+
+class TaskStatsTests(TestCase):
+    """Task statistics come from one conditional-aggregate query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=user)
+        cls.other = Project.objects.create(name='Other', team=team, owner=user)
+        past, future = timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1)
+        Task.objects.bulk_create([
+            Task(title='Late', project=cls.project, due_date=past),
+            Task(title='Undated', project=cls.project),
+            Task(title='Started', project=cls.project, status='in_progress', due_date=future),
+            # Done after its due date, so no longer overdue.
+            Task(title='Done late', project=cls.project, status='completed', due_date=past),
+            Task(title='Done', project=cls.project, status='completed'),
+            Task(title='Other late', project=cls.other, due_date=past),
+        ])
+
+    def test_stats(self):
+        with self.assertNumQueries(1):
+            stats = Task.objects.filter(project=self.project).stats()
+        self.assertEqual(stats, {'total': 5, 'todo': 2, 'in_progress': 1, 'completed': 2, 'overdue': 1,
+                                 'progress': 40})
+        self.assertEqual(Task.objects.filter(title='Nothing').stats()['progress'], 0)
+
+    def test_stats_by_project(self):
+        with self.assertNumQueries(1):
+            stats = Task.objects.all().stats_by_project()
+        self.assertEqual(stats[self.project.pk],
+                         {'total': 5, 'todo': 2, 'in_progress': 1, 'completed': 2, 'overdue': 1})
+        self.assertEqual(stats[self.other.pk], {'total': 1, 'todo': 1, 'in_progress': 0, 'completed': 0, 'overdue': 1})
+
+
+class ProjectCounterTests(TestCase):
+    """Task writes of every kind keep the denormalized project counters current."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        cls.other = Project.objects.create(name='Other', team=team, owner=cls.user)
+
+    def assertCounters(self, project, total, todo=0, in_progress=0, completed=0, overdue=0):
+        project.refresh_from_db()
+        self.assertEqual(tuple(getattr(project, field) for field in Project.TASK_COUNTER_FIELDS),
+                         (total, todo, in_progress, completed, overdue))
+
+    def test_create_edit_move_delete(self):
+        task = Task.objects.create(title='Task', project=self.project, due_date=timezone.now() - timedelta(days=1))
+        self.assertCounters(self.project, 1, todo=1, overdue=1)
+        task.status = 'completed'
+        task.save()
+        self.assertCounters(self.project, 1, completed=1)
+        task.project = self.other
+        task.save()
+        self.assertCounters(self.project, 0)
+        self.assertCounters(self.other, 1, completed=1)
+        task.delete()
+        self.assertCounters(self.other, 0)
+
+    def test_bulk_operations(self):
+        tasks = Task.objects.bulk_create([Task(title=f'Task {i}', project=self.project) for i in range(4)])
+        self.assertCounters(self.project, 4, todo=4)
+        Task.objects.filter(pk__in=[task.pk for task in tasks[:2]]).update(status='in_progress')
+        self.assertCounters(self.project, 4, todo=2, in_progress=2)
+        for task in tasks[2:]:
+            task.project = self.other
+        Task.objects.bulk_update(tasks[2:], ['project'])
+        self.assertCounters(self.project, 2, in_progress=2)
+        self.assertCounters(self.other, 2, todo=2)
+        Task.objects.filter(project=self.other).delete()
+        self.assertCounters(self.other, 0)
+
+    def test_cascading_deletes_refresh_once(self):
+        def delete_team(task_count):
+            owner = User.objects.create_user(username=f'owner-{task_count}')
+            team = Team.objects.create(name='Doomed', owner=owner)
+            project = Project.objects.create(name='Doomed', team=team, owner=owner)
+            Task.objects.bulk_create([Task(title=f'Task {i}', project=project) for i in range(task_count)])
+            with CaptureQueriesContext(connection) as queries:
+                team.delete()
+            return len(queries)
+
+        self.assertEqual(delete_team(2), delete_team(20))
+
+        # The tasks a deleted user created stay, and so do their projects' counts.
+        creator = User.objects.create_user(username='creator')
+        Task.objects.create(title='Task', project=self.project, created_by=creator)
+        creator.delete()
+        self.assertCounters(self.project, 1, todo=1)
+
+    def test_rebuild_task_counters(self):
+        Task.objects.bulk_create([Task(title=f'Task {i}', project=self.project) for i in range(2)])
+        Project.objects.filter(pk=self.project.pk).update(task_count=0, todo_count=7)
+        call_command('rebuild_task_counters', stdout=io.StringIO())
+        self.assertCounters(self.project, 2, todo=2)
+
+
+class AssignedToTests(TestCase):
+
+    def test_assigned_to_matches_distinct_join_without_distinct(self):
+        alice = User.objects.create_user(username='alice')
+        bob = User.objects.create_user(username='bob')
+        team = Team.objects.create(name='Team', owner=alice)
+        project = Project.objects.create(name='Project', team=team, owner=alice)
+        for i in range(5):
+            task = Task.objects.create(title=f'Task {i}', project=project)
+            TaskAssignment.objects.create(task=task, assigned_to=alice)
+            if i % 2:
+                TaskAssignment.objects.create(task=task, assigned_to=bob)
+        Task.objects.create(title='Unassigned', project=project)
+
+        queryset = Task.objects.assigned_to(alice)
+        self.assertNotIn('DISTINCT', str(queryset.query))
+        self.assertEqual(
+            set(queryset), set(Task.objects.filter(assignments__assigned_to=alice).distinct())
+        )
+        self.assertEqual(queryset.count(), 5)
+        self.assertEqual(Task.objects.assigned_to(bob).count(), 2)
+        self.assertEqual(Task.objects.assigned_to(bob, aggregate=True).count(), 2)
+
+
+class TaskImportExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        cls.other = Project.objects.create(name='Other', team=team, owner=cls.user)
+
+    def test_failed_batch_can_be_resumed(self):
+        rows = [{'title': f'Task {i}', 'project': str(self.project.pk), 'created_by': 'alice'} for i in range(10)]
+        rows[7]['status'] = 'bogus'
+        with tempfile.TemporaryDirectory() as tmp:
+            checkpoint = Path(tmp) / 'import.checkpoint'
+            with self.assertRaises(task_io.RowError):
+                task_io.TaskImporter(batch_size=3, checkpoint=checkpoint).run(iter(rows))
+            self.assertEqual(Task.objects.count(), 6)
+
+            rows[7]['status'] = 'in_progress'
+            importer = task_io.TaskImporter(batch_size=3, checkpoint=checkpoint)
+            self.assertEqual(importer.run(iter(rows), resume=True), 10)
+            self.assertEqual((importer.skipped, importer.created), (6, 4))
+            self.assertFalse(checkpoint.exists())
+
+        self.project.refresh_from_db()
+        self.assertEqual((self.project.task_count, self.project.in_progress_count), (10, 1))
+
+    def test_bad_json_rows_are_row_errors(self):
+        good = json.dumps({'title': 'Fine', 'project': self.project.pk})
+        for bad in ('{"title": "Cut off', '["Not", "an", "object"]', json.dumps({'title': 5, 'project': 1}),
+                    json.dumps({'title': 'Task', 'project': 1, 'due_date': 20250101})):
+            with self.subTest(bad=bad):
+                rows = task_io.read_rows(io.StringIO(f'{good}\n{bad}\n'), 'jsonl')
+                with self.assertRaises(task_io.RowError) as raised:
+                    task_io.TaskImporter(batch_size=1).run(rows)
+                self.assertEqual(raised.exception.line, 2)
+
+    def test_export_round_trip_updates_existing_tasks(self):
+        task = Task.objects.create(title='Old', project=self.project, created_by=self.user)
+        out = io.StringIO()
+        task_io.write_rows(out, 'jsonl', task_io.export_rows(Task.objects.all()))
+        row = json.loads(out.getvalue())
+        row.update(title='New', project=self.other.pk)
+
+        importer = task_io.TaskImporter()
+        importer.run(task_io.read_rows(io.StringIO(json.dumps(row) + '\n'), 'jsonl'))
+        task.refresh_from_db()
+        self.assertEqual((task.title, task.project_id, importer.updated), ('New', self.other.pk, 1))
+        self.project.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.project.task_count, self.other.task_count), (0, 1))
+
+
+class BulkTaskActionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice')
+        cls.bob = User.objects.create_user(username='bob')
+        cls.outsider = User.objects.create_user(username='outsider')
+        team = Team.objects.create(name='Team', owner=cls.alice)
+        team.members.add(cls.alice, cls.bob)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.alice)
+        cls.due = timezone.now()
+        cls.tasks = [
+            Task.objects.create(title=f'Task {i}', project=cls.project, due_date=cls.due if i else None)
+            for i in range(3)
+        ]
+        other_team = Team.objects.create(name='Other', owner=cls.outsider)
+        other_team.members.add(cls.outsider)
+        cls.foreign_task = Task.objects.create(
+            title='Foreign', project=Project.objects.create(name='Other', team=other_team, owner=cls.outsider)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.alice)
+
+    def post(self, task_ids, **data):
+        return self.client.post(reverse('task-bulk-action'), {'task_ids': [t.pk for t in task_ids], **data})
+
+    def test_set_status(self):
+        self.post(self.tasks, action='status', status='completed')
+        self.assertEqual(Task.objects.filter(project=self.project, status='completed').count(), 3)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.get_progress(), 100)
+
+    def test_shift_due_skips_tasks_without_due_date(self):
+        self.post(self.tasks, action='shift_due', days=2)
+        self.assertIsNone(Task.objects.get(pk=self.tasks[0].pk).due_date)
+        self.assertEqual(Task.objects.get(pk=self.tasks[1].pk).due_date, self.due + timedelta(days=2))
+
+    def test_assign_is_idempotent(self):
+        TaskAssignment.objects.create(task=self.tasks[0], assigned_to=self.bob)
+        self.post(self.tasks, action='assign', assigned_to=self.bob.pk)
+        self.assertEqual(TaskAssignment.objects.filter(assigned_to=self.bob).count(), 3)
+
+    def test_assign_rejects_non_member(self):
+        self.post(self.tasks, action='assign', assigned_to=self.outsider.pk)
+        self.assertFalse(TaskAssignment.objects.exists())
+
+    def test_selection_with_foreign_task_changes_nothing(self):
+        cache.clear()
+        with self.assertNumQueries(4):  # session, user, memberships, the selection's projects
+            self.post(self.tasks + [self.foreign_task], action='delete')
+        with self.assertNumQueries(3):  # the memberships are cached
+            self.post(self.tasks + [self.foreign_task], action='delete')
+        self.assertEqual(Task.objects.count(), 4)
+
+    def test_delete(self):
+        self.post(self.tasks[:2], action='delete')
+        self.assertEqual(Task.objects.filter(project=self.project).count(), 1)
+
+    def test_same_rule_as_single_task_edits(self):
+        # Creators may still edit their tasks after leaving the team, as in TaskUpdateView.
+        own = Task.objects.create(title='Own', project=self.foreign_task.project, created_by=self.alice)
+        self.assertEqual(self.client.get(reverse('task-update', args=[own.pk])).status_code, 200)
+        self.post([own], action='priority', priority=4)
+        own.refresh_from_db()
+        self.assertEqual(own.priority, 4)
+
+        self.client.force_login(self.bob)
+        self.assertEqual(self.client.get(reverse('task-update', args=[own.pk])).status_code, 404)
+        self.post([own], action='delete')
+        self.assertTrue(Task.objects.filter(pk=own.pk).exists())
+
+
+class AsyncViewTests(TransactionTestCase):
+    """The async views render the same pages with their queries fanned out or run in turn."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=self.user)
+        team.members.add(self.user)
+        self.project = Project.objects.create(name='Project', team=team, owner=self.user)
+        self.task = Task.objects.create(title='Task', project=self.project, created_by=self.user)
+        Comment.objects.create(task=self.task, author=self.user, content='First comment')
+        TaskAssignment.objects.create(task=self.task, assigned_to=self.user)
+        self.client.force_login(self.user)
+
+    def worker_threads(self):
+        return set(async_to_sync(gather_queries)(threading.get_ident, threading.get_ident))
+
+    def assert_pages_render(self):
+        response = self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.assertContains(response, 'First comment')
+        self.assertTrue(response.context['can_edit'])
+        response = self.client.get(reverse('project-detail', args=[self.project.pk]))
+        self.assertEqual(response.context['total_tasks'], 1)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['task_stats']['total'], 1)
+
+    @override_settings(ASYNC_QUERY_FANOUT=False)
+    def test_sequential(self):
+        self.assertEqual(self.worker_threads(), {threading.get_ident()})
+        self.assert_pages_render()
+
+    @override_settings(ASYNC_QUERY_FANOUT=True)
+    def test_fanout(self):
+        self.assertNotIn(threading.get_ident(), self.worker_threads())
+        self.assert_pages_render()
+
+    def test_anonymous_redirects_to_login(self):
+        self.client.logout()
+        response = self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.assertRedirects(response, f"{reverse('login')}?next={reverse('task-detail', args=[self.task.pk])}",
+                             fetch_redirect_response=False)
+
+
+class SearchTests(TestCase):
+    """The full-text index follows task and comment writes and ranks title matches first."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='alice', password='password')
+        cls.outsider = User.objects.create_user(username='outsider')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        team.members.add(cls.user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        cls.by_title = Task.objects.create(title='Login bug', project=cls.project)
+        cls.by_comment = Task.objects.create(title='Other', description='Unrelated', project=cls.project)
+        cls.comment = Comment.objects.create(task=cls.by_comment, author=cls.user, content='Seen on the <b>login</b> page')
+        other_team = Team.objects.create(name='Other', owner=cls.outsider)
+        Task.objects.create(title='Login elsewhere', project=Project.objects.create(
+            name='Other', team=other_team, owner=cls.outsider))
+
+    def test_ranked_and_scoped_to_user_teams(self):
+        results = search.search_tasks('logi', self.user)
+        self.assertEqual(results, [self.by_title, self.by_comment])
+        self.assertEqual(str(results[1].snippet), 'Seen on the &lt;b&gt;<mark>login</mark>&lt;/b&gt; page')
+        self.assertEqual(search.search_tasks('login', self.outsider), [])
+
+    def test_index_follows_writes(self):
+        self.comment.content = 'Rewritten'
+        self.comment.save()
+        self.assertEqual(search.search_tasks('login', self.user), [self.by_title])
+        Task.objects.filter(pk=self.by_comment.pk).update(title='Login form')
+        self.assertEqual(len(search.search_tasks('login', self.user)), 2)
+        self.by_title.delete()
+        self.assertEqual(search.search_tasks('bug', self.user), [])
+        Comment.objects.bulk_create([Comment(task=self.by_comment, author=self.user, content='Crash on startup')
+                                     for _ in range(2)])
+        self.assertEqual(search.search_tasks('crash', self.user), [self.by_comment])
+
+    def test_search_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('task-search'), {'q': 'login'})
+        self.assertEqual(list(response.context['results']), [self.by_title, self.by_comment])
+
+    def test_admin_search(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('admin:tasks_comment_changelist'), {'q': 'login'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.comment])
+        response = self.client.get(reverse('admin:tasks_task_changelist'), {'q': 'unrelated'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.by_comment])
+
+
+class LiveUpdateTests(TransactionTestCase):
+    """Task, comment and assignment writes reach subscribed event streams once committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=self.user)
+        team.members.add(self.user)
+        self.project = Project.objects.create(name='Project', team=team, owner=self.user)
+        self.task = Task.objects.create(title='Task', project=self.project)
+
+    async def read_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), 5)
+        lines = dict(line.split(': ', 1) for line in chunk.decode().strip().splitlines())
+        return lines['event'], json.loads(lines['data'])
+
+    async def test_stream_pushes_comments_and_stats(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('task-events', args=[self.task.pk]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(stream), f'retry: {live.RETRY_MS}\n\n'.encode())
+
+            await sync_to_async(Comment.objects.create)(task=self.task, author=self.user, content='Hello <there>')
+            name, data = await self.read_event(stream)
+            self.assertEqual((name, data['content'], data['author']), ('comment', 'Hello <there>', 'alice'))
+
+            async with live.get_broker().subscribe([live.project_channel(self.project.pk)]) as board:
+                self.task.status = 'completed'
+                await sync_to_async(self.task.save)()
+                self.assertEqual((await self.read_event(stream))[0], 'task')
+                events = dict([(await board.get())[1:] for _ in range(2)])
+        finally:
+            await stream.aclose()
+        self.assertEqual(events['task']['status'], 'completed')
+        self.assertEqual(events['stats'], {'id': self.project.pk, 'total': 1, 'todo': 0, 'in_progress': 0,
+                                           'completed': 1, 'overdue': 0, 'progress': 100})
+
+    def test_requires_team_membership_and_asgi(self):
+        self.client.force_login(User.objects.create_user(username='outsider'))
+        self.assertEqual(self.client.get(reverse('task-events', args=[self.task.pk])).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('project-events', args=[self.project.pk])).status_code, 204)
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        broker = live.InProcessBroker()
+        async with broker.subscribe(['channel'], maxsize=2) as subscription:
+            for i in range(3):
+                broker.publish('channel', 'task', {'id': i})
+            await asyncio.sleep(0)
+            self.assertEqual((await subscription.get())[1], 'resync')
+        self.assertFalse(broker.has_subscribers('channel'))
+
+    async def test_closing_the_stream_unsubscribes(self):
+        stream = live.event_stream(['channel'])
+        await anext(stream)
+        self.assertTrue(live.has_subscribers('channel'))
+        await stream.aclose()
+        self.assertFalse(live.has_subscribers('channel'))
+
+
+class ApiTests(TestCase):
+    """The JSON API selects fields, expands relations in batches, validates ETags and scopes rows to teams."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice', password='password')
+        cls.outsider = User.objects.create_user(username='outsider')
+        cls.team = Team.objects.create(name='Team', owner=cls.user)
+        cls.team.members.add(cls.user)
+        cls.project = Project.objects.create(name='Project', team=cls.team, owner=cls.user)
+        cls.task = Task.objects.create(title='First', project=cls.project, created_by=cls.user)
+        Comment.objects.create(task=cls.task, author=cls.user, content='Hello')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_sparse_fields_and_expansion(self):
+        response = self.client.get(reverse('api-tasks-detail', args=[self.task.pk]),
+                                   {'fields': 'title,project.name,comments.content', 'expand': 'project,comments'})
+        self.assertEqual(response.json(), {
+            'id': self.task.pk, 'title': 'First', 'project': {'id': self.project.pk, 'name': 'Project'},
+            'comments': [{'id': self.task.comments.get().pk, 'content': 'Hello'}],
+        })
+        self.assertEqual(self.client.get(reverse('api-tasks-list'), {'fields': 'secret'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api-tasks-list'), {'expand': 'team'}).status_code, 400)
+
+    def test_expansion_queries_do_not_grow_with_rows(self):
+        url = reverse('api-tasks-list')
+        params = {'expand': 'project.team,created_by,comments.author,assignments'}
+
+        def count():
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.get(url, params).status_code, 200)
+            return len(queries)
+
+        few = count()
+        for i in range(5):
+            task = Task.objects.create(title=f'Task {i}', project=self.project, created_by=self.user)
+            Comment.objects.create(task=task, author=self.user, content='More')
+            TaskAssignment.objects.create(task=task, assigned_to=self.user)
+        self.assertEqual(count(), few)
+
+    def test_conditional_get(self):
+        url = reverse('api-projects-list')
+        response = self.client.get(url, {'expand': 'tasks'})
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, {'expand': 'tasks'}, headers={'If-None-Match': etag}).status_code, 304)
+        # A change to an embedded row, or to the field selection, changes the ETag.
+        self.assertNotEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        Task.objects.filter(pk=self.task.pk).update(title='Renamed', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, {'expand': 'tasks'}, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_create_update_delete(self):
+        response = self.client.post(reverse('api-tasks-list'), {'title': 'New', 'project': self.project.pk},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        task = Task.objects.get(pk=response.json()['id'])
+        self.assertEqual((task.created_by, response['Location']), (self.user, reverse('api-tasks-detail', args=[task.pk])))
+
+        url = reverse('api-tasks-detail', args=[task.pk])
+        etag = response['ETag']
+        response = self.client.patch(url, {'status': 'completed'}, content_type='application/json',
+                                     headers={'If-Match': etag})
+        self.assertEqual((response.status_code, response.json()['title']), (200, 'New'))
+        self.assertEqual(Task.objects.get(pk=task.pk).status, 'completed')
+        # The stale ETag no longer matches.
+        self.assertEqual(self.client.delete(url, headers={'If-Match': etag}).status_code, 412)
+        self.assertEqual(self.client.patch(url, {'priority': 9}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Task.objects.filter(pk=task.pk).exists())
+
+    def test_only_owners_change_teams_and_projects(self):
+        member = User.objects.create_user(username='bob')
+        self.team.members.add(member)
+        self.client.force_login(member)
+        team_url = reverse('api-teams-detail', args=[self.team.pk])
+        project_url = reverse('api-projects-detail', args=[self.project.pk])
+        self.assertEqual(self.client.get(team_url).status_code, 200)
+        self.assertEqual(self.client.patch(team_url, {'name': 'Mine'}, content_type='application/json').status_code,
+                         403)
+        self.assertEqual(self.client.delete(team_url).status_code, 403)
+        self.assertEqual(self.client.delete(project_url).status_code, 403)
+        self.assertTrue(Project.objects.filter(pk=self.project.pk).exists())
+
+        self.client.force_login(self.user)
+        response = self.client.patch(project_url, {'name': 'Renamed'}, content_type='application/json')
+        self.assertEqual(response.json()['name'], 'Renamed')
+        self.assertEqual(self.client.delete(team_url).status_code, 204)
+        self.assertFalse(Project.objects.filter(pk=self.project.pk).exists())
+
+    def test_only_authors_change_comments(self):
+        member = User.objects.create_user(username='bob')
+        self.team.members.add(member)
+        comment = self.task.comments.get()
+        url = reverse('api-comments-detail', args=[comment.pk])
+        self.client.force_login(member)
+        response = self.client.patch(url, {'content': 'bob rewrote'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+        comment.refresh_from_db()
+        self.assertEqual(comment.content, 'Hello')
+
+        self.client.force_login(self.user)
+        response = self.client.patch(url, {'content': 'Edited'}, content_type='application/json')
+        self.assertEqual(response.json()['content'], 'Edited')
+
+    def test_assignments_change_like_complete_assignment(self):
+        assignee, member = User.objects.create_user(username='bob'), User.objects.create_user(username='carol')
+        self.team.members.add(assignee, member)
+        assignment = TaskAssignment.objects.create(task=self.task, assigned_to=assignee, assigned_by=self.user)
+        url = reverse('api-assignments-detail', args=[assignment.pk])
+
+        self.client.force_login(member)
+        response = self.client.patch(url, {'is_completed': True}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.delete(url).status_code, 403)
+
+        # The assignee completes it; the task and assignee cannot be changed.
+        self.client.force_login(assignee)
+        response = self.client.patch(url, {'is_completed': True, 'assigned_to': member.pk},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        assignment.refresh_from_db()
+        self.assertEqual(assignment.assigned_to, assignee)
+        self.assertTrue(assignment.is_completed)
+        self.assertIsNotNone(assignment.completed_at)
+
+        # So can the task's creator reopen it.
+        self.client.force_login(self.user)
+        response = self.client.patch(url, {'is_completed': False}, content_type='application/json')
+        self.assertIsNone(response.json()['completed_at'])
+
+    def test_scoped_to_user_teams(self):
+        other = Project.objects.create(name='Other', team=Team.objects.create(name='Other', owner=self.outsider),
+                                       owner=self.outsider)
+        self.assertEqual(self.client.get(reverse('api-projects-detail', args=[other.pk])).status_code, 404)
+        self.assertEqual([row['id'] for row in self.client.get(reverse('api-projects-list')).json()['results']],
+                         [self.project.pk])
+        response = self.client.post(reverse('api-tasks-list'), {'title': 'Sneaky', 'project': other.pk},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api-tasks-list')).status_code, 401)
+
+
+class ActivityLogTests(TestCase):
+    """Task, assignment and comment changes append batched events that survive archiving."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.bob = User.objects.create_user(username='bob')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        team.members.add(cls.user, cls.bob)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        cls.tasks = [Task.objects.create(title=f'Task {i}', project=cls.project) for i in range(3)]
+
+    def events(self, **filters):
+        return list(TaskEvent.objects.filter(**filters).order_by('id').values_list('kind', 'task_id', 'data'))
+
+    def test_records_changes_with_old_and_new_values(self):
+        task = Task.objects.get(pk=self.tasks[0].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = 'in_progress'
+            task.save()
+            assignment = TaskAssignment.objects.create(task=task, assigned_to=self.bob, assigned_by=self.user)
+            assignment.is_completed = True
+            assignment.save()
+            Comment.objects.create(task=task, author=self.bob, content='Done')
+        self.assertEqual([kind for kind, *_ in self.events(task=task)], [
+            TaskEvent.TASK_UPDATED, TaskEvent.ASSIGNED, TaskEvent.ASSIGNMENT_COMPLETED, TaskEvent.COMMENT_ADDED,
+        ])
+        updated = TaskEvent.objects.get(kind=TaskEvent.TASK_UPDATED)
+        self.assertEqual((updated.data, updated.project_id), ({'changes': {'status': ['todo', 'in_progress']}},
+                                                              self.project.pk))
+
+    def test_bulk_action_writes_its_events_in_one_insert(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('task-bulk-action'),
+                             {'task_ids': [t.pk for t in self.tasks], 'action': 'status', 'status': 'completed'})
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith(f'INSERT INTO "{TaskEvent._meta.db_table}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(TaskEvent.objects.filter(kind=TaskEvent.TASK_UPDATED, actor=self.user).count(), 3)
+
+    def test_rolled_back_changes_are_not_recorded(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                Task.objects.filter(pk=self.tasks[0].pk).update(priority=4)
+                raise ValueError
+        self.assertFalse(TaskEvent.objects.exists())
+
+    def test_archive_keeps_events_readable(self):
+        now = timezone.now()
+        old = TaskEvent.objects.create(kind=TaskEvent.TASK_CREATED, task=self.tasks[0], project=self.project,
+                                       created_at=now - timedelta(days=400))
+        recent = TaskEvent.objects.create(kind=TaskEvent.TASK_DELETED, task=self.tasks[0], project=self.project,
+                                          created_at=now)
+        with tempfile.TemporaryDirectory() as directory:
+            out = io.StringIO()
+            call_command('archive_task_events', days=30, dir=directory, stdout=out)
+            self.assertIn('Archived 1 events', out.getvalue())
+            self.assertEqual(list(TaskEvent.objects.all()), [recent])
+            history = list(activity.history(task=self.tasks[0].pk, directory=directory))
+            self.assertEqual([(row['id'], row['created_at']) for row in history],
+                             [(old.pk, old.created_at), (recent.pk, recent.created_at)])
+            self.assertEqual(list(activity.history(project=self.project.pk, since=now - timedelta(days=1),
+                                                   directory=directory)), history[1:])
+
+    def test_archive_moves_events_in_batches(self):
+        created_at = timezone.now() - timedelta(days=400)
+        events = [TaskEvent.objects.create(kind=TaskEvent.TASK_UPDATED, task=self.tasks[0], project=self.project,
+                                           created_at=created_at + timedelta(seconds=n)) for n in range(5)]
+        with tempfile.TemporaryDirectory() as directory:
+            with CaptureQueriesContext(connection) as queries:
+                activity.archive(timezone.now(), directory, batch_size=2)
+            deletes = [q for q in queries.captured_queries if q['sql'].startswith('DELETE')]
+            self.assertEqual(len(deletes), 3)
+            self.assertFalse(TaskEvent.objects.exists())
+
+            # A run interrupted between writing a batch and deleting it archives the batch again.
+            created = timezone.localtime(created_at)
+            with gzip.open(activity.archive_path((created.year, created.month), directory), 'at') as handle:
+                handle.write(json.dumps(activity.to_json(events[0]), cls=DjangoJSONEncoder) + '\n')
+            self.assertEqual([row['id'] for row in activity.history(task=self.tasks[0].pk, directory=directory)],
+                             [event.pk for event in events])
+
+
+class BurndownTests(TestCase):
+    """Daily snapshots follow task writes and serve burndown series from at most one row per day."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        team.members.add(cls.user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_task_writes_update_todays_snapshot(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(title='Task', project=self.project)
+            Task.objects.create(title='Done already', project=self.project, status='completed')
+        with self.captureOnCommitCallbacks(execute=True):
+            task.status = 'completed'
+            task.save()
+        snapshot = ProjectSnapshot.objects.get(project=self.project, date=timezone.localdate())
+        self.assertEqual((snapshot.task_count, snapshot.todo_count, snapshot.completed_count, snapshot.completions),
+                         (2, 0, 2, 2))
+
+    def test_series_carries_counters_over_days_without_snapshots(self):
+        today = timezone.localdate()
+        ProjectSnapshot.objects.create(project=self.project, date=today - timedelta(days=10), task_count=4,
+                                       todo_count=4)
+        ProjectSnapshot.objects.create(project=self.project, date=today - timedelta(days=1), task_count=4,
+                                       todo_count=1, completed_count=3, completions=3)
+        with self.assertNumQueries(2):
+            series = burndown.series(self.project.pk, days=3, today=today)
+        self.assertEqual(series['open'], [4, 1, 1])
+        self.assertEqual(series['completions'], [0, 3, 0])
+        with self.assertNumQueries(1):
+            burndown.series(self.project.pk, days=2, today=today)
+
+    def test_chart_endpoint(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('project-burndown', args=[self.project.pk]), {'days': 1000})
+        self.assertEqual(len(response.json()['dates']), burndown.MAX_DAYS)
+        self.client.force_login(User.objects.create_user(username='outsider'))
+        self.assertEqual(self.client.get(reverse('project-burndown', args=[self.project.pk])).status_code, 404)
+
+    def test_deleting_owners_of_tasks(self):
+        def project_with_tasks(name):
+            owner = User.objects.create_user(username=f'{name}-owner')
+            team = Team.objects.create(name=name, owner=owner)
+            project = Project.objects.create(name=name, team=team, owner=owner)
+            Task.objects.bulk_create([Task(title=f'Task {i}', project=project) for i in range(3)])
+            return project
+
+        deletions = {
+            'project': lambda project: project.delete(),
+            'team': lambda project: project.team.delete(),
+            'owner': lambda project: project.owner.delete(),
+        }
+        for name, delete in deletions.items():
+            project = project_with_tasks(name)
+            self.assertTrue(ProjectSnapshot.objects.filter(project=project).exists())
+            delete(project)
+            # The foreign keys are only checked at commit otherwise.
+            connection.check_constraints()
+            self.assertFalse(Project.objects.filter(pk=project.pk).exists())
+            self.assertFalse(ProjectSnapshot.objects.filter(project_id=project.pk).exists())
+
+    def test_command_snapshots_untouched_projects_and_recounts(self):
+        TaskEvent.objects.create(kind=TaskEvent.TASK_UPDATED, project=self.project,
+                                 data={'changes': {'status': ['todo', 'completed']}})
+        call_command('snapshot_projects', recount_days=1, stdout=io.StringIO())
+        snapshot = ProjectSnapshot.objects.get(project=self.project)
+        self.assertEqual((snapshot.date, snapshot.completions), (timezone.localdate(), 1))
+        out = io.StringIO()
+        call_command('snapshot_projects', stdout=out)
+        self.assertIn('Snapshotted 0 project(s)', out.getvalue())
+
+
+class OverdueSweepTests(TestCase):
+    """The sweeper marks tasks as they become overdue, writes clear the mark, assignees get one digest."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner')
+        cls.assignee = User.objects.create_user(username='assignee', email='assignee@example.com')
+        team = Team.objects.create(name='Team', owner=cls.owner)
+        team.members.add(cls.owner, cls.assignee)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.owner)
+
+    def create_tasks(self, count, due_in, **kwargs):
+        due_date = timezone.now() + due_in
+        return Task.objects.bulk_create([
+            Task(title=f'Task {n}', project=self.project, due_date=due_date, **kwargs) for n in range(count)
+        ])
+
+    def test_sweep_marks_open_past_due_tasks_in_batches(self):
+        late = self.create_tasks(5, timedelta(hours=-1))
+        self.create_tasks(2, timedelta(hours=-1), status='completed')
+        self.create_tasks(2, timedelta(hours=1))
+        Project.objects.filter(pk=self.project.pk).update(overdue_count=0)
+        now = timezone.now()
+        self.assertEqual(overdue.sweep(now, batch_size=2), 5)
+        self.assertEqual(set(Task.objects.filter(overdue_since=now).values_list('pk', flat=True)),
+                         {task.pk for task in late})
+        self.assertEqual(overdue.sweep(batch_size=2), 0)
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.overdue_count, 5)
+
+    def test_writes_clear_the_mark_once_no_longer_overdue(self):
+        first, second, third = self.create_tasks(3, timedelta(hours=-1))
+        overdue.sweep()
+        first.refresh_from_db()
+        first.status = 'completed'
+        first.save(update_fields=['status'])
+        self.assertIsNone(Task.objects.get(pk=first.pk).overdue_since)
+
+        # Shifting due dates by an expression is decided row by row in SQL.
+        Task.objects.filter(pk=second.pk).update(due_date=F('due_date') + timedelta(days=1))
+        Task.objects.filter(pk=third.pk).update(due_date=F('due_date') - timedelta(days=1))
+        self.assertIsNone(Task.objects.get(pk=second.pk).overdue_since)
+        self.assertIsNotNone(Task.objects.get(pk=third.pk).overdue_since)
+
+        Task.objects.filter(pk=third.pk).update(priority=4)
+        self.assertIsNotNone(Task.objects.get(pk=third.pk).overdue_since)
+        Task.objects.bulk_update([Task(pk=third.pk, status='completed')], ['status'])
+        self.assertIsNone(Task.objects.get(pk=third.pk).overdue_since)
+
+    def test_one_digest_per_assignee(self):
+        tasks = self.create_tasks(overdue.DIGEST_TASKS + 2, timedelta(hours=-1))
+        TaskAssignment.objects.bulk_create([TaskAssignment(task=task, assigned_to=self.assignee) for task in tasks])
+        TaskAssignment.objects.create(task=tasks[0], assigned_to=self.owner)
+        Job.objects.all().delete()
+        now = timezone.now()
+        overdue.sweep(now)
+        self.assertEqual(overdue.queue_reminders(now), 2)
+        job = Job.objects.get(kwargs__assigned_to=self.assignee.pk)
+        self.assertEqual((len(job.kwargs['task_ids']), job.kwargs['total']),
+                         (overdue.DIGEST_TASKS, overdue.DIGEST_TASKS + 2))
+        jobs.run_pending()
+        self.assertEqual(mail.outbox[0].subject, f"{overdue.DIGEST_TASKS + 2} of your tasks are overdue")
+        self.assertIn('and 2 more', mail.outbox[0].body)
+
+    def test_overdue_task_list(self):
+        late, _ = self.create_tasks(2, timedelta(hours=-1))
+        TaskAssignment.objects.create(task=late, assigned_to=self.assignee)
+        call_command('sweep_overdue', stdout=io.StringIO())
+        self.client.force_login(self.assignee)
+        response = self.client.get(reverse('task-list'), {'overdue': 1})
+        self.assertEqual([task.pk for task in response.context['tasks']], [late.pk])
+
+
+@jobs.background(queue='test', max_attempts=2)
+def failing_job(message):
+    raise RuntimeError(message)
+
+
+class JobQueueTests(TestCase):
+    """Notifications and recomputation run as queued jobs, retried with backoff."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='owner')
+        cls.assignee = User.objects.create_user(username='assignee', email='assignee@example.com')
+        team = Team.objects.create(name='Team', owner=cls.owner)
+        team.members.add(cls.owner, cls.assignee)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.owner)
+        cls.task = Task.objects.create(title='Task', project=cls.project, created_by=cls.owner)
+
+    def test_assignment_notifies_the_assignee_from_a_job(self):
+        TaskAssignment.objects.create(task=self.task, assigned_to=self.assignee, assigned_by=self.owner)
+        job = Job.objects.get()
+        self.assertEqual((job.queue, job.kwargs['task_ids']), ('notifications', [self.task.pk]))
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(mail.outbox[0].to, ['assignee@example.com'])
+        self.assertIn(reverse('task-detail', args=[self.task.pk]), mail.outbox[0].body)
+
+    def test_bulk_assign_queues_one_notification(self):
+        tasks = [self.task, Task.objects.create(title='Other', project=self.project)]
+        self.client.force_login(self.owner)
+        self.client.post(reverse('task-bulk-action'), {
+            'action': 'assign', 'task_ids': [task.pk for task in tasks], 'assigned_to': self.assignee.pk,
+        })
+        self.assertEqual(Job.objects.get().kwargs['task_ids'], sorted(task.pk for task in tasks))
+        jobs.run_pending()
+        self.assertEqual(mail.outbox[0].subject, "You were assigned 2 tasks")
+
+    def test_failures_are_retried_with_backoff_then_given_up(self):
+        job = failing_job.enqueue(message='boom')
+        with self.assertLogs('tasks.jobs', 'WARNING'):
+            jobs.run_pending(['test'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+        self.assertEqual(jobs.run_pending(['test']), 0)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('tasks.jobs', 'ERROR'):
+            jobs.run_pending(['test'])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = jobs.rebuild_task_counters.enqueue(project_ids=[self.project.pk])
+        jobs.claim('maintenance', 10, worker='dead')
+        Job.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('tasks.jobs', 'WARNING'):
+            jobs.requeue_stale(timeout=60)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+
+    def test_metrics(self):
+        jobs.rebuild_task_counters.enqueue(project_ids=[self.project.pk])
+        jobs.rebuild_task_counters.enqueue(project_ids=[self.project.pk], delay=3600)
+        self.assertEqual(jobs.metrics()['maintenance'],
+                         {'queued': 2, 'ready': 1, 'running': 0, 'failed': 0, 'done': 0})
+        jobs.run_pending(['maintenance'])
+        self.assertEqual(jobs.metrics()['maintenance']['done'], 1)
+
+        self.client.force_login(self.owner)
+        self.assertEqual(self.client.get(reverse('job-metrics')).status_code, 403)
+        self.owner.is_staff = True
+        self.owner.save()
+        self.assertIn('maintenance', self.client.get(reverse('job-metrics')).json()['queues'])
+
+
+class WorkerTests(TransactionTestCase):
+    """run_worker runs jobs on its pool threads, each with its own connection."""
+
+    def test_burst_runs_due_jobs_and_exits(self):
+        owner = User.objects.create_user(username='owner')
+        team = Team.objects.create(name='Team', owner=owner)
+        project = Project.objects.create(name='Project', team=team, owner=owner)
+        Task.objects.create(title='Task', project=project)
+        Project.objects.filter(pk=project.pk).update(task_count=0)
+        for _ in range(3):
+            jobs.rebuild_task_counters.enqueue(project_ids=[project.pk])
+        # One thread: the in-memory test database's shared cache fails concurrent
+        # writers at once instead of waiting, and --burst exits before the retry.
+        call_command('run_worker', '--burst', '--poll=0.01', '--queue=maintenance=1', stdout=io.StringIO())
+        self.assertEqual(Job.objects.filter(status=Job.DONE).count(), 3)
+        project.refresh_from_db()
+        self.assertEqual(project.task_count, 1)
+
+
+class SQLProfilingTests(TestCase):
+    """Every response reports its SQL time; sampled ones are profiled by call site and logged."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        team.members.add(cls.user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        cls.tasks = Task.objects.bulk_create([Task(title=f'Task {n}', project=cls.project) for n in range(6)])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('team-list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", total;dur=[\d.]+$')
+
+    def test_sampled_requests_are_logged_by_call_site(self):
+        with tempfile.TemporaryDirectory() as directory:
+            log = Path(directory) / 'profile.jsonl'
+            with override_settings(SQL_PROFILE_SAMPLE_RATE=1.0, SQL_PROFILE_LOG=log):
+                self.client.get(reverse('task-list'))
+            entry = json.loads(log.read_text())
+        self.assertEqual(entry['view'], 'task-list')
+        self.assertEqual(entry['queries'], sum(site['count'] for site in entry['sites']))
+        self.assertTrue(any(site['site'].startswith('tasks/task_list.html:') for site in entry['sites']))
+
+    def test_repeated_statements_are_flagged(self):
+        with profiling.profiled() as profile:
+            for task in self.tasks:
+                Task.objects.get(pk=task.pk)
+            list(Task.objects.filter(pk__in=[task.pk for task in self.tasks[:3]]))
+            list(Task.objects.filter(pk__in=[task.pk for task in self.tasks]))
+        repeated = profile.summary()['repeated']
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0]['count'], len(self.tasks))
+        [site] = repeated[0]['sites']
+        self.assertTrue(site.startswith('tasks/tests.py:'))
+
+    def test_panel_for_staff_only(self):
+        url = reverse('project-detail', args=[self.project.pk])
+        # Others can neither see the panel nor turn on the per-query call site walk.
+        with mock.patch.object(profiling, 'call_site', wraps=profiling.call_site) as call_site:
+            self.assertNotContains(self.client.get(url, {'sql_profile': 1}), 'id="sql-profile"')
+            self.assertFalse(call_site.called)
+            self.user.is_staff = True
+            self.user.save()
+            self.assertContains(self.client.get(url, {'sql_profile': 1}), 'id="sql-profile"')
+            self.assertTrue(call_site.called)
+
+
+class FragmentCacheTests(TestCase):
+    """Cards and rows are rendered once per version and shared across requests and users."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        cls.team = Team.objects.create(name='Team', owner=cls.user)
+        cls.team.members.add(cls.user)
+        cls.project = Project.objects.create(name='Project', team=cls.team, owner=cls.user)
+        cls.task = Task.objects.create(title='Task', project=cls.project)
+        TaskAssignment.objects.create(task=cls.task, assigned_to=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def fragments(self, response):
+        return re.search(r'fragments;desc="(\d+)/(\d+) cached"', response['Server-Timing']).groups()
+
+    def test_unchanged_cards_are_served_from_cache(self):
+        for name in ('project-list', 'task-list', 'dashboard'):
+            first = self.client.get(reverse(name))
+            self.assertEqual(self.fragments(first)[0], '0')
+            second = self.client.get(reverse(name))
+            hits, lookups = self.fragments(second)
+            self.assertEqual(hits, lookups)
+            # The same page, bar the per-request CSRF token.
+            csrf = re.compile(rb'name="csrfmiddlewaretoken" value="[^"]*"')
+            self.assertEqual(csrf.sub(b'', second.content), csrf.sub(b'', first.content))
+
+    def test_task_writes_touch_the_project(self):
+        self.client.get(reverse('project-list'))
+        Task.objects.create(title='Another', project=self.project)
+        response = self.client.get(reverse('project-list'))
+        self.assertEqual(self.fragments(response), ('0', '1'))
+        self.assertContains(response, '<strong>Tasks:</strong> 2')
+
+    def test_membership_changes_touch_the_team(self):
+        version = Team.objects.get(pk=self.team.pk).version
+        self.team.members.add(User.objects.create_user(username='bob'))
+        self.assertEqual(Team.objects.get(pk=self.team.pk).version, version + 1)
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, '<strong>Members:</strong> 2')
+
+
+class AdminChangelistTests(TestCase):
+    """Admin changelists run a constant number of queries however many rows they show."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='pw')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def seed(self, count):
+        for n in range(count):
+            member = User.objects.create_user(username=f'member{Team.objects.count()}')
+            team = Team.objects.create(name=f'Team {n}', owner=member)
+            team.members.add(member, self.admin)
+            project = Project.objects.create(name=f'Project {n}', team=team, owner=member)
+            tasks = Task.objects.bulk_create([Task(title=f'Task {n}.{i}', project=project, created_by=member)
+                                              for i in range(3)])
+            TaskAssignment.objects.create(task=tasks[0], assigned_to=member, assigned_by=self.admin)
+            Comment.objects.create(task=tasks[0], author=member, content='Comment')
+
+    def query_counts(self):
+        counts = {}
+        for model in ('team', 'project', 'task', 'taskassignment', 'comment'):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(f'admin:tasks_{model}_changelist'))
+            self.assertEqual(response.status_code, 200)
+            counts[model] = len(queries)
+        return counts
+
+    def test_constant_queries(self):
+        self.seed(2)
+        few = self.query_counts()
+        self.seed(10)
+        self.assertEqual(self.query_counts(), few)
+
+    def test_computed_columns_sort(self):
+        self.seed(2)
+        # The oldest team, listed last by default.
+        crowded = Team.objects.last()
+        crowded.members.add(*(User.objects.create_user(username=f'extra{n}') for n in range(3)))
+        # Columns are numbered after the action checkbox.
+        column = TeamAdmin.list_display.index('member_count') + 1
+        response = self.client.get(reverse('admin:tasks_team_changelist'), {'o': f'-{column}'})
+        self.assertEqual(response.context['cl'].result_list[0], crowded)
+
+    def test_autocomplete_filter(self):
+        self.seed(3)
+        project = Project.objects.last()
+        response = self.client.get(reverse('admin:tasks_task_changelist'), {'project__id__exact': project.pk})
+        self.assertEqual({task.project_id for task in response.context['cl'].result_list}, {project.pk})
+        # Only the selected project is loaded for the sidebar, not every project.
+        self.assertContains(response, f'<option value="{project.pk}" selected>{project.name}</option>', html=True)
+        self.assertNotContains(response, f'>{Project.objects.first().name}<')
+        self.assertContains(response, 'select2')
+
+
+class PermissionTests(TestCase):
+    """Membership checks read one cached pair of ID sets per user, invalidated by membership changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user(username='alice')
+        cls.outsider = User.objects.create_user(username='outsider')
+        cls.team = Team.objects.create(name='Team', owner=cls.alice)
+        cls.team.members.add(cls.alice)
+        cls.project = Project.objects.create(name='Project', team=cls.team, owner=cls.alice)
+        cls.task = Task.objects.create(title='Task', project=cls.project, created_by=cls.alice)
+
+    def setUp(self):
+        cache.clear()
+
+    def memberships(self, user):
+        # A fresh user object, as in a new request.
+        return permissions.for_user(User.objects.get(pk=user.pk))
+
+    def test_loaded_once_and_cached(self):
+        user = User.objects.get(pk=self.alice.pk)
+        with self.assertNumQueries(1):
+            memberships = permissions.for_user(user)
+            self.assertTrue(memberships.is_member(self.team.pk))
+            self.assertTrue(memberships.can_access_project(self.project.pk))
+            self.assertTrue(memberships.can_access_task(self.task))
+            self.assertIs(permissions.for_user(user), memberships)
+        user = User.objects.get(pk=self.alice.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(permissions.for_user(user).project_ids, {self.project.pk})
+        self.assertFalse(self.memberships(self.outsider).can_access_task(self.task))
+
+    @override_settings(PERMISSION_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        self.memberships(self.alice)
+        with self.assertNumQueries(2):
+            self.memberships(self.alice)
+
+    def test_membership_changes_invalidate(self):
+        self.memberships(self.outsider)
+        self.team.members.add(self.outsider)
+        self.assertTrue(self.memberships(self.outsider).can_access_project(self.project.pk))
+        other = Team.objects.create(name='Other', owner=self.outsider)
+        self.outsider.teams.add(other)
+        self.assertEqual(self.memberships(self.outsider).team_ids, {self.team.pk, other.pk})
+        self.team.members.remove(self.outsider)
+        self.assertFalse(self.memberships(self.outsider).is_member(self.team.pk))
+        other.members.clear()
+        self.assertEqual(self.memberships(self.outsider).team_ids, set())
+
+    def test_project_changes_invalidate(self):
+        self.memberships(self.alice)
+        other = Team.objects.create(name='Other', owner=self.alice)
+        project = Project.objects.create(name='New', team=self.team, owner=self.alice)
+        self.assertIn(project.pk, self.memberships(self.alice).project_ids)
+        project.team = other
+        project.save()
+        self.assertNotIn(project.pk, self.memberships(self.alice).project_ids)
+        other.members.add(self.alice)
+        self.assertIn(project.pk, self.memberships(self.alice).project_ids)
+        project.delete()
+        self.assertEqual(self.memberships(self.alice).project_ids, {self.project.pk})
+        other.delete()
+        self.assertEqual(self.memberships(self.alice).team_ids, {self.team.pk})
+
+    def test_views_check_membership(self):
+        self.client.force_login(self.outsider)
+        for name, obj in (('team-detail', self.team), ('project-detail', self.project),
+                          ('task-detail', self.task), ('task-update', self.task)):
+            self.assertEqual(self.client.get(reverse(name, args=[obj.pk])).status_code, 404, name)
+        self.assertEqual(self.client.post(reverse('add-comment', args=[self.task.pk]),
+                                          {'content': 'Hi'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api-tasks-detail', args=[self.task.pk])).status_code, 404)
+        self.client.force_login(self.alice)
+        self.client.post(reverse('assign-task', args=[self.task.pk]), {'assigned_to': self.outsider.pk})
+        self.assertFalse(TaskAssignment.objects.exists())
+        self.client.post(reverse('assign-task', args=[self.task.pk]), {'assigned_to': self.alice.pk})
+        self.assertTrue(TaskAssignment.objects.filter(assigned_to=self.alice).exists())
+
+
+class CommentThreadTests(TestCase):
+    """Task pages show a page of comments, load older ones on demand and count them without a query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=cls.user)
+        team.members.add(cls.user)
+        cls.project = Project.objects.create(name='Project', team=team, owner=cls.user)
+        cls.task = Task.objects.create(title='Task', project=cls.project, created_by=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def add_comments(self, count, task=None):
+        authors = [User.objects.create_user(username=f'author{User.objects.count()}') for _ in range(2)]
+        Comment.objects.bulk_create([Comment(task=task or self.task, author=authors[n % 2], content=f'Comment {n}')
+                                     for n in range(count)])
+
+    def comment_count(self, task=None):
+        return Task.objects.get(pk=(task or self.task).pk).comment_count
+
+    def test_count_follows_comments(self):
+        comment = Comment.objects.create(task=self.task, author=self.user, content='First')
+        Comment.objects.create(task=self.task, author=self.user, content='Second')
+        self.assertEqual(self.comment_count(), 2)
+        other = Task.objects.create(title='Other', project=self.project)
+        comment = Comment.objects.get(pk=comment.pk)
+        comment.task = other
+        comment.save()
+        self.assertEqual((self.comment_count(), self.comment_count(other)), (1, 1))
+        comment.delete()
+        self.assertEqual(self.comment_count(other), 0)
+        self.add_comments(3)
+        self.assertEqual(self.comment_count(), 4)
+
+    def test_rebuild_recounts(self):
+        self.add_comments(3)
+        Task.objects.filter(pk=self.task.pk).add_comment_count(5)
+        call_command('rebuild_task_counters', stdout=io.StringIO())
+        self.assertEqual(self.comment_count(), 3)
+
+    def test_detail_shows_one_page(self):
+        self.add_comments(COMMENTS_PER_PAGE + 5)
+        url = reverse('task-detail', args=[self.task.pk])
+        response = self.client.get(url)
+        self.assertEqual(len(response.context['comments']), COMMENTS_PER_PAGE)
+        self.assertContains(response, f'data-live="comment-count">{COMMENTS_PER_PAGE + 5}<')
+        # The newest comments come first.
+        self.assertContains(response, f'Comment {COMMENTS_PER_PAGE + 4}')
+        self.assertNotContains(response, '>Comment 0<')
+        older = re.search(r'href="([^"]+)"[^>]*data-comments-more', response.content.decode()).group(1)
+        response = self.client.get(older.replace('&amp;', '&'))
+        self.assertEqual([comment.content for comment in response.context['comments']],
+                         [f'Comment {n}' for n in reversed(range(5))])
+        self.assertNotContains(response, 'data-comments-more')
+
+    def test_constant_queries(self):
+        url = reverse('task-comments', args=[self.task.pk])
+        self.add_comments(3)
+        self.client.get(url)  # Caches the memberships.
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        self.add_comments(30)
+        with self.assertNumQueries(len(few)):
+            self.client.get(url)
+        self.assertEqual(self.client.get(url, {'cursor': 'bogus'}).status_code, 404)
+
+    def test_members_only(self):
+        self.client.force_login(User.objects.create_user(username='outsider'))
+        self.assertEqual(self.client.get(reverse('task-comments', args=[self.task.pk])).status_code, 404)
+
+    def test_list_shows_count_without_query(self):
+        TaskAssignment.objects.create(task=self.task, assigned_to=self.user)
+        self.add_comments(2)
+        cache.clear()
+        response = self.client.get(reverse('task-list'))
+        self.assertContains(response, '💬 2')
+
+
+@skipUnless(connection.vendor == 'sqlite', "Checks the SQLite pragmas")
+class DatabaseProfileTests(TestCase):
+    """SQLite connections get the configured pragmas when they open."""
+
+    def test_pragmas_applied(self):
+        # The in-memory test database keeps its own journal; the others apply.
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Copies the primary into a replica SQLite file.')
+class ReplicaRoutingTests(TransactionTestCase):
+    """Safe requests read from the replica, except right after the user wrote."""
+    # Resolved in setUpClass(), once the replica is configured; the test runner
+    # only sets up (and so leaves alone) the databases configured before.
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.configured_replica = connections.settings.get(routers.REPLICA)
+        cls.set_replica({
+            **connections['default'].settings_dict,
+            'NAME': str(Path(cls.directory.name) / 'replica.sqlite3'),
+        })
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.set_replica(cls.configured_replica)
+        cls.directory.cleanup()
+
+    @staticmethod
+    def set_replica(settings_dict):
+        if routers.REPLICA in connections.settings:
+            connections[routers.REPLICA].close()
+            del connections[routers.REPLICA]
+            del connections.settings[routers.REPLICA]
+        if settings_dict is not None:
+            connections.settings[routers.REPLICA] = settings_dict
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice')
+        team = Team.objects.create(name='Team', owner=self.user)
+        team.members.add(self.user)
+        project = Project.objects.create(name='Project', team=team, owner=self.user)
+        self.task = Task.objects.create(title='Replicated title', project=project, created_by=self.user)
+        self.client.force_login(self.user)
+        routers.copy_to_replica()
+        # A change the replica has not caught up with.
+        Task.objects.filter(pk=self.task.pk).update(title='Primary title')
+
+    def test_safe_requests_read_from_replica(self):
+        response = self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.assertContains(response, 'Replicated title')
+        self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_outside_requests_use_primary(self):
+        self.assertEqual(Task.objects.get(pk=self.task.pk).title, 'Primary title')
+
+    def test_write_pins_reads_to_primary(self):
+        response = self.client.post(reverse('add-comment', args=[self.task.pk]), {'content': 'Fresh comment'})
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], settings.REPLICA_PIN_SECONDS)
+        response = self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.assertContains(response, 'Primary title')
+        self.assertContains(response, 'Fresh comment')
+
+        # Once the pin expires, reads go back to the replica.
+        del self.client.cookies[routers.PIN_COOKIE]
+        response = self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.assertContains(response, 'Replicated title')
+
+    def test_sync_replica(self):
+        call_command('sync_replica', stdout=io.StringIO())
+        response = self.client.get(reverse('task-detail', args=[self.task.pk]))
+        self.assertContains(response, 'Primary title')
+
+    def test_caches_are_filled_from_primary(self):
+        project = self.task.project
+        Project.objects.filter(pk=project.pk).update(name='Primary project')
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, 'Primary project')
+
+        bob = User.objects.create_user(username='bob')
+        self.client.force_login(bob)
+        routers.copy_to_replica()
+        url = reverse('project-burndown', args=[project.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        project.team.members.add(bob)
+        # bob's memberships are cached from the primary, before the replica catches up.
+        self.client.get(url)
+        routers.copy_to_replica()
+        self.assertEqual(self.client.get(url).status_code, 200)
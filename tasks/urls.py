@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     # Authentication URLs
@@ -23,6 +23,8 @@ urlpatterns = [
     path('projects/create/', views.ProjectCreateView.as_view(), name='project-create'),
     path('projects/<int:pk>/', views.ProjectDetailView.as_view(), name='project-detail'),
     path('projects/<int:pk>/update/', views.ProjectUpdateView.as_view(), name='project-update'),
+    path('projects/<int:pk>/events/', views.project_events, name='project-events'),
+    path('projects/<int:pk>/burndown/', views.project_burndown, name='project-burndown'),
     
     # Task URLs
     path('tasks/', views.TaskListView.as_view(), name='task-list'),
@@ -30,6 +32,9 @@ urlpatterns = [
     path('tasks/<int:pk>/', views.TaskDetailView.as_view(), name='task-detail'),
     path('tasks/<int:pk>/update/', views.TaskUpdateView.as_view(), name='task-update'),
     path('tasks/<int:pk>/delete/', views.TaskDeleteView.as_view(), name='task-delete'),
+    path('tasks/<int:pk>/events/', views.task_events, name='task-events'),
+    path('tasks/bulk/', views.bulk_task_action, name='task-bulk-action'),
+    path('tasks/search/', views.search_tasks, name='task-search'),
     
     # Task Assignment URLs
     path('tasks/<int:pk>/assign/', views.assign_task, name='assign-task'),
@@ -37,4 +42,16 @@ urlpatterns = [
     
     # Comment URLs
     path('tasks/<int:task_pk>/comment/', views.add_comment, name='add-comment'),
+    path('tasks/<int:task_pk>/comments/', views.task_comments, name='task-comments'),
+
+    # Background jobs
+    path('jobs/metrics/', views.job_metrics, name='job-metrics'),
 ]
+
+# JSON API
+for resource in api.ENDPOINTS:
+    urlpatterns += [
+        path(f'api/{resource}/', api.resource_list, {'resource': resource}, name=f'api-{resource}-list'),
+        path(f'api/{resource}/<int:pk>/', api.resource_detail, {'resource': resource},
+             name=f'api-{resource}-detail'),
+    ]
@@ -1,28 +1,54 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm, PasswordChangeForm
 from django.contrib.auth.views import LoginView, LogoutView, PasswordChangeView
-from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Q
+from django.contrib.auth.mixins import AccessMixin, LoginRequiredMixin
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import F, Q
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.response import TemplateResponse
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
-from datetime import datetime, timedelta
-from .models import Team, Project, Task, TaskAssignment, Comment
-from .forms import UserProfileForm
+from datetime import timedelta
+from .models import Team, Project, Task, TaskAssignment, TaskEvent, Comment
+from . import activity, burndown, jobs, live, permissions, search
+from .async_queries import gather_queries
+from .cache import aget_dashboard, invalidate_dashboards
+from .forms import BulkTaskActionForm, UserProfileForm
+from .pagination import InvalidCursor, KeysetPaginationMixin, KeysetPaginator
+
+# Comments shown on a task page, and loaded per "Load older comments" click.
+COMMENTS_PER_PAGE = 20
+
+
+class AsyncLoginRequiredMixin(AccessMixin):
+    """LoginRequiredMixin for views with async handlers."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await request.auser()
+        # Replace the lazy user so later code, templates included, never loads it again.
+        request.user = user
+        if not user.is_authenticated:
+            return self.handle_no_permission()
+        return await super().dispatch(request, *args, **kwargs)
 
 
 # Team Views
-class TeamListView(LoginRequiredMixin, ListView):
+class TeamListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Display all teams for the logged-in user."""
     model = Team
     template_name = 'tasks/team_list.html'
     context_object_name = 'teams'
     paginate_by = 10
+    cursor_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        return self.request.user.teams.all()
+        return permissions.for_user(self.request.user).teams().with_counts()
 
 
 class TeamDetailView(LoginRequiredMixin, DetailView):
@@ -31,6 +57,9 @@ class TeamDetailView(LoginRequiredMixin, DetailView):
     template_name = 'tasks/team_detail.html'
     context_object_name = 'team'
 
+    def get_queryset(self):
+        return permissions.for_user(self.request.user).teams().select_related('owner')
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['projects'] = self.object.projects.all()
@@ -53,40 +82,46 @@ class TeamCreateView(LoginRequiredMixin, CreateView):
 
 
 # Project Views
-class ProjectListView(LoginRequiredMixin, ListView):
+class ProjectListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Display all projects for the user's teams."""
     model = Project
     template_name = 'tasks/project_list.html'
     context_object_name = 'projects'
     paginate_by = 10
+    cursor_ordering = ('-created_at', '-id')
 
     def get_queryset(self):
-        user_teams = self.request.user.teams.all()
-        return Project.objects.filter(team__in=user_teams)
+        return permissions.for_user(self.request.user).projects().with_progress()
 
 
-class ProjectDetailView(LoginRequiredMixin, DetailView):
+class ProjectDetailView(AsyncLoginRequiredMixin, DetailView):
     """Display project details with tasks and progress."""
     model = Project
     template_name = 'tasks/project_detail.html'
     context_object_name = 'project'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        project = self.object
-        context['tasks'] = project.tasks.all()
-        context['progress'] = project.get_progress()
-        
-        # Task statistics
-        context['total_tasks'] = project.tasks.count()
-        context['completed_tasks'] = project.tasks.filter(status='completed').count()
-        context['in_progress_tasks'] = project.tasks.filter(status='in_progress').count()
-        context['todo_tasks'] = project.tasks.filter(status='todo').count()
-        
-        # Overdue tasks
-        context['overdue_tasks'] = [task for task in project.tasks.all() if task.is_overdue()]
-        
-        return context
+    def get_queryset(self):
+        return self.memberships.projects().select_related('team', 'owner')
+
+    async def get(self, request, *args, **kwargs):
+        self.memberships = await permissions.afor_user(request.user)
+        self.object = project = await aget_object_or_404(self.get_queryset(), pk=kwargs['pk'])
+        tasks, stats, assignable_users = await gather_queries(
+            lambda: list(project.tasks.all()),
+            # Task statistics, including the overdue count, from a single aggregate query
+            project.tasks.stats,
+            lambda: list(project.team.members.all()),
+        )
+        context = self.get_context_data(object=project)
+        context['tasks'] = tasks
+        context['progress'] = stats['progress']
+        context['total_tasks'] = stats['total']
+        context['completed_tasks'] = stats['completed']
+        context['in_progress_tasks'] = stats['in_progress']
+        context['todo_tasks'] = stats['todo']
+        context['overdue_count'] = stats['overdue']
+        context['assignable_users'] = assignable_users
+        return self.render_to_response(context)
 
 
 class ProjectCreateView(LoginRequiredMixin, CreateView):
@@ -97,7 +132,7 @@ class ProjectCreateView(LoginRequiredMixin, CreateView):
     
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
-        form.fields['team'].queryset = self.request.user.teams.all()
+        form.fields['team'].queryset = permissions.for_user(self.request.user).teams()
         return form
 
     def form_valid(self, form):
@@ -113,21 +148,45 @@ class ProjectUpdateView(LoginRequiredMixin, UpdateView):
     model = Project
     template_name = 'tasks/project_form.html'
     fields = ['name', 'description']
+
+    def get_queryset(self):
+        return permissions.for_user(self.request.user).projects()
     
     def get_success_url(self):
         return reverse_lazy('project-detail', kwargs={'pk': self.object.pk})
 
 
+@login_required
+def project_burndown(request, pk):
+    """Daily burndown and throughput series of a project as JSON, for the chart on its page."""
+    if not permissions.for_user(request.user).can_access_project(pk):
+        raise Http404("No project found matching the query")
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    return JsonResponse(burndown.series(pk, days))
+
+
+@login_required
+def job_metrics(request):
+    """Depth and latency of the background job queues as JSON, for monitoring."""
+    if not request.user.is_staff:
+        return JsonResponse({'detail': "Staff only."}, status=403)
+    return JsonResponse({'queues': jobs.metrics()})
+
+
 # Task Views
-class TaskListView(LoginRequiredMixin, ListView):
+class TaskListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Display all tasks assigned to the user."""
     model = Task
     template_name = 'tasks/task_list.html'
     context_object_name = 'tasks'
     paginate_by = 20
+    cursor_ordering = ('-priority', 'due_date', 'id')
 
     def get_queryset(self):
-        queryset = Task.objects.filter(assignments__assigned_to=self.request.user).distinct()
+        queryset = Task.objects.assigned_to(self.request.user).select_related('project')
         
         # Filter by status if provided
         status = self.request.GET.get('status')
@@ -144,32 +203,43 @@ class TaskListView(LoginRequiredMixin, ListView):
         if project_id:
             queryset = queryset.filter(project_id=int(project_id))
         
+        # Only the tasks the overdue sweeper has marked
+        if self.request.GET.get('overdue'):
+            queryset = queryset.filter(overdue_since__isnull=False)
+        
         return queryset.order_by('-priority', 'due_date')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['my_tasks_count'] = Task.objects.filter(assignments__assigned_to=self.request.user).count()
-        context['overdue_tasks'] = Task.objects.filter(
-            assignments__assigned_to=self.request.user,
-            status__in=['todo', 'in_progress']
-        ).exclude(due_date__isnull=True)
-        context['projects'] = Project.objects.filter(team__members=self.request.user)
+        memberships = permissions.for_user(self.request.user)
+        context['projects'] = memberships.projects()
+        context['assignable_users'] = memberships.members()
         return context
 
 
-class TaskDetailView(LoginRequiredMixin, DetailView):
+class TaskDetailView(AsyncLoginRequiredMixin, DetailView):
     """Display task details with comments and assignments."""
     model = Task
     template_name = 'tasks/task_detail.html'
     context_object_name = 'task'
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['comments'] = self.object.comments.all()
-        context['assignments'] = self.object.assignments.all()
-        context['can_edit'] = self.object.created_by == self.request.user or \
-                             self.request.user.teams.filter(id=self.object.project.team_id).exists()
-        return context
+    def get_queryset(self):
+        return self.memberships.tasks().select_related('project__team', 'created_by')
+
+    async def get(self, request, *args, **kwargs):
+        self.memberships = await permissions.afor_user(request.user)
+        self.object = task = await aget_object_or_404(self.get_queryset(), pk=kwargs['pk'])
+        comments, assignments, members = await gather_queries(
+            lambda: _comment_page(task.pk),
+            lambda: list(task.assignments.select_related('assigned_to')),
+            lambda: list(task.project.team.members.all()),
+        )
+        context = self.get_context_data(object=task)
+        context['comments'] = comments
+        context['assignments'] = assignments
+        context['members'] = members
+        context['can_edit'] = self.memberships.can_edit_task(task)
+        return self.render_to_response(context)
 
 
 class TaskCreateView(LoginRequiredMixin, CreateView):
@@ -180,8 +250,7 @@ class TaskCreateView(LoginRequiredMixin, CreateView):
 
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
-        user_teams = self.request.user.teams.all()
-        form.fields['project'].queryset = Project.objects.filter(team__in=user_teams)
+        form.fields['project'].queryset = permissions.for_user(self.request.user).projects()
         return form
 
     def form_valid(self, form):
@@ -198,6 +267,9 @@ class TaskUpdateView(LoginRequiredMixin, UpdateView):
     template_name = 'tasks/task_form.html'
     fields = ['title', 'description', 'status', 'priority', 'due_date']
 
+    def get_queryset(self):
+        return permissions.for_user(self.request.user).editable_tasks()
+
     def get_success_url(self):
         return reverse_lazy('task-detail', kwargs={'pk': self.object.pk})
 
@@ -208,20 +280,21 @@ class TaskDeleteView(LoginRequiredMixin, DeleteView):
     template_name = 'tasks/task_confirm_delete.html'
     success_url = reverse_lazy('task-list')
 
+    def get_queryset(self):
+        return permissions.for_user(self.request.user).editable_tasks()
+
 
 # Task Assignment Views
 @login_required
 def assign_task(request, pk):
     """Assign a task to a team member."""
-    task = get_object_or_404(Task, pk=pk)
-    project = task.project
-    team = project.team
+    task = get_object_or_404(permissions.for_user(request.user).editable_tasks(), pk=pk)
 
     if request.method == 'POST':
         assigned_to_id = request.POST.get('assigned_to')
         user = get_object_or_404(User, pk=assigned_to_id)
         
-        if user in team.members.all():
+        if permissions.for_user(user).can_access_task(task):
             TaskAssignment.objects.get_or_create(
                 task=task,
                 assigned_to=user,
@@ -238,17 +311,145 @@ def complete_assignment(request, pk):
     
     if assignment.assigned_to == request.user or request.user == assignment.task.created_by:
         assignment.is_completed = True
-        assignment.completed_at = datetime.now()
+        assignment.completed_at = timezone.now()
         assignment.save()
     
-    return redirect('task-detail', pk=assignment.task.pk)
+    return redirect('task-detail', pk=assignment.task_id)
+
+
+# Bulk Task Actions
+@login_required
+def bulk_task_action(request):
+    """Apply one status, priority, due-date, assignment or delete action to many tasks."""
+    redirect_to = request.POST.get('next')
+    if not url_has_allowed_host_and_scheme(redirect_to, allowed_hosts={request.get_host()},
+                                           require_https=request.is_secure()):
+        redirect_to = reverse('task-list')
+    if request.method != 'POST':
+        return redirect(redirect_to)
+
+    form = BulkTaskActionForm(request.POST)
+    try:
+        task_ids = {int(pk) for pk in request.POST.getlist('task_ids')}
+    except ValueError:
+        task_ids = set()
+    if not task_ids or not form.is_valid():
+        messages.error(request, "Select at least one task and a complete action.")
+        return redirect(redirect_to)
+
+    # One query reads the selection's projects: the user must be allowed to edit every
+    # task, by the same rule as TaskUpdateView and TaskDeleteView.
+    project_ids = dict(permissions.for_user(request.user).editable_tasks().filter(pk__in=task_ids)
+                       .order_by().values_list('pk', 'project_id'))
+    if project_ids.keys() != task_ids:
+        messages.error(request, "You do not have access to some of the selected tasks.")
+        return redirect(redirect_to)
+
+    data = form.cleaned_data
+    action = data['action']
+    tasks = Task.objects.filter(pk__in=task_ids)
+    if action == 'assign':
+        assignee = permissions.get(data['assigned_to'])
+        if not all(map(assignee.can_access_project, project_ids.values())):
+            messages.error(request, "That user is not a member of every selected task's team.")
+            return redirect(redirect_to)
+
+    now = timezone.now()
+    with transaction.atomic():
+        if action == 'status':
+            tasks.update(status=data['status'], updated_at=now)
+        elif action == 'priority':
+            tasks.update(priority=data['priority'], updated_at=now)
+        elif action == 'shift_due':
+            tasks.exclude(due_date__isnull=True).update(
+                due_date=F('due_date') + timedelta(days=data['days']), updated_at=now
+            )
+        elif action == 'assign':
+            already = set(TaskAssignment.objects.filter(task_id__in=task_ids, assigned_to_id=data['assigned_to'])
+                          .values_list('task_id', flat=True))
+            TaskAssignment.objects.bulk_create(
+                [TaskAssignment(task_id=pk, assigned_to_id=data['assigned_to'], assigned_by=request.user)
+                 for pk in task_ids - already],
+                ignore_conflicts=True,
+            )
+            # bulk_create() sends no signals, so the assignee's dashboard is dropped,
+            # the assignments recorded and the assignee notified (in one email) here.
+            invalidate_dashboards({data['assigned_to']})
+            for pk in task_ids - already:
+                activity.record(TaskEvent.ASSIGNED, pk, actor=request.user, assigned_to=data['assigned_to'])
+            if task_ids - already and data['assigned_to'] != request.user.pk:
+                jobs.notify_assignment.enqueue(task_ids=sorted(task_ids - already),
+                                               assigned_to=data['assigned_to'], assigned_by=request.user.pk)
+        elif action == 'delete':
+            tasks.delete()
+
+    label = dict(BulkTaskActionForm.ACTION_CHOICES)[action]
+    messages.success(request, f"{label}: applied to {len(task_ids)} task{'s' if len(task_ids) != 1 else ''}.")
+    return redirect(redirect_to)
+
+
+# Search View
+@login_required
+def search_tasks(request):
+    """Full-text search over the tasks and comments in the user's teams, best match first."""
+    query = request.GET.get('q', '').strip()
+    results = search.search_tasks(query, request.user) if query else []
+    return render(request, 'tasks/search.html', {'query': query, 'results': results})
+
+
+# Live Update Views
+def _event_stream_response(request, channels):
+    if not isinstance(request, ASGIRequest):
+        # A stream would hold a WSGI worker for as long as the page is open, so
+        # live updates need ASGI. 204 tells EventSource not to reconnect.
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(live.event_stream(channels), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+async def task_events(request, pk):
+    """Stream changes to a task, its comments and its assignments as server-sent events."""
+    user = await request.auser()
+    task = await aget_object_or_404((await permissions.afor_user(user)).tasks().only('pk'), pk=pk)
+    return _event_stream_response(request, [live.task_channel(task.pk)])
+
+
+@login_required
+async def project_events(request, pk):
+    """Stream changes to a project's tasks and statistics as server-sent events."""
+    user = await request.auser()
+    if not (await permissions.afor_user(user)).can_access_project(pk):
+        raise Http404("No project found matching the query")
+    return _event_stream_response(request, [live.project_channel(pk)])
 
 
 # Comment Views
+def _comment_page(task_pk, cursor=None):
+    """A page of a task's comments, newest first, with their authors."""
+    paginator = KeysetPaginator(
+        Comment.objects.filter(task_id=task_pk).select_related('author'), COMMENTS_PER_PAGE, ('-created_at', '-id')
+    )
+    try:
+        return paginator.page(cursor)
+    except InvalidCursor:
+        raise Http404("Invalid page cursor.")
+
+
+@login_required
+def task_comments(request, task_pk):
+    """The next page of older comments on a task, as an HTML fragment for the task page."""
+    task = get_object_or_404(permissions.for_user(request.user).tasks().only('pk'), pk=task_pk)
+    comments = _comment_page(task.pk, request.GET.get('cursor'))
+    return render(request, 'tasks/comment_page.html', {'task': task, 'comments': comments})
+
+
 @login_required
 def add_comment(request, task_pk):
     """Add a comment to a task."""
-    task = get_object_or_404(Task, pk=task_pk)
+    task = get_object_or_404(permissions.for_user(request.user).editable_tasks(), pk=task_pk)
     
     if request.method == 'POST':
         content = request.POST.get('content')
@@ -264,25 +465,12 @@ def add_comment(request, task_pk):
 
 # Dashboard View
 @login_required
-def dashboard(request):
+async def dashboard(request):
     """Display user's dashboard with overview of tasks and projects."""
-    user_teams = request.user.teams.all()
-    
-    context = {
-        'my_tasks': Task.objects.filter(assignments__assigned_to=request.user).distinct(),
-        'overdue_tasks': Task.objects.filter(
-            assignments__assigned_to=request.user,
-            status__in=['todo', 'in_progress']
-        ).exclude(due_date__isnull=True).filter(due_date__lt=datetime.now()),
-        'in_progress_tasks': Task.objects.filter(
-            assignments__assigned_to=request.user,
-            status='in_progress'
-        ),
-        'my_projects': Project.objects.filter(team__in=user_teams),
-        'my_teams': user_teams,
-    }
-    
-    return render(request, 'tasks/dashboard.html', context)
+    request.user = await request.auser()
+    context = await aget_dashboard(request.user)
+    # A TemplateResponse is rendered by the handler in a sync thread, where templates may query.
+    return TemplateResponse(request, 'tasks/dashboard.html', context)
 
 
 # ============= AUTHENTICATION VIEWS =============
@@ -337,9 +525,10 @@ class UserProfileView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        context['my_tasks_count'] = Task.objects.filter(assignments__assigned_to=user).count()
-        context['my_projects_count'] = Project.objects.filter(team__members=user).distinct().count()
-        context['my_teams_count'] = user.teams.count()
+        context['my_tasks_count'] = Task.objects.assigned_to(user, aggregate=True).count()
+        memberships = permissions.for_user(user)
+        context['my_projects_count'] = len(memberships.project_ids)
+        context['my_teams_count'] = len(memberships.team_ids)
         context['created_tasks_count'] = Task.objects.filter(created_by=user).count()
         return context
 